@@ -0,0 +1,5 @@
+"""
+Host-side (workstation) tooling for the Chess-Machine firmware.
+Nothing in this package is copied to the Pico. It runs the unmodified pico/ modules
+under CPython with stand-ins for the MicroPython-only modules (see host/stubs).
+"""
@@ -0,0 +1,241 @@
+"""
+Kinematics and playback benchmark with a golden step-stream check. Runs the unmodified firmware
+planners (PrecalculatedMove for one line, MultiLineMove for more) on the stand-in hardware over a
+fixed corpus:
+    * every single-square move (to each of the up to 8 neighbouring squares),
+    * every knight move, along the two squares and then the one,
+    * the long diagonals, corner to corner and one square in,
+    * routed captures: pieces taken from the middle of fixed random boards to a free edge square.
+Every move is precalculated and then played through the SIO step engine, and the ticks it
+applies to the coils are hashed. For each group it reports the precalculation and playback
+throughput (ticks per host second), step stream bytes per move (raw for one line, compact for
+several), the planned motion time and the peak host memory while planning and playing the
+group's longest move (tracemalloc, run again afterwards so it doesn't slow down the timed pass).
+
+The hashes are compared with host/benchmark_golden.json. A move whose ticks changed is listed
+and the run fails, so a change in behaviour shows up next to the timing numbers; after an
+intended change, rewrite the goldens with --update.
+
+    python -m host.benchmark
+    python -m host.benchmark --update
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from host import blend_report, planner, simulator, stream_report
+
+import kinematics  # noqa: E402  (on sys.path via host.planner)
+import machine  # noqa: E402
+import router  # noqa: E402
+import stepengine  # noqa: E402
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_golden.json')
+CAPTURE_SEED = 17
+CAPTURE_ROUTES = 24
+
+
+def single_square_moves():
+    for x in range(1, 9):
+        for y in range(1, 9):
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    if (dx or dy) and 1 <= x + dx <= 8 and 1 <= y + dy <= 8:
+                        yield [(x, y, x + dx, y + dy)]
+
+
+def long_diagonals():
+    for x1, y1, x2, y2 in ((1, 1, 8, 8), (1, 8, 8, 1), (1, 2, 7, 8), (2, 1, 8, 7),
+                           (1, 7, 7, 1), (2, 8, 8, 2)):
+        yield [(x1, y1, x2, y2)]
+        yield [(x2, y2, x1, y1)]
+
+
+def capture_routes():
+    """CAPTURE_ROUTES different routes; random boards often send a piece the same way."""
+    route_planner = router.Router(simulator.make_motors())
+    routes = {}
+    for lines in blend_report.removal_routes(route_planner, random.Random(CAPTURE_SEED), 10 * CAPTURE_ROUTES):
+        routes.setdefault(move_key(lines), lines)
+        if len(routes) == CAPTURE_ROUTES:
+            break
+    return list(routes.values())
+
+
+def corpus():
+    """(group, [lines, ...]) in a fixed order."""
+    return [
+        ('single square', list(single_square_moves())),
+        ('knight', list(stream_report.knight_moves())),
+        ('long diagonal', list(long_diagonals())),
+        ('capture route', list(capture_routes())),
+    ]
+
+
+def move_key(lines):
+    """'x,y>x,y>...' through the waypoints, which names a move in the golden file."""
+    squares = [f'{lines[0][0]},{lines[0][1]}'] + [f'{line[-2]},{line[-1]}' for line in lines]
+    return '>'.join(squares)
+
+
+class RecordingEngine:
+    """Hands every tick to the real engine and keeps a copy of the stream it played."""
+    def __init__(self, engine):
+        self.engine = engine
+        self.stream = bytearray()
+
+    def start(self):
+        self.engine.start()
+
+    def apply(self, tick):
+        self.stream.append(tick)
+        self.engine.apply(tick)
+
+    def finish(self):
+        self.engine.finish()
+
+
+class Run:
+    """One move planned and played: host seconds spent in each, and what it produced."""
+    def __init__(self):
+        self.precalc_s = 0.0
+        self.play_s = 0.0
+        self.stream = None
+        self.stream_bytes = 0
+        self.tick_us = 0
+
+
+def build(lines, motors):
+    if len(lines) == 1:
+        x1, y1, x2, y2 = lines[0]
+        return kinematics.PrecalculatedMove(x1, x2, y1, y2, motors)
+    return kinematics.MultiLineMove(lines, motors)
+
+
+def run_move(lines, record=True):
+    x, y = lines[0][0], lines[0][1]
+    motors = simulator.make_motors(list(kinematics.stepsAt(planner._board_to_mm(x), planner._board_to_mm(y))))
+    run = Run()
+    started = time.perf_counter()
+    move = build(lines, motors)
+    run.precalc_s = time.perf_counter() - started
+
+    if isinstance(move, kinematics.MultiLineMove):
+        # Later segments are filled during playback; count that time as precalculation
+        fill = move.precalculate_segment
+
+        def timed_fill(segment_index):
+            filling = time.perf_counter()
+            fill(segment_index)
+            run.precalc_s += time.perf_counter() - filling
+        move.precalculate_segment = timed_fill
+
+    engine = stepengine.create(motors, stepengine.SIO)
+    if record:
+        engine = RecordingEngine(engine)
+    move.engine = engine
+    engine.start()
+    precalc_before = run.precalc_s
+    started = time.perf_counter()
+    while not move.complete:
+        move.updateMotors()
+    run.play_s = time.perf_counter() - started - (run.precalc_s - precalc_before)
+    engine.finish()
+
+    run.stream = engine.stream if record else None
+    run.stream_bytes = move.streamBytes
+    run.tick_us = move.tickTimeUs
+    return run
+
+
+def peak_memory(lines):
+    """Peak bytes allocated on the host while planning and playing `lines`."""
+    tracemalloc.start()
+    try:
+        run_move(lines, record=False)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def stream_hash(stream):
+    return hashlib.sha256(bytes(stream)).hexdigest()[:16]
+
+
+def load_golden():
+    if not os.path.exists(GOLDEN_PATH):
+        return {}
+    with open(GOLDEN_PATH) as f:
+        return json.load(f)
+
+
+def main():
+    # Only the ticks matter here; a GPIO trace of every move would dominate time and memory
+    machine.record = False
+    parser = argparse.ArgumentParser(description='Benchmark the firmware planners and check their streams.')
+    parser.add_argument('--update', action='store_true', help='rewrite the golden hashes')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--group', action='append', help='only run this group (repeatable)')
+    args = parser.parse_args()
+
+    golden = load_golden()
+    hashes = {}
+    drifted = []
+    print(f'{"group":14} {"moves":>6} {"ticks":>8} {"motion s":>9} {"bytes/move":>11} '
+          f'{"precalc tick/s":>15} {"play tick/s":>12} {"peak KB":>8} {"drift":>6}')
+    totals = [0, 0, 0.0]
+    for group, moves in corpus():
+        if args.group and group not in args.group:
+            hashes[group] = golden.get(group, {})
+            continue
+        expected = golden.get(group, {})
+        hashes[group] = {}
+        ticks = stream_bytes = group_drift = 0
+        motion_us = precalc_s = play_s = 0.0
+        peak = 0
+        longest = None
+        with simulator.quiet():
+            for lines in moves:
+                run = run_move(lines)
+                key = move_key(lines)
+                digest = stream_hash(run.stream)
+                hashes[group][key] = digest
+                if expected.get(key) != digest:
+                    group_drift += 1
+                    drifted.append((group, key, expected.get(key), digest))
+                ticks += len(run.stream)
+                motion_us += len(run.stream) * run.tick_us
+                stream_bytes += run.stream_bytes
+                precalc_s += run.precalc_s
+                play_s += run.play_s
+                if longest is None or len(run.stream) > longest[0]:
+                    longest = len(run.stream), lines
+            if not args.no_memory:
+                peak = peak_memory(longest[1])
+        totals[0] += len(moves)
+        totals[1] += ticks
+        totals[2] += motion_us
+        memory = '-' if args.no_memory else f'{peak / 1024:.1f}'
+        print(f'{group:14} {len(moves):6} {ticks:8} {motion_us / 1e6:9.1f} {stream_bytes / len(moves):11.0f} '
+              f'{ticks / precalc_s:15.0f} {ticks / play_s:12.0f} {memory:>8} {group_drift:6}')
+    print(f'{"total":14} {totals[0]:6} {totals[1]:8} {totals[2] / 1e6:9.1f}')
+
+    if args.update:
+        with open(GOLDEN_PATH, 'w') as f:
+            json.dump(hashes, f, indent=1, sort_keys=True)
+            f.write('\n')
+        print(f'Wrote {sum(len(h) for h in hashes.values())} golden hashes to {GOLDEN_PATH}')
+        return 0
+    for group, key, was, now in drifted[:20]:
+        print(f'drift: {group} {key}: {was or "no golden"} -> {now}')
+    if len(drifted) > 20:
+        print(f'... and {len(drifted) - 20} more')
+    return 1 if drifted else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,188 @@
+"""
+Compares blended multi-line moves (MultiLineMove with a blendTolerance, see pico/blend.py)
+with the chained lines they replace, on the routes the machine really plays:
+    * knight hops out of the starting position, which the router takes along the square edges,
+    * removing a captured piece: routing it from the middle of a busy board to a free edge square,
+    * random routed moves on random boards.
+Durations are the firmware's own streams (ticks x tick time). Also checks that every blended move
+ends on exactly the same motor positions, that no point of the rounded path is further than the
+tolerance from the original corners' lines, and that no motor falls more than one step behind
+its target (i.e. the blended profile keeps every motor within its speed limit).
+
+    python -m host.blend_report --tolerance 3
+"""
+import argparse
+import math
+import random
+
+import numpy as np
+
+from host import planner, simulator
+
+import kinematics  # noqa: E402  (on sys.path via host.planner)
+import router  # noqa: E402
+
+START_POSITION = [(x, y) for x in range(1, 9) for y in (1, 2, 7, 8)]
+KNIGHT_HOPS = [(2, 1, 1, 3), (2, 1, 3, 3), (7, 1, 6, 3), (7, 1, 8, 3),
+               (2, 8, 1, 6), (2, 8, 3, 6), (7, 8, 6, 6), (7, 8, 8, 6)]
+EDGE_SQUARES = [(x, y) for x in range(1, 9) for y in range(1, 9) if x in (1, 8) or y in (1, 8)]
+
+
+def occupancy_of(squares):
+    occupancy = bytearray(64)
+    for x, y in squares:
+        occupancy[router.squareIndex(x, y)] = 1
+    return occupancy
+
+
+def route_lines(route_planner, x1, y1, x2, y2, occupancy):
+    waypoints = route_planner.route(x1, y1, x2, y2, occupancy)
+    if waypoints is None:
+        return None
+    lines = []
+    for x, y in waypoints:
+        lines.append((x1, y1, x, y))
+        x1, y1 = x, y
+    return lines
+
+
+def knight_routes(route_planner):
+    occupancy = occupancy_of(START_POSITION)
+    for x1, y1, x2, y2 in KNIGHT_HOPS:
+        yield route_lines(route_planner, x1, y1, x2, y2, occupancy)
+
+
+def removal_routes(route_planner, rng, count, pieces=20):
+    """Captured pieces from the middle of random boards to the closest free edge square with a route."""
+    while count:
+        squares = rng.sample([(x, y) for x in range(1, 9) for y in range(1, 9)], pieces)
+        x1, y1 = next((x, y) for x, y in squares if 2 < x < 7 and 2 < y < 7) if any(
+            2 < x < 7 and 2 < y < 7 for x, y in squares) else squares[0]
+        occupancy = occupancy_of(squares)
+        free = [(x, y) for x, y in EDGE_SQUARES if not occupancy[router.squareIndex(x, y)]]
+        free.sort(key=lambda square: (square[0] - x1) ** 2 + (square[1] - y1) ** 2)
+        for x2, y2 in free:
+            lines = route_lines(route_planner, x1, y1, x2, y2, occupancy)
+            if lines is not None:
+                yield lines
+                count -= 1
+                break
+
+
+def random_routes(route_planner, rng, count, pieces=16):
+    while count:
+        squares = rng.sample([(x, y) for x in range(1, 9) for y in range(1, 9)], pieces + 1)
+        x2, y2 = squares.pop()
+        x1, y1 = squares[0]
+        lines = route_lines(route_planner, x1, y1, x2, y2, occupancy_of(squares))
+        if lines is not None:
+            yield lines
+            count -= 1
+
+
+def polyline_distance(x, y, points):
+    """Distance (mm) from (x, y) to the closest point of the polyline through `points`."""
+    best = math.inf
+    for (ax, ay), (bx, by) in zip(points, points[1:]):
+        dx, dy = bx - ax, by - ay
+        lengthSq = dx * dx + dy * dy
+        t = min(1.0, max(0.0, ((x - ax) * dx + (y - ay) * dy) / lengthSq)) if lengthSq else 0.0
+        best = min(best, math.hypot(ax + dx * t - x, ay + dy * t - y))
+    return best
+
+
+def check_runs(move, tick_us):
+    """(largest distance from the original lines in mm, largest motor lag behind its target in steps)"""
+    deviation = lag = 0
+    positions = list(kinematics.stepsAt(planner._board_to_mm(move.x1), planner._board_to_mm(move.y1)))
+    for run in move.lines:
+        points = [(planner._board_to_mm(run[k]), planner._board_to_mm(run[k + 1])) for k in range(0, len(run), 2)]
+        if len(run) > 4:
+            path, profile = move.blendedRun(run)
+        else:
+            path = None
+            profile = move.lineProfile(run[0], run[2], run[1], run[3])
+        t = 0
+        while t <= profile.totalUs:
+            progress = profile.progress(t)
+            if path is None:
+                x = points[0][0] + (points[1][0] - points[0][0]) * progress
+                y = points[0][1] + (points[1][1] - points[0][1]) * progress
+            else:
+                x, y = path.point(progress)
+                deviation = max(deviation, polyline_distance(x, y, points))
+            for i, target in enumerate(kinematics.stepsAt(x, y)):
+                gap = target - positions[i]
+                if gap > 0:
+                    positions[i] += 1
+                elif gap < 0:
+                    positions[i] -= 1
+                lag = max(lag, abs(target - positions[i]))
+            t += tick_us
+        kinematics.settleTicks(points[-1][0], points[-1][1], positions)
+    return deviation, lag
+
+
+def compare(lines, tolerance, tick_us):
+    """(chained ms, blended ms, deviation mm, lag steps, same end positions)"""
+    positions = list(kinematics.stepsAt(planner._board_to_mm(lines[0][0]), planner._board_to_mm(lines[0][1])))
+    chained = planner.firmware_stream(lines, positions, tick_us)
+    blended = planner.firmware_stream(lines, positions, tick_us, blend_tolerance=tolerance)
+    motors = simulator.make_motors(positions)
+    with simulator.quiet():
+        move = kinematics.MultiLineMove(lines, motors, tick_us, blendTolerance=tolerance)
+    deviation, lag = check_runs(move, tick_us)
+    same_end = bool((planner_positions(chained) == planner_positions(blended)).all())
+    return len(chained) * tick_us / 1000, len(blended) * tick_us / 1000, deviation, lag, same_end
+
+
+def planner_positions(stream):
+    ticks = np.frombuffer(bytes(stream), dtype=np.uint8)
+    codes = (ticks[None, :] >> (2 * np.arange(4)[:, None])) & 0b11
+    return ((codes == 1).astype(np.int64) - (codes == 2)).sum(axis=1)
+
+
+def report(name, routes, tolerance, tick_us):
+    chained_ms = []
+    blended_ms = []
+    deviation = lag = mismatched = 0
+    for lines in routes:
+        if len(lines) < 2:
+            continue # Straight line, nothing to blend
+        chained, blended, d, l, same_end = compare(lines, tolerance, tick_us)
+        chained_ms.append(chained)
+        blended_ms.append(blended)
+        deviation = max(deviation, d)
+        lag = max(lag, l)
+        mismatched += not same_end
+    chained_ms = np.array(chained_ms)
+    blended_ms = np.array(blended_ms)
+    saved = 100 * (1 - blended_ms / chained_ms)
+    print(f'{name}: {len(chained_ms)} routes, chained {chained_ms.mean():.0f} ms -> blended {blended_ms.mean():.0f} ms '
+          f'on average ({100 * (1 - blended_ms.sum() / chained_ms.sum()):.1f}% faster, '
+          f'{saved.min():.1f}-{saved.max():.1f}% per route); '
+          f'max deviation {deviation:.2f} mm, max lag {lag} step(s), {mismatched} ending elsewhere')
+    return deviation, lag, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Blended vs chained multi-line moves.')
+    parser.add_argument('--tolerance', type=float, default=3.0, help='corner rounding tolerance (mm)')
+    parser.add_argument('--routes', type=int, default=40, help='removals and random routes to try')
+    parser.add_argument('--tick-us', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    route_planner = router.Router(simulator.make_motors())
+    results = [
+        report('knight hops', knight_routes(route_planner), args.tolerance, args.tick_us),
+        report('captured piece removal', removal_routes(route_planner, rng, args.routes), args.tolerance, args.tick_us),
+        report('random routes', random_routes(route_planner, rng, args.routes), args.tolerance, args.tick_us),
+    ]
+    failed = any(d > args.tolerance + 1e-6 or l > 1 or m for d, l, m in results)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+"""
+Build step for the precompiled move library (pico/movelib.py).
+Compiles every single-line square-to-square move with the vectorized planner, in parallel
+across a process pool, and writes the indexed binary file to copy onto the Pico's flash.
+
+    python -m host.build_library -o movelib.bin
+    python -m host.build_library -o movelib.bin --max-distance 2   # fits a stock 2 MB Pico
+
+Each move is compiled starting from the canonical motor positions of its start square
+(kinematics.stepsAt at the square centre). The firmware ends every line exactly on those
+positions, so the library applies to any move that starts where a previous move finished.
+"""
+import argparse
+import multiprocessing
+import random
+import struct
+import time
+
+from host import planner
+
+import kinematics  # noqa: E402  (on sys.path via host.planner)
+import movelib  # noqa: E402
+
+
+def square_xy(square):
+    return square % 8 + 1, square // 8 + 1
+
+
+def canonical_positions(square):
+    x, y = square_xy(square)
+    return list(kinematics.stepsAt(planner._board_to_mm(x), planner._board_to_mm(y)))
+
+
+def library_settings(tick_us):
+    """The kinematics.lineSettings the library is planned with: the firmware's defaults."""
+    motors = planner.simulator.make_motors(canonical_positions(0))
+    return kinematics.lineSettings(motors, tick_us)
+
+
+def _compile(args):
+    from_square, to_square, tick_us = args
+    x1, y1 = square_xy(from_square)
+    x2, y2 = square_xy(to_square)
+    speed_limits = library_settings(tick_us)[1]
+    stream, _ = planner.plan_line(x1, y1, x2, y2, canonical_positions(from_square), tick_us, speed_limits=speed_limits)
+    return from_square, to_square, bytes(stream)
+
+
+def build(path, max_distance=7, tick_us=2000, jobs=None):
+    """Compile the library to `path`. Returns (number of moves, file size in bytes)."""
+    tasks = []
+    for a in range(64):
+        for b in range(64):
+            (x1, y1), (x2, y2) = square_xy(a), square_xy(b)
+            if a != b and max(abs(x2 - x1), abs(y2 - y1)) <= max_distance:
+                tasks.append((a, b, tick_us))
+
+    with multiprocessing.Pool(jobs) as pool:
+        results = pool.map(_compile, tasks, chunksize=32)
+
+    table = bytearray(movelib.TABLE_SIZE)
+    offset = movelib.DATA_OFFSET
+    for a, b, stream in results:
+        struct.pack_into('<II', table, (a * 64 + b) * movelib.TABLE_ENTRY_SIZE, offset, len(stream))
+        offset += len(stream)
+
+    positions = []
+    for square in range(64):
+        positions.extend(canonical_positions(square))
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack(movelib.HEADER_FORMAT, movelib.MAGIC, movelib.VERSION, 0, len(results)))
+        f.write(movelib.packSettings(library_settings(tick_us)))
+        f.write(struct.pack('<256i', *positions))
+        f.write(table)
+        for _, _, stream in results:
+            f.write(stream)
+    return len(results), offset
+
+
+def verify(path, samples=50, seed=1):
+    """Read random moves back through the firmware's MoveLibrary and compare with live precalculation."""
+    library = movelib.MoveLibrary(path)
+    rng = random.Random(seed)
+    checked = mismatches = 0
+    try:
+        while checked < samples:
+            a, b = rng.randrange(64), rng.randrange(64)
+            (x1, y1), (x2, y2) = square_xy(a), square_xy(b)
+            motors = planner.simulator.make_motors(canonical_positions(a))
+            entry = library.lookup(x1, y1, x2, y2, motors, library_settings(library.tickTimeUs))
+            if entry is None:
+                continue
+            stored = bytearray(entry[1])
+            library.readInto(entry[0], stored)
+            live = planner.firmware_stream([(x1, y1, x2, y2)], canonical_positions(a), library.tickTimeUs)
+            mismatches += stored != live
+            checked += 1
+    finally:
+        library.close()
+    return checked, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile the square-to-square move library.')
+    parser.add_argument('-o', '--output', default='movelib.bin')
+    parser.add_argument('--max-distance', type=int, default=7,
+                        help='only include moves spanning at most this many squares in x and y')
+    parser.add_argument('--tick-us', type=int, default=2000)
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--verify', type=int, default=20, metavar='N',
+                        help='compare N random entries against the firmware afterwards (0 to skip)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    count, size = build(args.output, args.max_distance, args.tick_us, args.jobs)
+    elapsed = time.perf_counter() - started
+    print(f'{args.output}: {count} moves, {size / 1024:.0f} KB, built in {elapsed:.1f}s')
+    if size > 1400 * 1024:
+        print('warning: larger than the ~1.4 MB filesystem of a 2 MB Pico; try a smaller --max-distance')
+
+    if args.verify:
+        checked, mismatches = verify(args.output, args.verify)
+        print(f'verified {checked} moves against the firmware: {mismatches} mismatches')
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
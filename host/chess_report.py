@@ -0,0 +1,199 @@
+"""
+Report for Board.calculateChessMove (pico/chessmove.py), which plays a whole chess move as one
+multi-line move. Captures on random boards, en passant and castling are played on the simulated
+board twice:
+    * the way a host had to do it before: one command per leg (a routed move of the bare magnet
+      to the piece, RTE to where it goes), with a captured piece sent to the closest free edge square that has a route, and
+      castling king first,
+    * as one planned chess move, with the leg order and graveyard slot the planner picked.
+Durations are the played streams (ticks x tick time), without the host's round trip and pause
+between commands, which the chess move saves on top. It checks that the planned move leaves the
+pieces where the chess move puts them (the captured one on the planner's slot) and the motors on
+the step targets of the square it ends on, and how well the planner's estimate matches the
+played duration.
+
+    python -m host.chess_report
+    python -m host.chess_report --boards 40 --seed 3
+"""
+import argparse
+import random
+
+from host import simulator
+from host.soak_report import PositionEngine
+
+simulator.install()
+
+import chessmove  # noqa: E402
+import kinematics  # noqa: E402
+import machine  # noqa: E402
+import router  # noqa: E402
+
+START_POSITION = [(x, y) for x in range(1, 9) for y in (1, 2, 7, 8)]
+
+
+def mask_of(squares):
+    mask = 0
+    for x, y in squares:
+        mask |= 1 << router.squareIndex(x, y)
+    return mask
+
+
+def captures(rng, count, pieces=20):
+    """(magnet square, pieces, kind, x1, y1, x2, y2) for random captures on random boards."""
+    for _ in range(count):
+        squares = rng.sample([(x, y) for x in range(1, 9) for y in range(1, 9)], pieces)
+        (x1, y1), (x2, y2) = squares[0], squares[1]
+        yield rng.choice(squares), squares, chessmove.CAPTURE, x1, y1, x2, y2
+
+
+def en_passants(rng, count, pieces=16):
+    for _ in range(count):
+        x1 = rng.randint(1, 8)
+        x2 = x1 + rng.choice([d for d in (-1, 1) if 1 <= x1 + d <= 8])
+        y1, y2 = rng.choice(((5, 6), (4, 3)))
+        others = [(x, y) for x in range(1, 9) for y in range(1, 9) if (x, y) not in ((x1, y1), (x2, y1), (x2, y2))]
+        squares = [(x1, y1), (x2, y1)] + rng.sample(others, pieces - 2)
+        yield rng.choice(squares), squares, chessmove.EN_PASSANT, x1, y1, x2, y2
+
+
+def castlings():
+    for y in (1, 8):
+        for x2, cleared in ((7, (6, 7)), (3, (2, 3, 4))):
+            squares = [square for square in START_POSITION if square[1] != y or square[0] not in cleared]
+            yield (5, 4 if y == 1 else 5), squares, chessmove.CASTLE, 5, y, x2, y
+
+
+def board_at(x, y, squares):
+    board_obj = simulator.make_board(x, y, kinematics.squareSteps(x, y))
+    board_obj.engine = PositionEngine(board_obj.motors)
+    board_obj.setOccupancy(mask_of(squares))
+    board_obj.setGraveyard(chessmove.EDGE_SQUARES)
+    return board_obj
+
+
+def play(board_obj):
+    """Plays the current move; returns its duration in microseconds."""
+    board_obj.executeMove()
+    return board_obj.lastPlayback.plannedUs
+
+
+def closest_slot(board_obj, x, y):
+    """The closest free edge square with a route, as the removal routes in blend_report pick it."""
+    free = [square for square in chessmove.EDGE_SQUARES if not board_obj.isOccupied(*square)]
+    free.sort(key=lambda square: (square[0] - x) ** 2 + (square[1] - y) ** 2)
+    for square in free:
+        if board_obj.router.route(x, y, square[0], square[1], board_obj.occupancy) is not None:
+            return square
+    return None
+
+
+def carry(board_obj, x1, y1, x2, y2):
+    """
+    One leg as separate commands: the magnet to the piece around the others (if it isn't on it),
+    then RTE to (x2, y2).
+    """
+    total = 0
+    if (board_obj.x, board_obj.y) != (x1, y1):
+        travel = board_obj.router.route(board_obj.x, board_obj.y, x1, y1, board_obj.occupancy)
+        if travel is None:
+            return None
+        board_obj.calculateMultiMove(travel)
+        total += play(board_obj)
+    if not board_obj.calculateRoute(x2, y2):
+        return None
+    return total + play(board_obj)
+
+
+def separate(board_obj, kind, x1, y1, x2, y2):
+    """Duration of the chess move played leg by leg, or None if some leg had no route."""
+    legs = []
+    if kind == chessmove.CAPTURE:
+        legs.append((x2, y2, None))
+    legs.append((x1, y1, (x2, y2)))
+    if kind == chessmove.EN_PASSANT:
+        legs.append((x2, y1, None))
+    if kind == chessmove.CASTLE:
+        legs.append((8, y1, (x2 - 1, y1)) if x2 > x1 else (1, y1, (x2 + 1, y1)))
+    total = 0
+    for px, py, target in legs:
+        if target is None:
+            target = closest_slot(board_obj, px, py)
+            if target is None:
+                return None
+        leg = carry(board_obj, px, py, target[0], target[1])
+        if leg is None:
+            return None
+        total += leg
+    return total
+
+
+def expected_pieces(squares, kind, x1, y1, x2, y2, slot):
+    """The occupied squares after the chess move, with the captured piece on `slot`."""
+    pieces = set(squares)
+    pieces.discard((x1, y1))
+    if kind == chessmove.EN_PASSANT:
+        pieces.discard((x2, y1))
+    if kind == chessmove.CASTLE:
+        pieces.discard((8, y1) if x2 > x1 else (1, y1))
+        pieces.add((x2 - 1, y1) if x2 > x1 else (x2 + 1, y1))
+    pieces.add((x2, y2))
+    if slot is not None:
+        pieces.add(slot)
+    return pieces
+
+
+def on_targets(board_obj):
+    targets = kinematics.squareSteps(board_obj.x, board_obj.y)
+    return [motor.position for motor in board_obj.motors] == list(targets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chess moves as one planned move against one command per leg.')
+    parser.add_argument('--boards', type=int, default=20, help='random boards for captures and for en passant')
+    parser.add_argument('--seed', type=int, default=9)
+    args = parser.parse_args()
+    machine.record = False
+    rng = random.Random(args.seed)
+    groups = (('capture', list(captures(rng, args.boards))),
+              ('en passant', list(en_passants(rng, args.boards))),
+              ('castling', list(castlings())))
+    failures = 0
+    for name, cases in groups:
+        count = 0
+        before_us = after_us = estimate_error = searched = 0
+        for (mx, my), squares, kind, x1, y1, x2, y2 in cases:
+            with simulator.quiet():
+                old = board_at(mx, my, squares)
+                old_us = separate(old, kind, x1, y1, x2, y2)
+                new = board_at(mx, my, squares)
+                planned = new.calculateChessMove(x1, y1, x2, y2, kind)
+                plan = new.chessPlan
+                new_us = play(new) if planned else None
+            if old_us is None or new_us is None:
+                if new_us is None and old_us is not None:
+                    failures += 1
+                    print(f'  {kind} ({x1},{y1})->({x2},{y2}): no plan, but it can be played leg by leg')
+                continue
+            pieces = set((x, y) for x in range(1, 9) for y in range(1, 9) if new.isOccupied(x, y))
+            if not on_targets(new) or pieces != expected_pieces(squares, kind, x1, y1, x2, y2, plan.slot):
+                failures += 1
+                print(f'  {kind} ({x1},{y1})->({x2},{y2}): off the step targets or the pieces differ')
+            count += 1
+            before_us += old_us
+            after_us += new_us
+            estimate_error = max(estimate_error, abs(plan.durationUs - new_us) / new_us)
+            searched += new.chessPlanner.searched
+        if not count:
+            print(f'{name:>10}: nothing to compare')
+            continue
+        print(f'{name:>10}: {count} moves, {before_us / count / 1e6:.2f} s leg by leg -> '
+              f'{after_us / count / 1e6:.2f} s planned ({100 * (1 - after_us / before_us):.0f}% faster), '
+              f'estimate within {100 * estimate_error:.1f}%, {searched / count:.1f} routes searched per move')
+    if failures:
+        print(f'{failures} moves failed')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
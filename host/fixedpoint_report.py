@@ -0,0 +1,63 @@
+"""
+Checks the float-free step generator (pico/fixedstep.py) against the float path.
+Runs the firmware with fixedPoint=True on random single-line and multi-line moves (the latter
+split into small segments, so lines resume mid-way) and compares every stream with the
+vectorized planner's exact one:
+    * how many ticks differ,
+    * the largest difference in any motor's position at any tick (the tolerance is 1 step),
+    * whether every move still ends on exactly the same positions.
+
+    python -m host.fixedpoint_report --moves 200
+"""
+import argparse
+import random
+
+import numpy as np
+
+from host import planner
+
+
+def positions_per_tick(stream):
+    """Cumulative position change of each motor after every tick, as a (4, n) array."""
+    ticks = np.frombuffer(bytes(stream), dtype=np.uint8)
+    codes = (ticks[None, :] >> (2 * np.arange(4)[:, None])) & 0b11
+    return np.cumsum((codes == 1).astype(np.int64) - (codes == 2), axis=1)
+
+
+def compare(exact, fixed):
+    """(differing ticks, compared ticks, largest position difference, same end positions)"""
+    n = min(len(exact), len(fixed))
+    differing = int(np.count_nonzero(np.frombuffer(bytes(exact[:n]), np.uint8) != np.frombuffer(bytes(fixed[:n]), np.uint8)))
+    differing += abs(len(exact) - len(fixed))
+    a = positions_per_tick(exact)
+    b = positions_per_tick(fixed)
+    lag = int(np.abs(a[:, :n] - b[:, :n]).max()) if n else 0
+    return differing, max(len(exact), len(fixed)), lag, bool((a[:, -1] == b[:, -1]).all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fixed-point vs float step generation.')
+    parser.add_argument('--moves', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    differing = ticks = worst = mismatched_ends = 0
+    for i in range(args.moves):
+        lines = planner._random_lines(rng, 1 if i % 2 else rng.randint(2, 5))
+        x, y = lines[0][0], lines[0][1]
+        positions = list(planner.kinematics.stepsAt(planner._board_to_mm(x), planner._board_to_mm(y)))
+        exact, _ = planner.plan_lines(lines, positions)
+        fixed = planner.firmware_stream(lines, positions, max_mem_bytes=1000, fixed_point=True)
+        d, n, lag, same_end = compare(exact, fixed)
+        differing += d
+        ticks += n
+        worst = max(worst, lag)
+        mismatched_ends += not same_end
+    print(f'{args.moves} moves, {ticks} ticks: {differing} differ ({100 * differing / ticks:.2f}%), '
+          f'max position difference {worst} step(s), {mismatched_ends} moves ending elsewhere')
+    return 1 if worst > 1 or mismatched_ends else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
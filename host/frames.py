@@ -0,0 +1,107 @@
+"""
+Host side of the binary UART protocol (pico/frame.py): builds command frames and splits the
+replies out of whatever comes back. Written independently of the firmware (bit-by-bit CRC,
+struct packing) so that each side checks the other.
+
+    from host import frames
+    data = frames.encode([frames.mov(1, [(2, 1), (3, 3)]), frames.pos(2)])
+    replies = frames.decode(received)   # [('ACK', 1, None), ('POS', 2, (3, 3)), ('CREDIT', 3, 2048), ...]
+"""
+import struct
+
+SYNC = 0xA5
+POS, MOV, RTE, OCC, BAUD, STREAM, DATA, END = 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08
+REPLIES = {0x80: 'ACK', 0x81: 'DONE', 0x82: 'NAK', 0x83: 'POS', 0x84: 'CREDIT'}
+MAX_DATA = 252  # Ticks in one DATA command that fills a frame on its own
+BAD_FRAME = 0xFF
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE."""
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return crc
+
+
+def square(x, y):
+    if not (1 <= x <= 8 and 1 <= y <= 8):
+        raise ValueError(f'({x}, {y}) is not on the board')
+    return ((x - 1) << 3) | (y - 1)
+
+
+def pos(tag):
+    return bytes((POS, tag))
+
+
+def mov(tag, squares):
+    return bytes((MOV, tag, len(squares))) + bytes(square(x, y) for x, y in squares)
+
+
+def rte(tag, x, y):
+    return bytes((RTE, tag, square(x, y)))
+
+
+def occ(tag, mask):
+    return bytes((OCC, tag)) + struct.pack('<Q', mask)
+
+
+def baud(tag, rate):
+    return bytes((BAUD, tag)) + struct.pack('<I', rate)
+
+
+def stream(tag, x, y, positions):
+    """Starts a host-planned move to (x, y) from the given motor positions (see pico/hoststream.py)."""
+    return bytes((STREAM, tag, square(x, y))) + struct.pack('<4i', *positions)
+
+
+def data(tag, ticks):
+    if len(ticks) > MAX_DATA:
+        raise ValueError(f'{len(ticks)} ticks do not fit in one DATA command')
+    return bytes((DATA, tag, len(ticks))) + bytes(ticks)
+
+
+def end(tag):
+    return bytes((END, tag))
+
+
+def encode(commands):
+    """One frame carrying the given commands (byte strings from the builders above)."""
+    payload = b''.join(commands)
+    if len(payload) > 255:
+        raise ValueError(f'{len(payload)} byte payload does not fit in one frame')
+    body = bytes((len(payload),)) + payload
+    return bytes((SYNC,)) + body + struct.pack('>H', crc16(body))
+
+
+def decode(data):
+    """
+    Replies found in `data` as (kind, tag, value), skipping text lines and frames that fail
+    their CRC. The value is the square of a POS reply, the count of a CREDIT, otherwise None.
+    """
+    replies = []
+    i = 0
+    while i < len(data):
+        if data[i] != SYNC:
+            end = data.find(b'\n', i)
+            i = len(data) if end < 0 else end + 1
+            continue
+        if i + 1 >= len(data):
+            break
+        length = data[i + 1]
+        end = i + 2 + length + 2
+        if end > len(data):
+            break
+        body = data[i + 1:i + 2 + length]
+        if struct.unpack('>H', data[end - 2:end])[0] == crc16(body) and length >= 2:
+            kind = REPLIES.get(body[1], hex(body[1]))
+            value = None
+            if kind == 'CREDIT' and length >= 4:
+                value = body[3] | body[4] << 8
+            elif length >= 3:
+                value = (body[3] >> 3) + 1, (body[3] & 7) + 1
+            replies.append((kind, body[2], value))
+        i = end
+    return replies
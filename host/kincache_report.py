@@ -0,0 +1,163 @@
+"""
+Report for the kinematics cache (pico/kincache.py and kinematics.squareSteps). Plays the same
+random game on two simulated boards: one as Board sets it up, with a LineCache shared by the
+router and the moves, and one whose moves have no line cache (the router keeps its own, as it
+always has). A game is plain moves, multi-line moves, routed moves and chess captures on random
+boards. For each board it counts the velocity profiles worked out (ParametricLineMove.
+lineProfile) and the step targets computed from scratch (kinematics.stepsAt). Host time isn't
+reported: on CPython it goes mostly to the collections the planners ask for, which say little
+about the Pico. It checks that both boards play exactly the same ticks, and that the shared
+cache never holds more than its size. Then the game is played again with every motor's
+maxSpeed changed after the board was made, and the shared cache must never have to start over:
+the router and the moves have to keep timing lines with the same settings.
+
+    python -m host.kincache_report
+    python -m host.kincache_report --moves 400 --cache-size 64 --max-speed 400
+"""
+import argparse
+import hashlib
+import random
+
+from host import simulator
+from host.soak_report import PositionEngine, random_waypoints
+
+simulator.install()
+
+import chessmove  # noqa: E402
+import kincache  # noqa: E402
+import kinematics  # noqa: E402
+import machine  # noqa: E402
+import router  # noqa: E402
+
+
+class HashingEngine(PositionEngine):
+    """Steps the motor positions and hashes every tick."""
+    def __init__(self, motors):
+        super().__init__(motors)
+        self.digest = hashlib.sha256()
+
+    def apply(self, tick):
+        self.toggle(tick)
+        self.digest.update(bytes((tick,)))
+
+
+class CountingCache(kincache.LineCache):
+    """LineCache that counts how often it starts over for other settings."""
+    def __init__(self, size=kincache.LINE_CACHE_SIZE):
+        super().__init__(size)
+        self.restarts = 0
+
+    def store(self, settings, key, us):
+        if self.settings is not None and settings != self.settings:
+            self.restarts += 1
+        super().store(settings, key, us)
+
+
+class Counter:
+    """Counts the calls to a function, installed as attribute `name` of each of `owners`."""
+    def __init__(self, name, *owners):
+        self.name = name
+        self.owners = owners
+        self.original = getattr(owners[0], name)
+        self.calls = 0
+
+    def __enter__(self):
+        original = self.original
+        def counted(*args):
+            self.calls += 1
+            return original(*args)
+        for owner in self.owners:
+            setattr(owner, self.name, counted)
+        return self
+
+    def __exit__(self, *exc):
+        for owner in self.owners:
+            setattr(owner, self.name, self.original)
+
+
+class GameReport:
+    def __init__(self, board_obj, profiles, steps, largest):
+        self.board = board_obj
+        self.profiles = profiles
+        self.steps = steps
+        self.largest = largest          # Most entries the line cache held
+        self.digest = board_obj.engine.digest.hexdigest()
+
+
+def play_game(board_obj, rng, count):
+    """Plans and plays `count` random moves; returns the most entries the line cache held."""
+    largest = 0
+    for _ in range(count):
+        kind = rng.random()
+        planned = True
+        if kind < 0.3:
+            board_obj.calculateMove(rng.randint(1, 8), rng.randint(1, 8))
+        elif kind < 0.6:
+            board_obj.calculateMultiMove(random_waypoints(rng, board_obj.x, board_obj.y))
+        else:
+            board_obj.setOccupancy(rng.getrandbits(64) & rng.getrandbits(64))
+            x, y = rng.randint(1, 8), rng.randint(1, 8)
+            board_obj.setOccupied(board_obj.x, board_obj.y, False)
+            if kind < 0.8:
+                board_obj.setOccupied(x, y, False)
+                planned = (x, y) != (board_obj.x, board_obj.y) and board_obj.calculateRoute(x, y)
+            else:
+                # Capture: some other piece takes the one on (x, y)
+                px, py = rng.randint(1, 8), rng.randint(1, 8)
+                board_obj.setOccupied(px, py)
+                board_obj.setOccupied(x, y)
+                planned = (px, py) != (x, y) and board_obj.calculateChessMove(px, py, x, y, chessmove.CAPTURE)
+        if planned:
+            board_obj.executeMove()
+        board_obj.currentMove = None
+        largest = max(largest, len(board_obj.router.cache))
+    return largest
+
+
+def run(moves, seed, cache_size, max_speed=None):
+    """
+    GameReport of a game on a board whose moves share a line cache of `cache_size` (or have none),
+    with every motor's maxSpeed set to `max_speed` once the board is made.
+    """
+    board_obj = simulator.make_board()
+    board_obj.engine = HashingEngine(board_obj.motors)
+    board_obj.setGraveyard(chessmove.EDGE_SQUARES)
+    if max_speed is not None:
+        for motor in board_obj.motors:
+            motor.maxSpeed = max_speed
+    board_obj.lineCache = CountingCache(cache_size) if cache_size else None
+    board_obj.router.cache = kincache.LineCache() if board_obj.lineCache is None else board_obj.lineCache
+    with Counter('lineProfile', kinematics.ParametricLineMove, router.Router) as profiles, \
+            Counter('stepsAt', kinematics) as steps:
+        with simulator.quiet():
+            largest = play_game(board_obj, random.Random(seed), moves)
+    return GameReport(board_obj, profiles.calls, steps.calls, largest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Line timing cache and square table against planning without them.')
+    parser.add_argument('--moves', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=12)
+    parser.add_argument('--cache-size', type=int, default=kincache.LINE_CACHE_SIZE)
+    parser.add_argument('--max-speed', type=int, default=400, help='Motor.maxSpeed for the second game (steps/s)')
+    args = parser.parse_args()
+    machine.record = False
+    without = run(args.moves, args.seed, 0)
+    shared = run(args.moves, args.seed, args.cache_size)
+    cache = shared.board.lineCache
+    for name, report in (('router cache only', without), ('shared line cache', shared)):
+        print(f'{name:>17}: {report.profiles} profiles, {report.steps} step targets worked out')
+    lookups = cache.hits + cache.misses
+    print(f'{"":>17}  {cache.hits} of {lookups} line timings from the cache ({100 * cache.hits / max(1, lookups):.0f}%), '
+          f'at most {shared.largest} of {cache.size} entries in use')
+    changed = run(args.moves, args.seed, args.cache_size, args.max_speed)
+    restarts = changed.board.lineCache.restarts
+    print(f'{"":>17}  with maxSpeed changed to {args.max_speed}: the cache started over {restarts} times')
+    ok = shared.digest == without.digest and shared.largest <= cache.size and not restarts
+    if shared.digest != without.digest:
+        print('the boards played different ticks')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
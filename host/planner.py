@@ -0,0 +1,279 @@
+"""
+NumPy-vectorized offline planner.
+Produces the same packed step stream as kinematics.PrecalculatedMove.precalculate and
+MultiLineMove.precalculate_segment, but computes the whole tick grid for every line in one
+vectorized pass instead of a scalar loop per 2 ms tick.
+
+The streams match the firmware bit for bit when the firmware runs under CPython (see
+host.simulator), since both use IEEE doubles and evaluate the same expressions in the same
+order. MicroPython on the Pico uses single precision floats, so a target that lands within
+float32 rounding of a .5 boundary can come out one step different on the device.
+
+    python -m host.planner          # check against the firmware and report throughput
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from host import simulator
+
+simulator.install()
+import kinematics  # noqa: E402  (needs the stand-in modules on sys.path first)
+import motionprofile  # noqa: E402
+import stepstream  # noqa: E402
+
+DEFAULT_ACCEL = motionprofile.DEFAULT_ACCEL
+DEFAULT_JERK = motionprofile.DEFAULT_JERK
+DEFAULT_SPEED_LIMITS = (500, 500, 500, 500)
+
+_profile_cache = {}
+
+
+def line_profile(x1, y1, x2, y2, accel=DEFAULT_ACCEL, jerk=DEFAULT_JERK, time_optimal=True,
+                 speed_limits=DEFAULT_SPEED_LIMITS):
+    """
+    The firmware's velocity profile for a line (ParametricLineMove.lineProfile).
+    Cached, since there are only 64 x 64 distinct lines on the board.
+    The keyword arguments here are the profile options accepted by every planning function below.
+    """
+    key = (x1, y1, x2, y2, accel, jerk, time_optimal, tuple(speed_limits))
+    if key not in _profile_cache:
+        # lineProfile only needs the limits from the instance, so skip __init__
+        planner = object.__new__(kinematics.ParametricLineMove)
+        planner.accel = accel
+        planner.jerk = jerk
+        planner.timeOptimal = time_optimal
+        planner.speedLimits = list(speed_limits)
+        with simulator.quiet():
+            _profile_cache[key] = planner.lineProfile(x1, x2, y1, y2)
+    return _profile_cache[key]
+
+
+def time_scaling(x1, y1, x2, y2, **options):
+    """Duration of a line move in seconds."""
+    return line_profile(x1, y1, x2, y2, **options).duration
+
+
+def profile_progress(profile, t):
+    """
+    Vectorized profile.progress(): every branch is evaluated with the same expressions
+    in the same order as the firmware and the right one is selected per tick.
+    """
+    if isinstance(profile, motionprofile.TimeOptimalProfile):
+        node_us = np.array(profile.nodeUs)
+        k = np.minimum(np.searchsorted(node_us, t, side='right') - 1, len(profile.nodeS) - 1)
+        tau = t - node_us[k]
+        s = np.array(profile.nodeS)[k] + tau * (np.array(profile.nodeV)[k] + 0.5 * np.array(profile.nodeA)[k] * tau)
+        return np.where(t >= profile.totalUs, 1.0, s)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        def ramp(tau):
+            if profile.smooth:
+                return profile.rampDistance * tau * tau * tau * (2.0 - tau)
+            return profile.rampDistance * tau * tau
+        rising = ramp(t / profile.rampUs)
+        cruising = profile.rampDistance + profile.rateUs * (t - profile.rampUs)
+        falling = 1.0 - ramp((profile.totalUs - t) / profile.rampUs)
+    return np.where(t >= profile.totalUs, 1.0,
+                    np.where(t < profile.rampUs, rising,
+                             np.where(t <= profile.totalUs - profile.rampUs, cruising, falling)))
+
+
+def _board_to_mm(n):
+    return 10 + (float(n - 1) * 28.71428)
+
+
+def tick_grid(lines, tick_us=2000, **options):
+    """
+    Target x/y (mm) of every tick of every line, concatenated in playback order, plus the
+    number of ticks in each line. Each line is ticked at t = 0, tick_us, 2*tick_us, ...
+    while t <= its total time, exactly like the firmware's while-loop.
+    """
+    starts_x, starts_y, dxs, dys, counts, progress = [], [], [], [], [], []
+    for x1, y1, x2, y2 in lines:
+        profile = line_profile(x1, y1, x2, y2, **options)
+        total_time_us = profile.totalUs
+        t = np.arange(int(total_time_us / tick_us) + 2, dtype=np.int64) * tick_us
+        t = t[t <= total_time_us]
+        start_x = _board_to_mm(x1)
+        start_y = _board_to_mm(y1)
+        starts_x.append(np.full(len(t), start_x))
+        starts_y.append(np.full(len(t), start_y))
+        dxs.append(np.full(len(t), _board_to_mm(x2) - start_x))
+        dys.append(np.full(len(t), _board_to_mm(y2) - start_y))
+        progress.append(profile_progress(profile, t))
+        counts.append(len(t))
+    progress = np.concatenate(progress)
+    target_x = np.concatenate(starts_x) + np.concatenate(dxs) * progress
+    target_y = np.concatenate(starts_y) + np.concatenate(dys) * progress
+    return target_x, target_y, counts
+
+
+def spool_steps(dSq):
+    """Vectorized kinematics.spoolSteps: unrounded steps from the firmware's spool table."""
+    table = np.array(kinematics._SPOOL_TABLE, dtype=np.float64)
+    k = (dSq - kinematics.SPOOL_MIN_SQ) * kinematics._SPOOL_SCALE
+    i = k.astype(np.int64)
+    low = table[i]
+    return low + (table[i + 1] - low) * (k - i)
+
+
+def cable_steps(target_x, target_y):
+    """Absolute step targets for all 4 motors at each point, as an (n, 4) int64 array."""
+    a1 = target_x + 17
+    b1 = target_y + 17
+    a2 = 238 - target_x
+    b3 = 238 - target_y
+
+    a1Sq = a1 * a1
+    b1Sq = b1 * b1
+    a2Sq = a2 * a2
+    b3Sq = b3 * b3
+
+    steps = np.empty((len(target_x), 4), dtype=np.int64)
+    for i, dSq in enumerate((a1Sq + b1Sq, a2Sq + b1Sq, a1Sq + b3Sq, a2Sq + b3Sq)):
+        # np.rint rounds half to even, same as Python's round()
+        steps[:, i] = np.rint(spool_steps(dSq))
+    return steps
+
+
+def _follow(target, position):
+    """
+    One-step-per-tick follower for a single motor, returning (commands, end position)
+    with commands in {-1, 0, 1}.
+    Once the follower has caught up and the target never moves more than one step per tick
+    from there on, the commands are simply the target's differences, so the rest of the move
+    is filled in with one vectorized diff instead of a Python loop.
+    """
+    n = len(target)
+    commands = np.zeros(n, dtype=np.int8)
+    values = target.tolist()
+    fast_path = True
+    k = 0
+    while k < n:
+        gap = values[k] - position
+        if gap > 0.5:
+            commands[k] = 1
+            position += 1
+        elif gap < -0.5:
+            commands[k] = -1
+            position -= 1
+        k += 1
+        if fast_path and position == values[k - 1] and k < n:
+            rest = np.diff(target[k - 1:])
+            if np.all(np.abs(rest) <= 1):
+                commands[k:] = rest
+                return commands, values[-1]
+            fast_path = False
+    return commands, position
+
+
+def pack(commands):
+    """Pack an (n, 4) array of {-1, 0, 1} commands into the firmware's 2-bit-per-motor bytes."""
+    codes = np.where(commands > 0, 1, np.where(commands < 0, 2, 0)).astype(np.uint8)
+    packed = codes[:, 0] | (codes[:, 1] << 2) | (codes[:, 2] << 4) | (codes[:, 3] << 6)
+    return bytearray(packed.tobytes())
+
+
+def plan_lines(lines, positions, tick_us=2000, **options):
+    """
+    Plan a list of (x1, y1, x2, y2) lines starting from the given motor positions.
+    Returns (packed bytearray, end positions). The bytearray is the concatenation of every
+    MultiLineMove segment buffer (or the PrecalculatedMove buffer for a single line).
+    """
+    target_x, target_y, counts = tick_grid(lines, tick_us, **options)
+    steps = cable_steps(target_x, target_y)
+    positions = list(positions)
+    stream = bytearray()
+    start = 0
+    for (x1, y1, x2, y2), n in zip(lines, counts):
+        # The follower carries its position from one line into the next, so only the
+        # target grid is shared across lines
+        line_steps = steps[start:start + n]
+        start += n
+        commands = np.empty(line_steps.shape, dtype=np.int8)
+        for i in range(4):
+            commands[:, i], positions[i] = _follow(line_steps[:, i], positions[i])
+        stream.extend(pack(commands))
+        stream.extend(kinematics.settleTicks(_board_to_mm(x2), _board_to_mm(y2), positions))
+    return stream, positions
+
+
+def plan_line(x1, y1, x2, y2, positions, tick_us=2000, **options):
+    """Plan a single line. Same stream as kinematics.PrecalculatedMove(x1, x2, y1, y2, ...)."""
+    return plan_lines([(x1, y1, x2, y2)], positions, tick_us, **options)
+
+
+def firmware_stream(lines, positions, tick_us=2000, accel=DEFAULT_ACCEL, jerk=DEFAULT_JERK,
+                    time_optimal=True, speed_limits=DEFAULT_SPEED_LIMITS, max_mem_bytes=10000, fixed_point=False, blend_tolerance=0):
+    """
+    Run the firmware's own planner on the simulated board and return its full raw stream.
+    A single line goes through PrecalculatedMove, several through MultiLineMove with every
+    segment decoded and concatenated. With a blend_tolerance (mm) MultiLineMove rounds the corners.
+    """
+    motors = simulator.make_motors(positions)
+    for motor, limit in zip(motors, speed_limits):
+        motor.maxSpeed = limit
+    options = {'accel': accel, 'jerk': jerk, 'timeOptimal': time_optimal, 'fixedPoint': fixed_point}
+    with simulator.quiet():
+        if len(lines) == 1:
+            x1, y1, x2, y2 = lines[0]
+            return bytearray(kinematics.PrecalculatedMove(x1, x2, y1, y2, motors, tick_us, **options).moves)
+        move = kinematics.MultiLineMove(lines, motors, tick_us, max_mem_bytes=max_mem_bytes,
+                                        blendTolerance=blend_tolerance, **options)
+        stream = stepstream.decode(move.moves, move.length)
+        while move.next_line < len(move.lines):
+            move.precalculate_segment(move.current_segment_index + 1)
+            move.current_segment_index += 1
+            stream.extend(stepstream.decode(move.moves, move.length))
+        return stream
+
+
+def _random_lines(rng, count):
+    x, y = rng.randint(1, 8), rng.randint(1, 8)
+    lines = []
+    for _ in range(count):
+        nx, ny = rng.randint(1, 8), rng.randint(1, 8)
+        lines.append((x, y, nx, ny))
+        x, y = nx, ny
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the vectorized planner against the firmware.')
+    parser.add_argument('--moves', type=int, default=200, help='random moves to check')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = []
+    for _ in range(args.moves):
+        lines = _random_lines(rng, rng.choice((1, 1, 2, 3)))
+        x, y = lines[0][0], lines[0][1]
+        # Start exactly on the square, as after a clean move
+        positions = list(kinematics.stepsAt(_board_to_mm(x), _board_to_mm(y)))
+        cases.append((lines, positions))
+
+    for lines, _ in cases:
+        for line in lines:
+            time_scaling(*line)
+
+    started = time.perf_counter()
+    planned = [plan_lines(lines, positions)[0] for lines, positions in cases]
+    planner_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    reference = [firmware_stream(lines, positions) for lines, positions in cases]
+    firmware_s = time.perf_counter() - started
+
+    mismatches = sum(1 for a, b in zip(planned, reference) if a != b)
+    ticks = sum(len(p) for p in planned)
+    print(f'{len(cases)} moves, {ticks} ticks, {mismatches} mismatches')
+    print(f'vectorized: {len(cases) / planner_s:.0f} moves/s ({ticks / planner_s / 1e6:.2f} Mticks/s)')
+    print(f'firmware:   {len(cases) / firmware_s:.0f} moves/s ({ticks / firmware_s / 1e6:.2f} Mticks/s)')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
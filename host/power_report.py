@@ -0,0 +1,96 @@
+"""
+Motor power report for Board(powerPolicy=power.DYNAMIC) (pico/power.py). Plays the benchmark
+corpus on the simulated board, once with every motor fully on (FULL) and once with the duties
+following the step stream (DYNAMIC), and checks that:
+    * both policies play exactly the same ticks, so the power manager never changes the motion,
+    * every step is taken with the motor at its running duty or above (RUN or BOOST), i.e. the
+      lookahead raised the duty in time.
+For each group it prints the average duty of each motor and the thermal headroom of the hottest
+motor (how many times more winding heat it could take than when fully on), worst move first.
+
+    python -m host.power_report
+    python -m host.power_report --hold 16000 --run 50000
+"""
+import argparse
+
+from host import benchmark, simulator, stream_report
+
+import power  # noqa: E402  (on sys.path via host.simulator)
+import machine  # noqa: E402
+
+
+class CheckingEngine:
+    """Hands every tick to the real engine, keeps a copy and counts steps taken below running duty."""
+    def __init__(self, engine, motors):
+        self.engine = engine
+        self.motors = motors
+        self.stream = bytearray()
+        self.weak = 0
+
+    def start(self):
+        self.engine.start()
+
+    def apply(self, tick):
+        self.stream.append(tick)
+        for i, motor in enumerate(self.motors):
+            if (tick >> (2 * i)) & 0b11 and motor.enable_pin.duty_u16() < motor.pwm_duty:
+                self.weak += 1
+        self.engine.apply(tick)
+
+    def finish(self):
+        self.engine.finish()
+
+
+def play(lines, policy, args):
+    x, y = lines[0][0], lines[0][1]
+    board_obj = simulator.make_board(x, y, stream_report._positions(x, y))
+    board_obj.dualCore = args.dual_core
+    board_obj.setPowerPolicy(policy, args.hold, args.boost)
+    for motor in board_obj.motors:
+        motor.setPower(args.run)
+    checker = CheckingEngine(board_obj.engine, board_obj.motors)
+    board_obj.engine = checker
+    with simulator.quiet():
+        board_obj.calculateMultiMove([(line[2], line[3]) for line in lines])
+        board_obj.executeMove()
+    return checker, board_obj.lastPower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dynamic motor power on the benchmark corpus.')
+    parser.add_argument('--hold', type=int, default=22000, help='Motor.holdDuty (0-65535)')
+    parser.add_argument('--run', type=int, default=65535, help='Motor.pwm_duty (0-65535)')
+    parser.add_argument('--dual-core', action='store_true', help='fill later segments on a second thread')
+    parser.add_argument('--boost', type=int, default=65535, help='Motor.boostDuty (0-65535)')
+    args = parser.parse_args()
+    simulator.install()
+    machine.record = False
+    failures = 0
+    for group, moves in benchmark.corpus():
+        duty_sum = [0] * 4
+        ticks = changes = 0
+        worst = None
+        for lines in moves:
+            full, _ = play(lines, power.FULL, args)
+            dynamic, report = play(lines, power.DYNAMIC, args)
+            if full.stream != dynamic.stream or dynamic.weak:
+                failures += 1
+                print(f'  {benchmark.move_key(lines)}: streams differ or {dynamic.weak} steps below running duty')
+            for i, duty in enumerate(report.dutyTicks):
+                duty_sum[i] += duty
+            ticks += report.ticks
+            changes += report.changes
+            if worst is None or report.headroom < worst[1].headroom:
+                worst = (lines, report)
+        duty = '/'.join(f'{100 * d / (ticks * power.FULL_DUTY):.0f}' for d in duty_sum)
+        print(f'{group:>14}: {len(moves)} moves, average duty {duty} %, '
+              f'{changes / len(moves):.1f} duty changes per move, '
+              f'worst headroom {worst[1].headroom:.2f}x ({benchmark.move_key(worst[0])})')
+    if failures:
+        print(f'{failures} moves failed')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
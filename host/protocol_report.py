@@ -0,0 +1,207 @@
+"""
+Loopback comparison of the text and binary UART protocols. Every command is fed into the
+firmware's own CommandServer (pico/server.py) through the stand-in UART, and its first reply
+(ACK, or the position for POS) is taken back out and checked. Round-trip latency is the time
+the command and the reply spend on the wire at the given baud rate (10 bits per byte) plus
+the time the server took to handle the command on this host; the Pico is slower at the
+handling, so that part is only a relative measure.
+
+Then an RTE and a CHS whose moves take several segments are served on a board whose second
+core runs one thread at a time, like the RP2040's, and both moves are checked to have been
+planned there and played out of two buffers that it kept filling.
+
+With --port, the same commands are sent to a Pico running main.py over a real serial port
+(needs pyserial) and the round trips are timed with the host clock instead.
+
+    python -m host.protocol_report
+    python -m host.protocol_report --port /dev/ttyUSB0
+"""
+import argparse
+import time
+
+from host import frames, simulator
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+simulator.install()
+import bufpool  # noqa: E402  (needs the stand-in modules on sys.path first)
+import kinematics  # noqa: E402
+import machine  # noqa: E402
+import server  # noqa: E402
+
+FAST_BAUD = 921600
+# Segments of this many bytes make the routed moves below take several
+SMALL_SEGMENT = 512
+ROUTED = b'OCC(0800200008000201)\nRTE(8,8)\nCHS(8,8,1,8)\n'
+LONG_ROUTE = [(1, 1), (2, 3), (4, 4), (6, 5), (8, 7), (7, 8), (5, 6), (3, 5), (1, 8), (1, 1)]
+
+
+def scenarios():
+    """(name, text command, binary frame, reply count) for each command compared."""
+    return [
+        ('POS', b'POS\n', frames.encode([frames.pos(1)]), 1),
+        ('MOV 2 squares', b'MOV(1,1,4,4)\n', frames.encode([frames.mov(2, [(1, 1), (4, 4)])]), 1),
+        ('MOV 10 squares', ('MOV(' + ','.join(f'{x},{y}' for x, y in LONG_ROUTE) + ')\n').encode(),
+         frames.encode([frames.mov(3, LONG_ROUTE)]), 1),
+        ('OCC + 3 x MOV', b'OCC(FFFF00000000FFFF)\nMOV(2,1,3,3)\nMOV(7,1,6,3)\nMOV(2,8,3,6)\n',
+         frames.encode([frames.occ(4, 0xFFFF00000000FFFF), frames.mov(5, [(2, 1), (3, 3)]),
+                        frames.mov(6, [(7, 1), (6, 3)]), frames.mov(7, [(2, 8), (3, 6)])]), 4),
+    ]
+
+
+def wire_us(count, baud):
+    return count * 10 * 1000000 / baud
+
+
+def loopback(command_server, uart, data, repeats=200):
+    """(replies, host microseconds to handle `data`), with the server's queue emptied after each run."""
+    best = None
+    for _ in range(repeats):
+        uart.take()
+        command_server.commands.clear()
+        uart.feed(data)
+        started = time.perf_counter()
+        while command_server.handleInput():
+            pass
+        elapsed = (time.perf_counter() - started) * 1000000
+        best = elapsed if best is None else min(best, elapsed)
+    return uart.take(), best
+
+
+def check(name, text_reply, binary_reply, count):
+    lines = text_reply.split(b'\r\n')[:-1]
+    replies = frames.decode(binary_reply)
+    if len(lines) != count or len(replies) != count:
+        raise SystemExit(f'{name}: expected {count} replies, got {lines} and {replies}')
+    for line, (kind, _, _) in zip(lines, replies):
+        if not line.startswith(kind.encode()):
+            raise SystemExit(f'{name}: text reply {line} but binary reply {kind}')
+
+
+def simulated(baud):
+    board_obj = simulator.make_board()
+    uart = machine.UART(0, baudrate=baud)
+    command_server = server.CommandServer(board_obj, uart)
+    print(f'{"command":16} {"protocol":18} {"out":>5} {"in":>5} {"wire ms":>8} {"host us":>8} {"round trip ms":>14}')
+    with simulator.quiet():
+        results = []
+        for name, text, binary, count in scenarios():
+            text_reply, text_us = loopback(command_server, uart, text)
+            binary_reply, binary_us = loopback(command_server, uart, binary)
+            check(name, text_reply, binary_reply, count)
+            results.append((name, text, text_reply, text_us, binary, binary_reply, binary_us))
+    for name, text, text_reply, text_us, binary, binary_reply, binary_us in results:
+        for protocol, rate, sent, received, host_us in (
+                (f'text {baud}', baud, text, text_reply, text_us),
+                (f'binary {baud}', baud, binary, binary_reply, binary_us),
+                (f'binary {FAST_BAUD}', FAST_BAUD, binary, binary_reply, binary_us)):
+            wire = wire_us(len(sent) + len(received), rate)
+            print(f'{name:16} {protocol:18} {len(sent):5} {len(received):5} {wire / 1000:8.2f} '
+                  f'{host_us:8.1f} {(wire + host_us) / 1000:14.2f}')
+
+    # Switching rate: the ACK goes out at the old rate, then the UART is reinitialised
+    uart.take()
+    uart.feed(frames.encode([frames.baud(9, FAST_BAUD)]))
+    with simulator.quiet():
+        while command_server.handleInput():
+            pass
+    replies = frames.decode(uart.take())
+    print(f'BAUD {FAST_BAUD}: {replies[0][0]}, UART now at {uart.baudrate} baud')
+    ok = replies[0][0] == 'ACK' and uart.baudrate == FAST_BAUD
+    return 0 if second_core(baud) and ok else 1
+
+
+def second_core(baud):
+    """
+    Serves ROUTED with the second core limited to one thread; True if both moves were planned on
+    it and every later segment was filled there, not by the player.
+    """
+    simulator.reset()
+    board_obj = simulator.make_board()
+    board_obj.pool = bufpool.BufferPool(size=SMALL_SEGMENT)
+    uart = machine.UART(0, baudrate=baud)
+    command_server = server.CommandServer(board_obj, uart)
+    played = []
+    end_move = board_obj.endMove
+
+    def endMove(move):
+        played.append(move)
+        end_move(move)
+    board_obj.endMove = endMove
+
+    async def serve():
+        serving = asyncio.create_task(command_server.serve())
+        received = b''
+        try:
+            while received.count(b'DONE') + received.count(b'NAK') < 2:
+                received += uart.take()
+                await asyncio.sleep(0)
+        finally:
+            serving.cancel()
+        return received
+
+    uart.feed(ROUTED)
+    with simulator.second_core() as core, simulator.quiet():
+        replies = asyncio.run(serve()).split(b'\r\n')[:-1]
+    done = [reply for reply in replies if reply.startswith(b'DONE')]
+    ok = len(done) == 2 and core.started == 1 and not core.refused and len(played) == 2
+    for move in played:
+        two_buffers = (isinstance(move, kinematics.DualCoreMultiLineMove) and move.producer is command_server
+                       and move.segment_count >= 2 and move.next_segment == move.segment_count)
+        ok = ok and two_buffers
+        segments = getattr(move, 'segment_count', 1)
+        print(f'{type(move).__name__} to {move.x2},{move.y2}: {segments} segments, '
+              f'{getattr(move, "stalls", 0)} segment waits, '
+              f'{"two buffers filled on the second core" if two_buffers else "NOT filled on the second core"}')
+    print(f'RTE + CHS on one second core: {b" ".join(replies).decode()}, '
+          f'{core.started} thread started, {core.refused} refused')
+    return ok
+
+
+def on_device(port, baud, timeout=2.0):
+    import serial  # pyserial, only needed for a real Pico
+    link = serial.Serial(port, baud, timeout=timeout)
+
+    def round_trip(data, binary, count):
+        link.reset_input_buffer()
+        started = time.perf_counter()
+        link.write(data)
+        received = b''
+        while True:
+            chunk = link.read(link.in_waiting or 1)
+            if not chunk:
+                raise SystemExit(f'No reply to {data!r}')
+            received += chunk
+            if (len(frames.decode(received)) if binary else received.count(b'\r\n')) >= count:
+                return (time.perf_counter() - started) * 1000
+
+    print(f'{"command":16} {"text ms":>8} {"binary ms":>10}')
+    for name, text, binary, count in scenarios():
+        if name != 'POS':
+            continue # Moves would really run; POS is the pure round trip
+        text_ms = min(round_trip(text, False, count) for _ in range(20))
+        binary_ms = min(round_trip(binary, True, count) for _ in range(20))
+        print(f'{name:16} {text_ms:8.2f} {binary_ms:10.2f} at {baud} baud')
+    link.write(frames.encode([frames.baud(9, FAST_BAUD)]))
+    if frames.decode(link.read(6))[:1] == [('ACK', 9, None)]:
+        link.baudrate = FAST_BAUD
+        binary_ms = min(round_trip(frames.encode([frames.pos(1)]), True, 1) for _ in range(20))
+        print(f'{"POS":16} {"":8} {binary_ms:10.2f} at {FAST_BAUD} baud')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Text vs binary UART protocol round trips.')
+    parser.add_argument('--baud', type=int, default=9600, help='rate the text protocol runs at')
+    parser.add_argument('--port', help='serial port of a Pico running main.py (needs pyserial)')
+    args = parser.parse_args()
+    if args.port:
+        return on_device(args.port, args.baud)
+    return simulated(args.baud)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,221 @@
+"""
+Host-side simulator for the Pico firmware.
+Puts the stand-in machine/utime/micropython modules (host/stubs) and the firmware
+directory (pico/) on sys.path so `import kinematics`, `import board` and `import motor`
+work unmodified on a workstation.
+
+Typical use:
+    from host import simulator
+    simulator.install()
+    board_obj = simulator.make_board()
+    report = simulator.run_move(board_obj, [(4, 4), (4, 8)])
+    print(report)
+"""
+import builtins
+import contextlib
+import gc
+import io
+import os
+import sys
+import time
+import _thread
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+STUBS_DIR = os.path.join(HOST_DIR, 'stubs')
+PICO_DIR = os.path.join(os.path.dirname(HOST_DIR), 'pico')
+
+# Same wiring as pico/main.py: (pins, invertDirection, currentPosition)
+MOTOR_CONFIG = [
+    ([10, 7, 21, 9, 8], True, 0),
+    ([2, 3, 6, 4, 5], False, 3826),
+    ([20, 17, 18, 19, 16], False, 3826),
+    ([12, 11, 13, 14, 15], False, 5980),
+]
+
+
+def _pointer(buffer):
+    return buffer
+
+
+def install():
+    """
+    Make the firmware importable. Safe to call more than once.
+    CPython's gc has no mem_free()/mem_alloc(), so rough equivalents are attached for
+    firmware code that reports heap usage.
+    """
+    for path in (PICO_DIR, STUBS_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    # Viper's pointer casts are builtins on the Pico; on the host a pointer is just the buffer
+    for name in ('ptr8', 'ptr16', 'ptr32'):
+        if not hasattr(builtins, name):
+            setattr(builtins, name, _pointer)
+    if not hasattr(builtins, 'uint'):
+        builtins.uint = int
+    if not hasattr(gc, 'mem_free'):
+        # The Pico has ~190 KB of heap once MicroPython has booted
+        gc.mem_free = lambda: 190 * 1024
+        gc.mem_alloc = lambda: 0
+
+
+def reset():
+    """Rewind the simulated clock and clear all recorded GPIO activity."""
+    install()
+    import machine
+    import utime
+    machine.reset()
+    utime.reset()
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the firmware's print() output while the block runs."""
+    saved = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        yield
+    finally:
+        sys.stdout = saved
+
+
+class SecondCore:
+    """
+    Stand-in for _thread on the RP2040, whose second core runs one thread at a time:
+    start_new_thread raises OSError while the last thread it started is still running.
+    """
+    def __init__(self):
+        self.running = False
+        self.started = 0   # Threads started
+        self.refused = 0   # Threads refused because the core was busy
+
+    def start_new_thread(self, function, args):
+        if self.running:
+            self.refused += 1
+            raise OSError(16, 'core1 in use')
+        self.running = True
+        self.started += 1
+
+        def run():
+            try:
+                function(*args)
+            finally:
+                self.running = False
+        _thread.start_new_thread(run, ())
+
+    def allocate_lock(self):
+        return _thread.allocate_lock()
+
+
+@contextlib.contextmanager
+def second_core():
+    """Runs the block with the firmware's threads on one SecondCore, which it yields."""
+    install()
+    import kinematics
+    import server
+    core = SecondCore()
+    saved = kinematics._thread, server._thread
+    kinematics._thread = server._thread = core
+    try:
+        yield core
+    finally:
+        kinematics._thread, server._thread = saved
+
+
+def make_motors(positions=None):
+    """Build the four motors exactly as main.py does, optionally overriding the start positions."""
+    install()
+    import motor
+    motors = []
+    for i, (pins, invert, position) in enumerate(MOTOR_CONFIG):
+        if positions is not None:
+            position = positions[i]
+        motors.append(motor.Motor(pins=pins, invertDirection=invert, currentPosition=position))
+    return motors
+
+
+def make_board(x=1, y=1, positions=None):
+    """Build a Board at square (x, y) with main.py's motor configuration."""
+    install()
+    import board
+    return board.Board(x, y, make_motors(positions))
+
+
+class MoveReport:
+    """Measurements of one simulated move."""
+    def __init__(self, waypoints, precalc_s, ticks, tick_us, start_us, end_us, steps, transitions):
+        self.waypoints = waypoints
+        self.precalc_s = precalc_s      # Host wall-clock seconds spent planning the move
+        self.ticks = ticks              # Number of playback ticks executed
+        self.tick_us = tick_us
+        self.start_us = start_us        # Simulated time when playback started
+        self.end_us = end_us            # Simulated time when playback finished
+        self.steps = steps              # Steps taken by each motor, measured from the GPIO trace
+        self.transitions = transitions  # GPIO transitions recorded during playback
+
+    @property
+    def planned_us(self):
+        return self.ticks * self.tick_us
+
+    @property
+    def played_us(self):
+        return self.end_us - self.start_us
+
+    def __repr__(self):
+        return (f'MoveReport({self.waypoints}: precalc={self.precalc_s * 1000:.1f}ms '
+                f'ticks={self.ticks} played={self.played_us / 1000:.1f}ms steps={self.steps})')
+
+
+def count_steps(transitions, motors):
+    """
+    Count the steps each motor took from a GPIO trace.
+    A step always changes the coil pattern, so every distinct timestamp at which any of a
+    motor's four coil pins changed level is one step.
+    """
+    owner = {}
+    for i, m in enumerate(motors):
+        for pin in m.pins[:4]:
+            owner[pin.id] = i
+    seen = [set() for _ in motors]
+    for t, pin_id, _ in transitions:
+        i = owner.get(pin_id)
+        if i is not None:
+            seen[i].add(t)
+    return [len(s) for s in seen]
+
+
+def run_move(board_obj, waypoints, show_output=False, mode=None, tick_cost_us=0):
+    """
+    Plan and play one MOV on the simulated board and measure it.
+    Planning is timed with the host's wall clock; playback is timed on the simulated clock.
+    `mode` selects the playback engine (see pico/playback.py), defaulting to the board's.
+    `tick_cost_us` charges simulated time for every updateMotors() call, to model the
+    decode/GPIO cost the Pico pays per tick.
+    """
+    install()
+    import machine
+    import utime
+    output = contextlib.nullcontext() if show_output else quiet()
+    with output:
+        started = time.perf_counter()
+        board_obj.calculateMultiMove(waypoints)
+        precalc_s = time.perf_counter() - started
+
+        move = board_obj.currentMove
+        ticks = [0]
+        play = move.updateMotors
+
+        def counted():
+            play()
+            utime.advance(tick_cost_us)
+            if not move.complete:
+                ticks[0] += 1
+        # Count playback ticks without touching the firmware's own loop
+        move.updateMotors = counted
+
+        first = len(machine.transitions)
+        start_us = utime.now_us()
+        board_obj.executeMove(mode)
+        end_us = utime.now_us()
+    trace = machine.transitions[first:]
+    return MoveReport(waypoints, precalc_s, ticks[0], move.tickTimeUs, start_us, end_us,
+                      count_steps(trace, board_obj.motors), trace)
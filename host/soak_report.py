@@ -0,0 +1,104 @@
+"""
+Long-running heap check for the step buffer pool (pico/bufpool.py). Plays thousands of random
+moves (one to three lines each, straight and routed around random pieces) on the simulated board
+with the moves borrowing their step buffers from a BufferPool, the way main.py sets it up. It
+checks that:
+    * no move had to allocate a step buffer of its own (no pool misses),
+    * the objects still allocated between moves (sys.getallocatedblocks) stay flat: the last tenth
+      of the run may hold at most --drift more than the first tenth. Step buffers are too large
+      to be counted there, which is what the pool misses are for.
+    * every buffer went back to the pool.
+The first --warmup moves fill the router's caches and aren't counted. The ticks only update the
+motor positions (PositionEngine) instead of driving the stand-in GPIO, which would take most of
+the time; a 2000-move run still takes a few minutes.
+
+    python -m host.soak_report
+    python -m host.soak_report --moves 5000 --dual-core
+"""
+import argparse
+import gc
+import random
+import sys
+
+from host import simulator
+
+simulator.install()
+
+import bufpool  # noqa: E402
+import machine  # noqa: E402
+import metrics  # noqa: E402
+import stepengine  # noqa: E402
+
+
+class PositionEngine(stepengine.SioEngine):
+    """Steps the motor positions like the SIO engine, without writing the coil pins."""
+    def apply(self, tick):
+        self.toggle(tick)
+
+
+def random_waypoints(rng, x, y):
+    waypoints = []
+    for _ in range(rng.choice((1, 1, 2, 3))):
+        nx, ny = x, y
+        while (nx, ny) == (x, y):
+            nx, ny = rng.randint(1, 8), rng.randint(1, 8)
+        waypoints.append((nx, ny))
+        x, y = nx, ny
+    return waypoints
+
+
+def soak(board_obj, rng, count, samples, warmup):
+    """Plays `warmup` + `count` moves; returns the memory held after `samples` of the counted ones."""
+    held = []
+    every = max(1, count // samples)
+    for i in range(-warmup, count):
+        if rng.random() < 0.25:
+            # A routed move around a few random pieces, when one exists
+            board_obj.setOccupancy(rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64))
+            x, y = rng.randint(1, 8), rng.randint(1, 8)
+            board_obj.setOccupied(board_obj.x, board_obj.y, False)
+            board_obj.setOccupied(x, y, False)
+            if (x, y) == (board_obj.x, board_obj.y) or not board_obj.calculateRoute(x, y):
+                board_obj.calculateMultiMove(random_waypoints(rng, board_obj.x, board_obj.y))
+        else:
+            board_obj.calculateMultiMove(random_waypoints(rng, board_obj.x, board_obj.y))
+        board_obj.executeMove()
+        board_obj.currentMove = None
+        if i >= 0 and i % every == every - 1:
+            gc.collect()
+            held.append(sys.getallocatedblocks())
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play thousands of moves and check the heap stays flat.')
+    parser.add_argument('--moves', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=200, help='moves played before measuring')
+    parser.add_argument('--seed', type=int, default=5)
+    parser.add_argument('--drift', type=int, default=256, help='allowed growth in blocks held between moves')
+    parser.add_argument('--dual-core', action='store_true', help='fill later segments on a second thread')
+    args = parser.parse_args()
+    machine.record = False
+
+    with simulator.quiet():
+        board_obj = simulator.make_board()
+        board_obj.dualCore = args.dual_core
+        board_obj.pool = bufpool.BufferPool()
+        board_obj.engine = PositionEngine(board_obj.motors)
+        metrics.reset()
+        held = soak(board_obj, random.Random(args.seed), args.moves, 50, args.warmup)
+
+    pool = board_obj.pool
+    tenth = max(1, len(held) // 10)
+    first = sum(held[:tenth]) / tenth
+    last = sum(held[-tenth:]) / tenth
+    print(f'pool: {len(pool.blocks)} x {pool.size} bytes, {metrics.poolMisses} misses, '
+          f'{len(pool.free)} blocks free after the run')
+    print(f'{args.moves} moves: {first:.0f} blocks held between moves at the start, {last:.0f} at the end '
+          f'({last - first:+.0f}), min {min(held)}, max {max(held)}')
+    failed = metrics.poolMisses or len(pool.free) != len(pool.blocks) or last - first > args.drift
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,68 @@
+"""
+Checks the firmware's spool lookup table (kinematics.spoolSteps) against the exact spool
+polynomial: its RAM use, the largest and mean step error over the whole table range and over
+the tick targets of every square-to-square line, and how many of those targets round to a
+different step than the exact polynomial would.
+
+    python -m host.spool_report
+"""
+import argparse
+
+import numpy as np
+
+from host import planner
+
+import kinematics  # noqa: E402  (on sys.path via host.planner)
+
+
+def exact_steps(dSq):
+    return kinematics._A * dSq + kinematics._B * np.sqrt(dSq) + kinematics._C
+
+
+def _lines():
+    for a in range(64):
+        for b in range(64):
+            if a != b:
+                yield a % 8 + 1, a // 8 + 1, b % 8 + 1, b // 8 + 1
+
+
+def line_targets(tick_us=2000):
+    """Squared cable lengths of all 4 motors at every tick of every square-to-square line."""
+    target_x, target_y, _ = planner.tick_grid(list(_lines()), tick_us)
+    a1Sq = (target_x + 17) ** 2
+    b1Sq = (target_y + 17) ** 2
+    a2Sq = (238 - target_x) ** 2
+    b3Sq = (238 - target_y) ** 2
+    return np.concatenate((a1Sq + b1Sq, a2Sq + b1Sq, a1Sq + b3Sq, a2Sq + b3Sq))
+
+
+def report(tick_us=2000, samples=1000000):
+    table = kinematics._SPOOL_TABLE
+    print(f'{len(table)} entries, {len(table) * table.itemsize} bytes, '
+          f'd^2 from {kinematics.SPOOL_MIN_SQ} to {kinematics.SPOOL_MAX_SQ} mm^2')
+    dense = np.linspace(kinematics.SPOOL_MIN_SQ, kinematics.SPOOL_MAX_SQ, samples)
+    error = np.abs(planner.spool_steps(dense) - exact_steps(dense))
+    worst = error.max()
+    print(f'whole range: max error {worst:.4f} steps (at d^2 = {dense[error.argmax()]:.0f}), '
+          f'mean {error.mean():.5f}')
+    dSq = line_targets(tick_us)
+    table_steps = planner.spool_steps(dSq)
+    exact = exact_steps(dSq)
+    error = np.abs(table_steps - exact)
+    differing = np.count_nonzero(np.rint(table_steps) != np.rint(exact))
+    print(f'{len(dSq)} motor targets on {64 * 63} lines: max error {error.max():.4f} steps, '
+          f'mean {error.mean():.5f}, {differing} ({100 * differing / len(dSq):.3f}%) round differently')
+    return max(worst, error.max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spool lookup table error against the exact polynomial.')
+    parser.add_argument('--tick-us', type=int, default=2000)
+    parser.add_argument('--tolerance', type=float, default=0.02, help='largest acceptable error (steps)')
+    args = parser.parse_args()
+    worst = report(args.tick_us)
+    return 1 if worst > args.tolerance else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
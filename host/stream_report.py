@@ -0,0 +1,73 @@
+"""
+Compression report for compact step streams (pico/stepstream.py) on typical chess moves:
+every single-line square-to-square move, every knight move (two lines) and a few long
+multi-line tours. Every encoded stream is decoded again and checked against the raw one.
+
+    python -m host.stream_report
+"""
+import argparse
+
+from host import planner
+
+import kinematics  # noqa: E402  (on sys.path via host.planner)
+import stepstream  # noqa: E402
+
+
+def _positions(x, y):
+    return list(kinematics.stepsAt(planner._board_to_mm(x), planner._board_to_mm(y)))
+
+
+def single_lines():
+    for a in range(64):
+        for b in range(64):
+            if a != b:
+                yield [(a % 8 + 1, a // 8 + 1, b % 8 + 1, b // 8 + 1)]
+
+
+def knight_moves():
+    # Along the two squares first, then the one, like a piece sliding between the others
+    for x in range(1, 9):
+        for y in range(1, 9):
+            for dx, dy in ((1, 2), (2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (-1, -2), (-2, -1)):
+                if 1 <= x + dx <= 8 and 1 <= y + dy <= 8:
+                    if abs(dx) == 2:
+                        yield [(x, y, x + dx, y), (x + dx, y, x + dx, y + dy)]
+                    else:
+                        yield [(x, y, x, y + dy), (x, y + dy, x + dx, y + dy)]
+
+
+def tours():
+    yield [(1, 1, 8, 8), (8, 8, 1, 8), (1, 8, 8, 1), (8, 1, 1, 1)]
+    yield [(1, 1, 2, 1), (2, 1, 2, 8), (2, 8, 3, 8), (3, 8, 3, 1), (3, 1, 4, 1), (4, 1, 4, 8)]
+    yield [(4, 4, 5, 6), (5, 6, 7, 5), (7, 5, 6, 3), (6, 3, 4, 4)]
+
+
+def measure(paths):
+    raw_bytes = compact_bytes = count = 0
+    for lines in paths:
+        raw, _ = planner.plan_lines(lines, _positions(lines[0][0], lines[0][1]))
+        compact = stepstream.encode(raw)
+        if stepstream.decode(compact) != raw:
+            raise AssertionError(f'round trip failed for {lines}')
+        raw_bytes += len(raw)
+        compact_bytes += len(compact)
+        count += 1
+    return count, raw_bytes, compact_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact step stream compression on typical moves.')
+    parser.add_argument('--segment-bytes', type=int, default=10000, help='MultiLineMove max_mem_bytes')
+    args = parser.parse_args()
+    tick_s = 0.002
+    for name, paths in (('single lines', single_lines()), ('knight moves', knight_moves()), ('tours', tours())):
+        count, raw_bytes, compact_bytes = measure(paths)
+        ratio = raw_bytes / compact_bytes
+        print(f'{name:>12}: {count} moves, {raw_bytes} -> {compact_bytes} bytes ({ratio:.2f}x), '
+              f'{args.segment_bytes} bytes hold {args.segment_bytes * tick_s:.0f} s raw / '
+              f'{args.segment_bytes * tick_s * ratio:.0f} s compact')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
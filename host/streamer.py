@@ -0,0 +1,243 @@
+"""
+Host side of host-planned streaming (pico/hoststream.py): plans a move with the vectorized
+planner (byte-identical to the firmware's) and streams its packed ticks to the Pico, never
+sending more than the credit the Pico has handed out. The Pico only checks that the move starts
+from its motor positions and plays the ticks as they arrive.
+
+Without --port the Pico is simulated: the firmware's CommandServer runs in this process on the
+stand-in UART, and the link carries at most --baud (10 bits per byte) on the simulated clock.
+Each rate is checked for DONE, the played ticks matching the planned ones and the motors ending
+on the square; below about 5000 baud the link carries fewer ticks than playback uses, and the
+move slows down (held ticks) instead of stuttering. Then two streams are sent back to back (the
+move and the way back to the start), the second STREAM right after the first, which have to be
+played one after the other, both DONE.
+
+    python -m host.streamer 8,8 1,8
+    python -m host.streamer --baud 2400 4,4
+    python -m host.streamer --port /dev/ttyACM0 --baud 115200 4,4 4,8
+"""
+import argparse
+import time
+
+from host import benchmark, frames, planner, simulator
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+import kinematics  # noqa: E402  (on sys.path via host.planner)
+import machine  # noqa: E402
+import metrics  # noqa: E402
+import server  # noqa: E402
+import utime  # noqa: E402
+
+SIMULATED_BAUDS = (115200, 9600, 4800)
+STREAM_TAG = 1
+
+
+def parse_square(text):
+    x, y = (int(part) for part in text.split(','))
+    if not (1 <= x <= 8 and 1 <= y <= 8):
+        raise argparse.ArgumentTypeError(f'{text} is not on the board')
+    return x, y
+
+
+def plan(start, squares):
+    """(start positions, packed ticks) of the lines from `start` through `squares`."""
+    lines = []
+    x1, y1 = start
+    for x, y in squares:
+        lines.append((x1, y1, x, y))
+        x1, y1 = x, y
+    # Every move ends exactly on its square's step targets, so that's where this one starts
+    positions = list(kinematics.stepsAt(planner._board_to_mm(start[0]), planner._board_to_mm(start[1])))
+    ticks, _ = planner.plan_lines(lines, positions)
+    return positions, ticks
+
+
+class StreamSender:
+    """
+    Sends one planned move: STREAM, then DATA as credit arrives, then END. Call pump() with
+    whatever came back until it returns True; `result` is then 'DONE' or 'NAK'.
+    """
+    def __init__(self, write, square, positions, ticks, tag=STREAM_TAG):
+        self.write = write
+        self.tag = tag
+        self.ticks = ticks
+        self.sent = 0          # Ticks sent
+        self.credit = 0        # Ticks the Pico will still take
+        self.received = b''
+        self.seen = 0          # Replies in self.received already handled
+        self.ended = False
+        self.result = None
+        self.send(frames.stream(tag, square[0], square[1], positions))
+
+    def send(self, command):
+        self.write(frames.encode([command]))
+
+    def pump(self, incoming):
+        """Handles the replies in `incoming`, then sends as many ticks as the credit allows."""
+        self.received += incoming
+        replies = frames.decode(self.received)
+        for kind, tag, value in replies[self.seen:]:
+            if tag != self.tag:
+                continue
+            if kind == 'CREDIT':
+                self.credit += value
+            elif kind in ('DONE', 'NAK'):
+                self.result = kind
+        self.seen = len(replies)
+        if self.result is not None:
+            return True
+        while self.credit and self.sent < len(self.ticks):
+            count = min(self.credit, frames.MAX_DATA, len(self.ticks) - self.sent)
+            self.send(frames.data(self.tag, self.ticks[self.sent:self.sent + count]))
+            self.sent += count
+            self.credit -= count
+        if self.sent == len(self.ticks) and not self.ended:
+            self.send(frames.end(self.tag))
+            self.ended = True
+        return False
+
+
+def simulated(baud, moves):
+    """
+    Streams the moves (lists of squares, each from where the last one ends) to a simulated Pico
+    over a link of `baud`, every STREAM sent at once; returns (senders, board, recorder).
+    """
+    simulator.reset()
+    metrics.reset()
+    board_obj = simulator.make_board()
+    recorder = benchmark.RecordingEngine(board_obj.engine)
+    board_obj.engine = recorder
+    uart = machine.UART(0, baudrate=baud)
+    command_server = server.CommandServer(board_obj, uart)
+    plans = []
+    start = (board_obj.x, board_obj.y)
+    for squares in moves:
+        plans.append((squares[-1],) + plan(start, squares))
+        start = squares[-1]
+
+    async def host():
+        wire = bytearray()   # Written by the host, not through the link yet
+        carried = 0          # Bytes the link has carried (or could have, while idle)
+        started = utime.ticks_us()
+        senders = [StreamSender(wire.extend, square, positions, ticks, STREAM_TAG + i)
+                   for i, (square, positions, ticks) in enumerate(plans)]
+        while True:
+            if wire and not command_server.playing:
+                # Nothing else moves the simulated clock on while the Pico is idle
+                utime.advance(len(wire) * 10000000 // baud + 1)
+            # The link carries baud / 10 bytes a second on the simulated clock
+            capacity = utime.ticks_diff(utime.ticks_us(), started) * baud // 10000000
+            if capacity > carried:
+                count = min(capacity - carried, len(wire))
+                if count:
+                    uart.feed(bytes(wire[:count]))
+                    del wire[:count]
+                # Time the link sat idle can't be used later
+                carried = capacity if not wire else carried + count
+            incoming = uart.take()
+            finished = [sender.pump(incoming) for sender in senders]
+            if all(finished):
+                return senders
+            await asyncio.sleep(0)
+
+    async def loopback():
+        serving = asyncio.create_task(command_server.serve())
+        try:
+            return await host()
+        finally:
+            serving.cancel()
+
+    return asyncio.run(loopback()), board_obj, recorder
+
+
+def run_simulated(bauds, squares):
+    # The simulated clock only advances during playback, so the idle tasks mustn't sleep for real
+    server.POLL_S = 0
+    machine.record = False
+    print(f'{"baud":>7} {"ticks":>6} {"held":>6} {"underruns":>9} {"planned ms":>10} {"played ms":>10} '
+          f'{"landed":>6} result')
+    failed = 0
+    for baud in bauds:
+        with simulator.quiet():
+            (sender,), board_obj, recorder = simulated(baud, [squares])
+        report = board_obj.lastPlayback
+        played = [motor.position for motor in board_obj.motors]
+        target = list(kinematics.stepsAt(planner._board_to_mm(squares[-1][0]), planner._board_to_mm(squares[-1][1])))
+        exact = bytes(recorder.stream) == bytes(sender.ticks)
+        ok = sender.result == 'DONE' and exact and played == target
+        failed += not ok
+        print(f'{baud:7} {len(sender.ticks):6} {report.ticks - len(sender.ticks):6} '
+              f'{metrics.underruns:9} {len(sender.ticks) * report.tickTimeUs / 1000:10.0f} '
+              f'{report.actualUs / 1000:10.0f} {str(played == target):>6} {sender.result}'
+              f'{"" if exact else " (played ticks differ)"}')
+    failed += not back_to_back(bauds[0], squares)
+    return 1 if failed else 0
+
+
+def back_to_back(baud, squares):
+    """Streams the move and the way back to (1, 1) with both STREAMs sent at once; True if both played whole."""
+    back = list(reversed(squares[:-1])) + [(1, 1)]
+    with simulator.quiet():
+        senders, board_obj, recorder = simulated(baud, [squares, back])
+    played = [motor.position for motor in board_obj.motors]
+    target = list(kinematics.stepsAt(planner._board_to_mm(1), planner._board_to_mm(1)))
+    ticks = b''.join(bytes(sender.ticks) for sender in senders)
+    exact = bytes(recorder.stream) == ticks
+    results = [sender.result for sender in senders]
+    print(f'back to back at {baud} baud: {len(ticks)} ticks, {"/".join(results)}, '
+          f'{"landed" if played == target else f"ended at {played} instead of {target}"}'
+          f'{"" if exact else " (played ticks differ)"}')
+    return results == ['DONE', 'DONE'] and exact and played == target
+
+
+def request(link, command):
+    """Sends one command and returns its first reply."""
+    link.write(frames.encode([command]))
+    received = b''
+    while not frames.decode(received):
+        chunk = link.read(1)
+        if not chunk:
+            raise SystemExit(f'No reply to {command!r}')
+        received += chunk
+    return frames.decode(received)[0]
+
+
+def on_device(port, baud, squares, timeout=5.0):
+    import serial  # pyserial, only needed for a real Pico
+    # main.py starts at 9600 baud; BAUD switches once it's ACKed
+    link = serial.Serial(port, 9600, timeout=timeout)
+    if baud != 9600:
+        if request(link, frames.baud(STREAM_TAG + 2, baud))[0] != 'ACK':
+            raise SystemExit(f'The Pico refused {baud} baud')
+        link.baudrate = baud
+    _, _, start = request(link, frames.pos(STREAM_TAG + 1))
+    positions, ticks = plan(start, squares)
+    print(f'Streaming {len(ticks)} ticks from {start} through {squares}')
+    link.timeout = 0
+    started = time.perf_counter()
+    sender = StreamSender(link.write, squares[-1], positions, ticks)
+    while not sender.pump(link.read(link.in_waiting or 1)):
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    print(f'{sender.result} after {elapsed * 1000:.0f} ms ({len(ticks) * 2} ms planned)')
+    return 0 if sender.result == 'DONE' else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a host-planned move to the Pico.')
+    parser.add_argument('squares', nargs='*', type=parse_square, default=[(8, 8), (1, 8)],
+                        help='waypoints as x,y (the move starts where the magnet is)')
+    parser.add_argument('--baud', type=int, help='link rate (simulated: several by default)')
+    parser.add_argument('--port', help='serial port of a Pico running main.py (needs pyserial)')
+    args = parser.parse_args()
+    if args.port:
+        return on_device(args.port, args.baud or 9600, args.squares)
+    return run_simulated([args.baud] if args.baud else SIMULATED_BAUDS, args.squares)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
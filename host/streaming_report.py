@@ -0,0 +1,126 @@
+"""
+Check and latency report for kinematics.StreamingMove, which works a line's ticks out while it
+plays. Random square-to-square lines (and every long diagonal) are played on the simulated clock
+with the DEADLINE engine, with the float path and with fixedPoint=True. Producing a tick is
+charged --produce-us of simulated time, as the precalculation would cost on the Pico, so the
+slack filling has the same time budget it would have there. For every line it checks that the
+played ticks are exactly the PrecalculatedMove stream, and it reports:
+    * the time from creating the move to its first step, against precalculating the whole line
+      first. Both move types plan the same velocity profile beforehand, which isn't counted,
+    * the deepest lookahead reached in the ring, and the stalls (ticks produced late, on demand).
+
+    python -m host.streaming_report
+    python -m host.streaming_report --produce-us 600 --lines 100
+"""
+import argparse
+import random
+
+from host import simulator, stream_report
+
+simulator.install()
+
+import kinematics  # noqa: E402
+import machine  # noqa: E402
+import playback  # noqa: E402
+import stepengine  # noqa: E402
+import utime  # noqa: E402
+
+
+class RecordingEngine(stepengine.SioEngine):
+    """Keeps every applied tick and the simulated time of the first, and steps the motor positions."""
+    def __init__(self, motors):
+        super().__init__(motors)
+        self.stream = bytearray()
+        self.firstUs = None
+
+    def apply(self, tick):
+        if self.firstUs is None:
+            self.firstUs = utime.now_us()
+        self.stream.append(tick)
+        self.toggle(tick)
+
+
+def timed_move(produce_us):
+    class TimedStreamingMove(kinematics.StreamingMove):
+        """Charges produce_us of simulated time for every tick produced."""
+        def __init__(self, *args, **kwargs):
+            self.deepest = 0
+            super().__init__(*args, **kwargs)
+
+        def produce(self, count):
+            made = super().produce(count)
+            utime.advance(made * produce_us)
+            self.deepest = max(self.deepest, self.head - self.tail)
+            return made
+    return TimedStreamingMove
+
+
+def lines(count, seed):
+    rng = random.Random(seed)
+    for x1, y1, x2, y2 in ((1, 1, 8, 8), (8, 8, 1, 1), (1, 8, 8, 1), (8, 1, 1, 8)):
+        yield x1, y1, x2, y2
+    for _ in range(count):
+        x1, y1 = rng.randint(1, 8), rng.randint(1, 8)
+        x2, y2 = x1, y1
+        while (x2, y2) == (x1, y1):
+            x2, y2 = rng.randint(1, 8), rng.randint(1, 8)
+        yield x1, y1, x2, y2
+
+
+def stream_line(move_class, x1, y1, x2, y2, fixed_point):
+    """
+    Plays the line as a `move_class` (see timed_move) from the simulated time it's made:
+    (PrecalculatedMove of the same line, the move, its RecordingEngine, PlaybackReport, start us).
+    """
+    positions = stream_report._positions(x1, y1)
+    with simulator.quiet():
+        reference = kinematics.PrecalculatedMove(x1, x2, y1, y2, simulator.make_motors(positions),
+                                                 fixedPoint=fixed_point)
+        simulator.reset()
+        motors = simulator.make_motors(positions)
+        started = utime.now_us()
+        move = move_class(x1, x2, y1, y2, motors, fixedPoint=fixed_point)
+        move.engine = engine = RecordingEngine(motors)
+        engine.start()
+        report = playback.play(move, playback.DEADLINE)
+    return reference, move, engine, report, started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check StreamingMove against PrecalculatedMove.')
+    parser.add_argument('--lines', type=int, default=200, help='random lines besides the long diagonals')
+    parser.add_argument('--produce-us', type=int, default=300, help='simulated cost of producing one tick')
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+    machine.record = False
+    move_class = timed_move(args.produce_us)
+    failures = 0
+    for fixed_point in (False, True):
+        count = stalls = deepest = late = 0
+        first_us = []
+        precalc_us = []
+        for x1, y1, x2, y2 in lines(args.lines, args.seed):
+            reference, move, engine, report, started = stream_line(move_class, x1, y1, x2, y2, fixed_point)
+            if engine.stream != reference.moves[:reference.length]:
+                failures += 1
+                print(f'  ({x1},{y1})->({x2},{y2}) fixedPoint={fixed_point}: stream differs')
+            count += 1
+            stalls += move.stalls
+            late += report.overruns
+            deepest = max(deepest, move.deepest)
+            first_us.append(engine.firstUs - started)
+            precalc_us.append(reference.length * args.produce_us)
+        first_us.sort()
+        precalc_us.sort()
+        print(f'{"fixed point" if fixed_point else "float":>11}: {count} lines, first step after '
+              f'{first_us[len(first_us) // 2] / 1000:.1f} ms median / {first_us[-1] / 1000:.1f} ms max '
+              f'(precalculated: {precalc_us[len(precalc_us) // 2] / 1000:.0f} / {precalc_us[-1] / 1000:.0f} ms), '
+              f'lookahead up to {deepest} of {kinematics.STREAM_RING} ticks, {stalls} stalls, {late} late ticks')
+    if failures:
+        print(f'{failures} lines failed')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
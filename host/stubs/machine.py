@@ -0,0 +1,272 @@
+"""
+Host stand-in for MicroPython's machine module (Pin, PWM, UART, Timer and mem32).
+Every GPIO level change and PWM duty change is recorded together with the simulated
+timestamp from utime, so step timing can be checked without a logic analyser.
+"""
+import utime
+
+# Recorded GPIO transitions as (time_us, pin_id, value). Only real level changes are logged.
+transitions = []
+# Recorded PWM duty changes as (time_us, pin_id, duty_u16)
+pwm_events = []
+# Set to False to skip recording when only the end state matters (e.g. long soak runs)
+record = True
+
+_pin_levels = {} # Last level driven on each pin id, shared by every Pin object on that id
+
+
+def reset():
+    """Host-only helper: forget all recorded transitions and pin levels."""
+    del transitions[:]
+    del pwm_events[:]
+    _pin_levels.clear()
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    ALT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        _pin_levels.setdefault(id, 0)
+        if value is not None:
+            self.value(value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.mode = mode
+        self.pull = pull
+        if value is not None:
+            self.value(value)
+
+    def value(self, x=None):
+        if x is None:
+            return _pin_levels[self.id]
+        level = 1 if x else 0
+        if _pin_levels[self.id] != level:
+            _pin_levels[self.id] = level
+            if record:
+                transitions.append((utime.now_us(), self.id, level))
+
+    def __call__(self, x=None):
+        return self.value(x)
+
+    def high(self):
+        self.value(1)
+
+    def low(self):
+        self.value(0)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(1 - _pin_levels[self.id])
+
+    def __repr__(self):
+        return f'Pin({self.id})'
+
+
+class _Memory:
+    """
+    machine.mem32. Stores to the RP2040's SIO GPIO output registers (GPIO_OUT and its SET, CLR
+    and XOR aliases) change the pin levels and are recorded like Pin writes; every other
+    address just keeps what was written. `writes` counts the stores.
+    """
+    SIO_GPIO_OUT = 0xd0000010
+
+    def __init__(self):
+        self.words = {}
+        self.writes = 0
+
+    def _levels(self):
+        return sum(1 << pin_id for pin_id, level in _pin_levels.items()
+                   if level and isinstance(pin_id, int) and 0 <= pin_id < 30)
+
+    def __getitem__(self, address):
+        if address == self.SIO_GPIO_OUT:
+            return self._levels()
+        return self.words.get(address, 0)
+
+    def __setitem__(self, address, value):
+        self.writes += 1
+        value &= 0xffffffff
+        offset = address - self.SIO_GPIO_OUT
+        if offset not in (0x0, 0x4, 0x8, 0xc):
+            self.words[address] = value
+            return
+        levels = self._levels()
+        if offset == 0x0:
+            levels = value
+        elif offset == 0x4:
+            levels |= value
+        elif offset == 0x8:
+            levels &= ~value
+        else:
+            levels ^= value
+        now = utime.now_us()
+        for pin_id in range(30):
+            level = (levels >> pin_id) & 1
+            if _pin_levels.get(pin_id, 0) != level:
+                _pin_levels[pin_id] = level
+                if record:
+                    transitions.append((now, pin_id, level))
+
+
+mem32 = _Memory()
+
+
+class PWM:
+    def __init__(self, pin, freq=None, duty_u16=None):
+        self.pin = pin
+        self._freq = 0
+        self._duty = 0
+        if freq is not None:
+            self.freq(freq)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        value = int(value)
+        if value != self._duty:
+            self._duty = value
+            if record:
+                pwm_events.append((utime.now_us(), self.pin.id, value))
+
+    def deinit(self):
+        self.duty_u16(0)
+
+
+class UART:
+    """
+    Loopback-style UART. The host feeds bytes in with feed() and collects
+    whatever the firmware wrote with take().
+    """
+    def __init__(self, id, baudrate=9600, bits=8, parity=None, stop=1, tx=None, rx=None, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.tx = tx
+        self.rx = rx
+        self._rx = bytearray()
+        self._tx = bytearray()
+
+    def init(self, baudrate=9600, **kwargs):
+        self.baudrate = baudrate
+
+    # --- Host-side helpers ---
+    def feed(self, data):
+        """Queue bytes as if the host had sent them over the wire."""
+        if isinstance(data, str):
+            data = data.encode()
+        self._rx.extend(data)
+
+    def take(self):
+        """Return and clear everything the firmware has written so far."""
+        data = bytes(self._tx)
+        self._tx = bytearray()
+        return data
+
+    # --- MicroPython API ---
+    def any(self):
+        return len(self._rx)
+
+    def read(self, nbytes=None):
+        if not self._rx:
+            return None
+        if nbytes is None:
+            nbytes = len(self._rx)
+        data = bytes(self._rx[:nbytes])
+        del self._rx[:nbytes]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        if not self._rx:
+            return None
+        if nbytes is None:
+            nbytes = len(buf)
+        n = min(nbytes, len(self._rx))
+        buf[:n] = self._rx[:n]
+        del self._rx[:n]
+        return n
+
+    def readline(self):
+        if not self._rx:
+            return None
+        end = self._rx.find(b'\n')
+        n = len(self._rx) if end < 0 else end + 1
+        return self.read(n)
+
+    def write(self, buf):
+        if isinstance(buf, str):
+            buf = buf.encode()
+        self._tx.extend(buf)
+        return len(buf)
+
+    def flush(self):
+        pass
+
+    def txdone(self):
+        return True
+
+
+class Timer:
+    """
+    Virtual timer driven by the simulated clock: callbacks fire while utime sleeps,
+    exactly at their scheduled deadlines (periodic timers stay on an absolute schedule).
+    """
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self._next = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None, hard=False, tick_hz=1000):
+        self.deinit()
+        if freq > 0:
+            self._period_us = 1000000 / freq
+        else:
+            self._period_us = period * 1000000 / tick_hz
+        self._mode = mode
+        self._callback = callback
+        self._start = utime.now_us()
+        self._count = 1
+        self._next = self._start + int(self._period_us)
+        utime._listeners.append(self)
+
+    def deinit(self):
+        self._next = None
+        if self in utime._listeners:
+            utime._listeners.remove(self)
+
+    # --- Hooks used by utime.advance ---
+    def next_deadline(self):
+        return self._next
+
+    def fire(self, now):
+        if self._mode == Timer.PERIODIC:
+            self._count += 1
+            self._next = self._start + int(self._count * self._period_us)
+        else:
+            self.deinit()
+        if self._callback is not None:
+            self._callback(self)
@@ -0,0 +1,54 @@
+"""
+Host stand-in for MicroPython's micropython module.
+The code emitters (native, viper, asm_thumb) become no-op decorators so the
+decorated firmware functions run as ordinary CPython functions.
+"""
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def asm_thumb(func):
+    return func
+
+
+def const(value):
+    return value
+
+
+def opt_level(level=None):
+    return 0
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    func(arg)
+    return True
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def mem_info(verbose=False):
+    pass
+
+
+def qstr_info(verbose=False):
+    pass
+
+
+def stack_use():
+    return 0
@@ -0,0 +1,106 @@
+"""
+Host stand-in for MicroPython's utime module.
+Time is virtual: sleeping advances a simulated microsecond clock instead of blocking,
+so a 10 second move plays back in however long the host takes to run the firmware code.
+ticks_us() and friends read that clock and wrap exactly like they do on the Pico.
+"""
+import time as _time
+
+# MicroPython's ticks_* counters wrap at 2**30 on the RP2040 port
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+_now_us = 0 # Unwrapped simulated time in microseconds
+
+# Objects with next_deadline()/fire(now) (machine.Timer) that fire as the clock passes their deadlines
+_listeners = []
+_firing = False # Set while a listener runs; nested sleeps then just move the clock, like a soft IRQ
+
+
+def now_us():
+    """Host-only helper: the unwrapped simulated time in microseconds."""
+    return _now_us
+
+
+def reset():
+    """Host-only helper: rewind the simulated clock to zero and drop any running timers."""
+    global _now_us
+    _now_us = 0
+    del _listeners[:]
+
+
+def advance(us):
+    """
+    Host-only helper: move the simulated clock forward by `us` microseconds.
+    Every listener deadline passed on the way fires in order, with the clock set to that deadline.
+    """
+    global _now_us, _firing
+    target = _now_us + int(us)
+    while _listeners and not _firing:
+        deadline = None
+        for listener in _listeners:
+            due = listener.next_deadline()
+            if due is not None and due <= target and (deadline is None or due < deadline):
+                deadline = due
+        if deadline is None:
+            break
+        _now_us = max(_now_us, deadline)
+        _firing = True
+        try:
+            for listener in list(_listeners):
+                due = listener.next_deadline()
+                if due is not None and due <= _now_us:
+                    listener.fire(_now_us)
+        finally:
+            _firing = False
+        # A callback that ran long (nested sleeps) may have pushed the clock past the sleep's end
+        target = max(target, _now_us)
+    _now_us = max(_now_us, target)
+
+
+def sleep_us(us):
+    if us > 0:
+        advance(us)
+
+
+def sleep_ms(ms):
+    if ms > 0:
+        advance(ms * 1000)
+
+
+def sleep(seconds):
+    if seconds > 0:
+        advance(seconds * 1000000)
+
+
+def ticks_us():
+    return _now_us & _TICKS_MAX
+
+
+def ticks_ms():
+    return (_now_us // 1000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+
+def time():
+    return _now_us // 1000000
+
+
+def time_ns():
+    return _now_us * 1000
+
+
+def localtime(secs=None):
+    return _time.localtime(secs)
@@ -0,0 +1,78 @@
+"""
+Check of the tick time calibration (pico/ticktune.py) on the simulated board. The simulated
+clock doesn't advance by itself, so the step engine charges every tick --tick-cost-us of
+simulated time, plus up to --jitter-us at random, as the Pico would spend. For each cost it runs
+ticktune.calibrate, then plays the long diagonal (1,1)->(8,8) at the picked tick with every
+motor's maxSpeed raised to --max-speed, and checks that:
+    * the picked tick covers the worst charged tick,
+    * the move plays without a late tick,
+    * the move is no slower than at the default 2000 us tick.
+
+    python -m host.ticktune_report
+    python -m host.ticktune_report --tick-cost-us 100 400 900 --max-speed 1000
+"""
+import argparse
+import random
+
+from host import simulator
+
+simulator.install()
+
+import machine  # noqa: E402
+import stepengine  # noqa: E402
+import ticktune  # noqa: E402
+import utime  # noqa: E402
+
+
+class ChargedEngine(stepengine.SioEngine):
+    """Steps the motor positions and charges simulated time for every tick."""
+    def __init__(self, motors, cost_us, jitter_us, rng):
+        super().__init__(motors)
+        self.cost_us = cost_us
+        self.jitter_us = jitter_us
+        self.rng = rng
+
+    def apply(self, tick):
+        self.toggle(tick)
+        utime.advance(self.cost_us + self.rng.randint(0, self.jitter_us))
+
+
+def diagonal(board_obj, max_speed):
+    for motor in board_obj.motors:
+        motor.maxSpeed = max_speed
+    board_obj.calculateMove(8, 8)
+    board_obj.executeMove()
+    return board_obj.lastPlayback
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate the tick time against simulated per-tick costs.')
+    parser.add_argument('--tick-cost-us', type=int, nargs='+', default=[150, 400, 900])
+    parser.add_argument('--jitter-us', type=int, default=40)
+    parser.add_argument('--max-speed', type=int, default=800, help='Motor.maxSpeed for the diagonal (steps/s)')
+    parser.add_argument('--seed', type=int, default=4)
+    args = parser.parse_args()
+    machine.record = False
+    failures = 0
+    for cost_us in args.tick_cost_us:
+        rng = random.Random(args.seed)
+        with simulator.quiet():
+            board_obj = simulator.make_board()
+            board_obj.engine = ChargedEngine(board_obj.motors, cost_us, args.jitter_us, rng)
+            budget = ticktune.calibrate(board_obj, save=False)
+            tuned = diagonal(board_obj, args.max_speed)
+            default = simulator.make_board()
+            default.engine = ChargedEngine(default.motors, cost_us, args.jitter_us, rng)
+            baseline = diagonal(default, args.max_speed)
+        ok = (budget.tickUs >= cost_us + args.jitter_us and tuned.overruns == 0
+              and tuned.plannedUs <= baseline.plannedUs)
+        failures += not ok
+        print(f'{cost_us:>4} us/tick: {budget}')
+        print(f'{"":>13}  diagonal at {args.max_speed} steps/s: {tuned.plannedUs / 1e6:.2f} s '
+              f'({tuned.overruns} late ticks), {baseline.plannedUs / 1e6:.2f} s at 2000 us'
+              f'{"" if ok else "  FAILED"}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
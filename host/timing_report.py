@@ -0,0 +1,59 @@
+"""
+Compares the time-optimal timing law with the constant-cruise profile over every
+square-to-square line on the board, and checks that neither asks any motor for more than
+one step per tick (the most the step follower can deliver).
+
+    python -m host.timing_report
+"""
+import argparse
+
+import numpy as np
+
+from host import planner
+
+
+def _lines():
+    for a in range(64):
+        for b in range(64):
+            if a != b:
+                yield a % 8 + 1, a // 8 + 1, b % 8 + 1, b // 8 + 1
+
+
+def max_step_rate(line, tick_us=2000, **options):
+    """Largest change of any motor's step target between two ticks of a line."""
+    target_x, target_y, _ = planner.tick_grid([line], tick_us, **options)
+    steps = planner.cable_steps(target_x, target_y)
+    if len(steps) < 2:
+        return 0
+    return int(np.abs(np.diff(steps, axis=0)).max())
+
+
+def report(tick_us=2000, **options):
+    optimal, cruise, jumps = [], [], []
+    for line in _lines():
+        optimal.append(planner.time_scaling(*line, time_optimal=True, **options))
+        cruise.append(planner.time_scaling(*line, time_optimal=False, **options))
+        jumps.append(max_step_rate(line, tick_us, time_optimal=True, **options))
+    optimal = np.array(optimal)
+    cruise = np.array(cruise)
+    saved = cruise - optimal
+    print(f'{len(optimal)} lines: constant cruise {cruise.sum():.1f} s, time-optimal {optimal.sum():.1f} s '
+          f'({100 * saved.sum() / cruise.sum():.1f}% less)')
+    print(f'faster: {(saved > 0).sum()}, slower: {(saved < 0).sum()} (worst {-saved.min():.3f} s), '
+          f'best saving {saved.max():.3f} s')
+    print(f'max step-target change per tick: {max(jumps)}')
+    return max(jumps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time-optimal vs constant-cruise move durations.')
+    parser.add_argument('--tick-us', type=int, default=2000)
+    parser.add_argument('--accel', type=float, default=planner.DEFAULT_ACCEL)
+    parser.add_argument('--speed-limit', type=int, default=500, help='steps/s, same for every motor')
+    args = parser.parse_args()
+    jump = report(args.tick_us, accel=args.accel, speed_limits=(args.speed_limit,) * 4)
+    return 1 if jump > 1 else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
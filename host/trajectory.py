@@ -0,0 +1,236 @@
+"""
+NumPy-vectorized forward kinematics and path accuracy report for packed step streams.
+The planners turn a straight line into cable step targets, and the stream only approximates
+them: targets are rounded to whole steps, the follower in precalculate moves each motor at most
+one step per tick (so it falls behind whenever a motor should go faster than 1/tickTimeUs), and
+four cables over-constrain a point in the plane, so their rounded lengths never quite agree.
+This module plays a stream back into the path the magnet really takes:
+    * motor positions after every tick, from the 2-bit codes,
+    * cable lengths, by inverting the spool polynomial Steps = A*d^2 + B*d + C,
+    * (x, y), by least squares over the corner geometry of getAllSteps (kinematics.MOTOR_CORNERS).
+      Subtracting one cable's d^2 from another's leaves an equation that is linear in x or y, so
+      the solution is closed-form; what the four cables still disagree on is kept as the residual.
+It then compares the path with the planned one (planner.tick_grid) tick by tick: the distance
+from the planned line (deviation, max and RMS), the distance from where the magnet should be at
+that time (error), and how many steps each motor is behind its unrounded target (lag).
+
+The report plays the benchmark corpus at every combination of --tick-us and --speed (every
+motor's maxSpeed, steps/s) through the vectorized planner, which makes the firmware's streams,
+and picks the fastest settings whose worst deviation and error both stay within --budget mm.
+A motor asked for more than one step per tick falls behind: the magnet can stay on its line
+(the lag is symmetric on a diagonal) while being far from where it should be, hence both.
+
+    python -m host.trajectory
+    python -m host.trajectory --tick-us 2000 1500 1250 --speed 500 600 700 --budget 0.3
+"""
+import argparse
+
+import numpy as np
+
+from host import benchmark, planner
+
+import kinematics  # noqa: E402  (on sys.path via host.planner)
+
+CORNERS = np.array(kinematics.MOTOR_CORNERS, dtype=np.float64)
+_A = kinematics._A
+_B = kinematics._B
+_C = kinematics._C
+
+
+def decode(stream, positions):
+    """Motor positions after every tick of a packed stream, as an (n, 4) int64 array."""
+    ticks = np.frombuffer(bytes(stream), dtype=np.uint8).astype(np.int64)
+    steps = np.empty((len(ticks), 4), dtype=np.int64)
+    for i in range(4):
+        code = (ticks >> (2 * i)) & 3
+        steps[:, i] = (code == 1).astype(np.int64) - (code == 2)
+    return np.cumsum(steps, axis=0) + np.asarray(positions, dtype=np.int64)
+
+
+def cable_lengths(steps):
+    """Cable lengths (mm) for step counts: the positive root of the spool polynomial."""
+    steps = np.asarray(steps, dtype=np.float64)
+    return (-_B + np.sqrt(_B * _B - 4 * _A * (_C - steps))) / (2 * _A)
+
+
+def forward(lengths):
+    """
+    End effector (x, y) in mm for an (n, 4) array of cable lengths, and the residual: the largest
+    difference (mm) between a cable's length and the distance from its corner to that point.
+    Motors 0/1 and 2/3 share a y, motors 0/2 and 1/3 an x, so each pair's d^2 difference gives
+    x or y directly and the least-squares point is the mean of the two.
+    """
+    sq = lengths * lengths
+    (x0, y0), (x1, _), (_, y2), _ = CORNERS
+    span_x = 2 * (x1 - x0)
+    span_y = 2 * (y2 - y0)
+    offset_x = x1 * x1 - x0 * x0
+    offset_y = y2 * y2 - y0 * y0
+    x = ((sq[:, 0] - sq[:, 1] + offset_x) + (sq[:, 2] - sq[:, 3] + offset_x)) / (2 * span_x)
+    y = ((sq[:, 0] - sq[:, 2] + offset_y) + (sq[:, 1] - sq[:, 3] + offset_y)) / (2 * span_y)
+    reach = np.hypot(x[:, None] - CORNERS[:, 0], y[:, None] - CORNERS[:, 1])
+    return x, y, np.max(np.abs(lengths - reach), axis=1)
+
+
+class Trajectory:
+    """The path a stream plays: t (us, when each tick is applied), x and y (mm), steps and residual."""
+    def __init__(self, stream, positions, tick_us=2000):
+        self.steps = decode(stream, positions)
+        self.t = np.arange(len(self.steps), dtype=np.int64) * tick_us
+        self.x, self.y, self.residual = forward(cable_lengths(self.steps))
+
+
+class PathReport:
+    """How closely a stream follows its planned lines (mm, and steps for the lag)."""
+    def __init__(self, deviation, error, lag, residual, ticks):
+        self.ticks = ticks
+        self.max_deviation = float(np.max(deviation))
+        self.rms_deviation = float(np.sqrt(np.mean(deviation * deviation)))
+        self.max_error = float(np.max(error))
+        self.max_lag = np.max(np.abs(lag), axis=0)
+        self.rms_lag = np.sqrt(np.mean(lag * lag, axis=0))
+        self.max_residual = float(np.max(residual))
+
+    def __repr__(self):
+        lag = '/'.join(f'{lag:.1f}' for lag in self.max_lag)
+        return (f'deviation {self.max_deviation:.3f} mm max, {self.rms_deviation:.3f} mm RMS, '
+                f'error {self.max_error:.2f} mm, lag {lag} steps, residual {self.max_residual:.3f} mm')
+
+
+def planned_path(lines, trajectory, positions, tick_us=2000, **options):
+    """
+    Per tick of the stream: start and end (mm) of the line being played and the planned point
+    at that time. Settle ticks (kinematics.settleTicks) hold the line's end point. Returns None
+    if the stream doesn't have the planned ticks.
+    """
+    target_x, target_y, counts = planner.tick_grid(lines, tick_us, **options)
+    n = len(trajectory.steps)
+    start = np.empty((n, 2))
+    end = np.empty((n, 2))
+    point = np.empty((n, 2))
+    tick = grid = 0
+    for (x1, y1, x2, y2), count in zip(lines, counts):
+        end_mm = (planner._board_to_mm(x2), planner._board_to_mm(y2))
+        here = list(trajectory.steps[tick + count - 1]) if count else list(positions)
+        settle = len(kinematics.settleTicks(end_mm[0], end_mm[1], [int(p) for p in here]))
+        if tick + count + settle > n:
+            return None
+        start[tick:tick + count + settle] = (planner._board_to_mm(x1), planner._board_to_mm(y1))
+        end[tick:tick + count + settle] = end_mm
+        point[tick:tick + count, 0] = target_x[grid:grid + count]
+        point[tick:tick + count, 1] = target_y[grid:grid + count]
+        point[tick + count:tick + count + settle] = end_mm
+        tick += count + settle
+        grid += count
+    if tick != n:
+        return None
+    return start, end, point
+
+
+def analyze(lines, positions, stream, tick_us=2000, **options):
+    """PathReport of a stream against the lines it was planned from (planner options), or None."""
+    trajectory = Trajectory(stream, positions, tick_us)
+    planned = planned_path(lines, trajectory, positions, tick_us, **options)
+    if planned is None:
+        return None
+    start, end, point = planned
+    here = np.stack((trajectory.x, trajectory.y), axis=1)
+    # Distance to the closest point of the line segment
+    direction = end - start
+    length_sq = np.maximum(np.sum(direction * direction, axis=1), 1e-12)
+    along = np.clip(np.sum((here - start) * direction, axis=1) / length_sq, 0.0, 1.0)
+    deviation = np.hypot(*(here - start - direction * along[:, None]).T)
+    error = np.hypot(*(here - point).T)
+    # Unrounded targets the follower chases, from the same spool table as the firmware
+    a1 = point[:, 0] + 17
+    b1 = point[:, 1] + 17
+    a2 = 238 - point[:, 0]
+    b3 = 238 - point[:, 1]
+    targets = np.stack([planner.spool_steps(d) for d in
+                        (a1 * a1 + b1 * b1, a2 * a2 + b1 * b1, a1 * a1 + b3 * b3, a2 * a2 + b3 * b3)], axis=1)
+    return PathReport(deviation, error, targets - trajectory.steps, trajectory.residual, len(stream))
+
+
+def round_trip_error():
+    """Worst distance (mm) between each square centre and forward() of its exact cable lengths."""
+    centres = np.array([(planner._board_to_mm(x), planner._board_to_mm(y)) for x in range(1, 9) for y in range(1, 9)])
+    lengths = np.hypot(centres[:, 0, None] - CORNERS[:, 0], centres[:, 1, None] - CORNERS[:, 1])
+    x, y, _ = forward(lengths)
+    return float(np.max(np.hypot(x - centres[:, 0], y - centres[:, 1])))
+
+
+class Sweep:
+    """PathReports of many moves at one setting: the worst of each measure, and the motion time."""
+    def __init__(self):
+        self.worst = None           # (lines, PathReport) with the largest deviation
+        self.max_error = 0.0
+        self.rms_sum = 0.0
+        self.max_lag = np.zeros(4)
+        self.max_residual = 0.0
+        self.ticks = 0
+        self.moves = 0
+
+    def add(self, lines, report):
+        if self.worst is None or report.max_deviation > self.worst[1].max_deviation:
+            self.worst = (lines, report)
+        self.max_error = max(self.max_error, report.max_error)
+        self.rms_sum += report.rms_deviation * report.rms_deviation * report.ticks
+        self.max_lag = np.maximum(self.max_lag, report.max_lag)
+        self.max_residual = max(self.max_residual, report.max_residual)
+        self.ticks += report.ticks
+        self.moves += 1
+
+    @property
+    def rms_deviation(self):
+        return float(np.sqrt(self.rms_sum / self.ticks))
+
+
+def sweep(moves, tick_us, speed):
+    """Sweep of the moves played with every motor's maxSpeed at `speed` and `tick_us` ticks."""
+    options = {'speed_limits': (speed,) * 4}
+    result = Sweep()
+    for lines in moves:
+        x, y = lines[0][0], lines[0][1]
+        positions = list(kinematics.stepsAt(planner._board_to_mm(x), planner._board_to_mm(y)))
+        stream, _ = planner.plan_lines(lines, positions, tick_us, **options)
+        report = analyze(lines, positions, stream, tick_us, **options)
+        if report is None:
+            raise ValueError(f'{benchmark.move_key(lines)}: stream does not match its lines')
+        result.add(lines, report)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Path accuracy of step streams over tick times and speed limits.')
+    parser.add_argument('--tick-us', type=int, nargs='+', default=[2000, 1500, 1000])
+    parser.add_argument('--speed', type=int, nargs='+', default=[500, 650, 800], help='maxSpeed of every motor (steps/s)')
+    parser.add_argument('--budget', type=float, default=0.5,
+                        help='largest distance from the planned line, and from the planned point at each tick (mm)')
+    args = parser.parse_args()
+
+    print(f'forward kinematics round trip: {round_trip_error() * 1000:.3f} um worst over the square centres')
+    moves = [lines for _, group in benchmark.corpus() for lines in group]
+    best = None
+    for tick_us in args.tick_us:
+        for speed in args.speed:
+            result = sweep(moves, tick_us, speed)
+            lines, report = result.worst
+            seconds = result.ticks * tick_us / 1e6
+            within = report.max_deviation <= args.budget and result.max_error <= args.budget
+            lag = '/'.join(f'{value:.1f}' for value in result.max_lag)
+            print(f'{tick_us:>5} us, {speed:>4} steps/s: {result.moves} moves in {seconds:.0f} s, '
+                  f'deviation {report.max_deviation:.3f} mm max ({benchmark.move_key(lines)}) / '
+                  f'{result.rms_deviation:.3f} mm RMS, error {result.max_error:.2f} mm, '
+                  f'lag up to {lag} steps, residual {result.max_residual:.3f} mm'
+                  f'{"" if within else "  over budget"}')
+            if within and (best is None or seconds < best[2]):
+                best = (tick_us, speed, seconds)
+    if best is None:
+        print(f'nothing stays within {args.budget} mm')
+        return 1
+    print(f'fastest within {args.budget} mm: {best[0]} us ticks at {best[1]} steps/s ({best[2]:.1f} s)')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,167 @@
+"""
+Corner Blending
+A MultiLineMove stops at every waypoint, since every line has its own velocity profile that
+starts and ends at rest. Blending joins consecutive lines into one run and replaces each
+corner with a circular arc (fillet) tangent to both lines, so the magnet sweeps round the
+corner instead of stopping in it. A run is then timed as a single path.
+
+The fillet is as large as `tolerance` (mm) allows: the arc never comes further than `tolerance`
+from the corner it replaces. It is also never allowed to use more than half of either line
+(all of it for the first and last line), so neighbouring fillets can't overlap. Corners that
+turn back on themselves can't be rounded in any useful way, so a run ends there and the
+magnet stops.
+"""
+import math
+
+# Runs are split at corners turning by more than this (radians): ~170 degrees
+MAX_TURN = 2.97
+
+def splitRuns(lines):
+    """
+    Groups consecutive lines (x1, y1, x2, y2) into runs, flat waypoint tuples
+    (x1, y1, x2, y2, x3, y3, ...), splitting where a corner is too sharp to blend.
+    A run of two waypoints is just the straight line.
+    """
+    runs = []
+    run = list(lines[0])
+    for k in range(1, len(lines)):
+        ax, ay, bx, by = lines[k - 1]
+        _, _, cx, cy = lines[k]
+        if turnAngle(ax, ay, bx, by, cx, cy) > MAX_TURN:
+            runs.append(tuple(run))
+            run = list(lines[k])
+        else:
+            run.extend((cx, cy))
+    runs.append(tuple(run))
+    return runs
+
+def turnAngle(ax, ay, bx, by, cx, cy):
+    """Angle (radians) the path turns through at b, going a -> b -> c."""
+    ux, uy = bx - ax, by - ay
+    vx, vy = cx - bx, cy - by
+    lengths = math.sqrt(ux * ux + uy * uy) * math.sqrt(vx * vx + vy * vy)
+    if lengths == 0:
+        return 0.0
+    return math.acos(max(-1.0, min(1.0, (ux * vx + uy * vy) / lengths)))
+
+class BlendedPath:
+    """
+    Lines and fillet arcs through `points` [(x, y), ...] in mm, parameterized by distance along
+    the path. Pieces are kept in flat lists: pieceStart (distance where the piece starts),
+    pieceRadius (0 for a line), and for lines the start point and direction, for arcs the
+    centre, start angle and turning direction (+1 anticlockwise, -1 clockwise).
+    """
+    def __init__(self, points, tolerance):
+        self.pieceStart = []
+        self.pieceRadius = []
+        self.pieceX = []
+        self.pieceY = []
+        self.pieceA = []   # Line: x direction; arc: start angle
+        self.pieceB = []   # Line: y direction; arc: turning direction
+        count = len(points)
+        lengths = []
+        directions = []
+        for k in range(count - 1):
+            dx = points[k + 1][0] - points[k][0]
+            dy = points[k + 1][1] - points[k][1]
+            length = math.sqrt(dx * dx + dy * dy)
+            lengths.append(length)
+            directions.append((dx / length, dy / length) if length > 0 else (0.0, 0.0))
+
+        s = 0.0
+        x, y = points[0]
+        for k in range(1, count):
+            ux, uy = directions[k - 1]
+            cornerX, cornerY = points[k]
+            # How far before the corner the line has to hand over to the fillet
+            cut = 0.0
+            if k < count - 1:
+                vx, vy = directions[k]
+                turn = math.acos(max(-1.0, min(1.0, ux * vx + uy * vy)))
+                if turn > 1e-6:
+                    half = turn / 2
+                    # An arc of radius r deviates r * (1 / cos(half) - 1) from the corner
+                    radius = tolerance / (1 / math.cos(half) - 1)
+                    cut = radius * math.tan(half)
+                    # Leave the other half of each line to the neighbouring fillet
+                    limit = min(lengths[k - 1] if k == 1 else lengths[k - 1] / 2,
+                                lengths[k] if k == count - 2 else lengths[k] / 2)
+                    if cut > limit:
+                        cut = limit
+                        radius = cut / math.tan(half)
+            lineEndX = cornerX - ux * cut
+            lineEndY = cornerY - uy * cut
+            length = math.sqrt((lineEndX - x) * (lineEndX - x) + (lineEndY - y) * (lineEndY - y))
+            if length > 0:
+                self.addPiece(s, 0.0, x, y, ux, uy)
+                s += length
+            if cut > 0:
+                vx, vy = directions[k]
+                turning = 1 if ux * vy - uy * vx > 0 else -1
+                # The centre is one radius to the inside of the turn from where the line ends
+                centreX = lineEndX - uy * radius * turning
+                centreY = lineEndY + ux * radius * turning
+                self.addPiece(s, radius, centreX, centreY,
+                              math.atan2(lineEndY - centreY, lineEndX - centreX), turning)
+                s += radius * turn
+                x = cornerX + vx * cut
+                y = cornerY + vy * cut
+            else:
+                x, y = cornerX, cornerY
+        self.length = s
+        self.start = points[0]
+        self.end = points[-1]
+        self.cursor = 0 # Piece of the previous lookup; the path is almost always walked forwards
+
+    def addPiece(self, start, radius, x, y, a, b):
+        self.pieceStart.append(start)
+        self.pieceRadius.append(radius)
+        self.pieceX.append(x)
+        self.pieceY.append(y)
+        self.pieceA.append(a)
+        self.pieceB.append(b)
+
+    def piece(self, s):
+        k = self.cursor
+        if s < self.pieceStart[k]:
+            k = 0
+        last = len(self.pieceStart) - 1
+        while k < last and s >= self.pieceStart[k + 1]:
+            k += 1
+        self.cursor = k
+        return k
+
+    def point(self, progress):
+        """(x, y) in mm at `progress` (0-1) of the way along the path."""
+        if progress >= 1.0:
+            return self.end
+        s = progress * self.length
+        k = self.piece(s)
+        along = s - self.pieceStart[k]
+        radius = self.pieceRadius[k]
+        if radius == 0:
+            return self.pieceX[k] + self.pieceA[k] * along, self.pieceY[k] + self.pieceB[k] * along
+        angle = self.pieceA[k] + self.pieceB[k] * along / radius
+        return self.pieceX[k] + radius * math.cos(angle), self.pieceY[k] + radius * math.sin(angle)
+
+    def direction(self, progress):
+        """Unit direction of travel (dx, dy) at `progress`."""
+        s = min(progress, 1.0) * self.length
+        k = self.piece(s)
+        radius = self.pieceRadius[k]
+        if radius == 0:
+            return self.pieceA[k], self.pieceB[k]
+        turning = self.pieceB[k]
+        angle = self.pieceA[k] + turning * (s - self.pieceStart[k]) / radius
+        return -math.sin(angle) * turning, math.cos(angle) * turning
+
+    def tightestBend(self, s1, s2):
+        """Smallest radius of the arcs that overlap the stretch from s1 to s2 mm, or 0 if none do."""
+        tightest = 0.0
+        last = len(self.pieceStart) - 1
+        for k in range(last + 1):
+            radius = self.pieceRadius[k]
+            end = self.pieceStart[k + 1] if k < last else self.length
+            if radius > 0 and self.pieceStart[k] < s2 and end > s1 and (tightest == 0 or radius < tightest):
+                tightest = radius
+        return tightest
@@ -1,28 +1,205 @@
 import kinematics
-import utime
+import kincache
+import bufpool
+import movelib
+import playback
+import stepengine
+import router
+import chessmove
+import metrics
+import power
+from micropython import const
+
+# Playback report prints (1: on), compiled out when 0 (see metrics.py)
+_LOG = const(0)
+
+class MotorState:
+    """
+    A motor as a queued move will find it. Moves only read their motors' positions and speed
+    limits while they are precalculated, so a move can be planned from where the queued moves
+    will leave the motors before they get there.
+    """
+    def __init__(self, motor, position):
+        self.maxSpeed = motor.maxSpeed
+        self.position = position
 
 class Board:
-    def __init__(self, x, y, motors):
+    def __init__(self, x, y, motors, library=None, dualCore=True, playbackMode=playback.DEADLINE, fixedPoint=False,
+                 stepMode=stepengine.SIO, blendTolerance=0, powerPolicy=power.FULL,
+                 pool=None, streaming=False, tickTimeUs=2000):
         self.motors = motors
         self.x = x
         self.y = y
+        self.library = library # Optional movelib.MoveLibrary of precompiled single-line moves
+        self.dualCore = dualCore # Precalculate multi-line segments on the second core during playback
+        self.producer = None # Fills those segments instead of a thread per move (the server's core-1 worker)
+        self.playbackMode = playbackMode # Default playback engine, see playback.py
+        self.fixedPoint = fixedPoint # Precalculate with the float-free generator, see fixedstep.py
+        self.lastPlayback = None # PlaybackReport of the most recent move
+        self.tickTimeUs = tickTimeUs # Tick of every move planned here, measured by ticktune.py
+        self.stepMode = stepMode
+        self.engine = stepengine.create(motors, stepMode, tickTimeUs) # Drives the coils during playback, see stepengine.py
+        self.occupancy = bytearray(64) # Non-zero where a piece stands, indexed by router.squareIndex
+        self.lineCache = kincache.LineCache() # Line timings shared by the router and the moves, see kincache.py
+        self.router = router.Router(motors, tickTimeUs=tickTimeUs, cache=self.lineCache) # Plans piece moves around the occupied squares
+        self.carrying = False # The current move takes the piece under the magnet along (see calculateRoute)
+        self.chessPlanner = chessmove.ChessPlanner(self.router) # Plans captures, castling and en passant
+        self.chessPlan = None # chessmove.ChessPlan of the current move, whose pieces the occupancy follows
+        self.queued = [] # Moves calculated ahead with queueMove, oldest (possibly playing) first
+        self.blendTolerance = blendTolerance # Round multi-line corners off within this many mm (0: stop at each), see blend.py
+        self.powerPolicy = powerPolicy # Motor power during moves: power.FULL or power.DYNAMIC, see power.py
+        self.powerManager = power.PowerManager(motors)
+        self.lastPower = None # PowerReport of the most recent move
+        self.pool = pool # bufpool.BufferPool the moves borrow their step buffers from (None: allocate)
+        self.streaming = streaming # Work single-line ticks out during playback (kinematics.StreamingMove)
+        self.rings = bufpool.BufferPool(bufpool.RING_BLOCKS, kinematics.STREAM_RING) # Their rings, allocated with the board
+    
+    def planStart(self):
+        """
+        (x, y, motors) the next calculated move starts from: the board itself, or the end of
+        the last queued move. Every move ends with its motors exactly on the destination's
+        step targets, so those stand in for the motors there.
+        """
+        last = self.queued[-1:] # One slice, so the player popping a move can't get in between
+        if not last:
+            return self.x, self.y, self.motors
+        x, y = last[0].x2, last[0].y2
+        positions = kinematics.squareSteps(x, y)
+        return x, y, [MotorState(motor, position) for motor, position in zip(self.motors, positions)]
+
+    def lineMove(self, x, y):
+        x1, y1, motors = self.planStart()
+        # Stream the move from the precompiled library when possible, otherwise precalculate it live
+        if self.library is not None:
+            entry = self.library.lookup(x1, y1, x, y, motors, kinematics.lineSettings(motors, self.tickTimeUs))
+            if entry is not None:
+                return movelib.LibraryMove(self.library, entry, x1, x, y1, y, motors, self.tickTimeUs, pool=self.pool)
+        if self.streaming:
+            return kinematics.StreamingMove(x1, x, y1, y, motors, self.tickTimeUs, fixedPoint=self.fixedPoint,
+                                            pool=self.rings, cache=self.lineCache)
+        return kinematics.PrecalculatedMove(x1, x, y1, y, motors, self.tickTimeUs, fixedPoint=self.fixedPoint,
+                                            pool=self.pool, cache=self.lineCache)
     
     def calculateMove(self, x, y):
-        self.currentMove = kinematics.PrecalculatedMove(self.x, x, self.y, y, self.motors)
+        self.carrying = False
+        self.chessPlan = None
+        self.currentMove = self.lineMove(x, y)
     
     def calculateMultiMove(self, waypoints):
+        self.carrying = False
+        self.chessPlan = None
         if len(waypoints) == 1:
             x, y = waypoints[0]
-            self.currentMove = kinematics.PrecalculatedMove(self.x, x, self.y, y, self.motors)
+            self.currentMove = self.lineMove(x, y)
         else:
             lines = []
-            cur_x, cur_y = self.x, self.y
+            cur_x, cur_y, motors = self.planStart()
             for x, y in waypoints:
                 lines.append((cur_x, cur_y, x, y))
                 cur_x, cur_y = x, y
-            self.currentMove = kinematics.MultiLineMove(lines, self.motors)
+            if self.dualCore:
+                self.currentMove = kinematics.DualCoreMultiLineMove(lines, motors, self.tickTimeUs,
+                                                                    fixedPoint=self.fixedPoint,
+                                                                    blendTolerance=self.blendTolerance,
+                                                                    pool=self.pool, cache=self.lineCache,
+                                                                    producer=self.producer)
+            else:
+                self.currentMove = kinematics.MultiLineMove(lines, motors, self.tickTimeUs, fixedPoint=self.fixedPoint,
+                                                            blendTolerance=self.blendTolerance, pool=self.pool,
+                                                            cache=self.lineCache)
+
+    def queueMove(self):
+        """
+        Queues the move just calculated instead of executing it straight away; executeNext plays
+        the queue in order. The next move is calculated from where this one ends, so moves can
+        be precalculated while earlier ones play. A routed move updates the occupancy now, so
+        routes planned after it see the piece on its new square.
+        """
+        move = self.currentMove
+        if self.carrying:
+            self.setOccupied(move.x1, move.y1, False)
+            self.setOccupied(move.x2, move.y2)
+            self.carrying = False
+        self.applyChessPlan()
+        self.queued.append(move)
+
+    def isOccupied(self, x, y):
+        return self.occupancy[router.squareIndex(x, y)] != 0
+
+    def setOccupied(self, x, y, occupied=True):
+        self.occupancy[router.squareIndex(x, y)] = 1 if occupied else 0
+
+    def setOccupancy(self, mask):
+        """Loads the whole board from a 64-bit mask with bit squareIndex(x, y) set where a piece stands."""
+        for square in range(64):
+            self.occupancy[square] = (mask >> square) & 1
+
+    def calculateRoute(self, x, y):
+        """
+        Plans moving the piece under the magnet to square (x, y) along the fastest route that
+        keeps clear of every other piece (see router.py), straight or along the square edges
+        and corners. Returns False, leaving the current move alone, if no route exists.
+        The occupancy follows the piece once the move has been executed (or queued).
+        """
+        x1, y1, _ = self.planStart()
+        waypoints = self.router.route(x1, y1, x, y, self.occupancy)
+        if waypoints is None:
+            return False
+        self.calculateMultiMove(waypoints)
+        self.carrying = True
+        return True
+
+    def calculateChessMove(self, x1, y1, x2, y2, kind=chessmove.MOVE):
+        """
+        Plans a whole chess move of the piece on (x1, y1) to (x2, y2) as one multi-line move:
+        `kind` is chessmove.MOVE, CAPTURE, CASTLE or EN_PASSANT. The ChessPlanner picks the order
+        of the piece moves and the graveyard slot that make it fastest (see chessmove.py).
+        Returns False, leaving the current move alone, if some piece has no route.
+        The occupancy follows the pieces once the move has been executed (or queued).
+        """
+        x, y, _ = self.planStart()
+        plan = self.chessPlanner.plan(x, y, kind, x1, y1, x2, y2, self.occupancy)
+        if plan is None:
+            return False
+        self.calculateMultiMove(plan.waypoints)
+        self.chessPlan = plan
+        return True
+
+    def applyChessPlan(self):
+        if self.chessPlan is not None:
+            self.chessPlan.apply(self.occupancy)
+            self.chessPlan = None
+
+    def setGraveyard(self, squares):
+        """Squares (x, y) captured pieces may be put on when they're free (default: the edge squares)."""
+        self.chessPlanner.setGraveyard(squares)
+
+    def setTickTime(self, tickTimeUs):
+        """
+        Plans the following moves with ticks of `tickTimeUs` (see ticktune.py). Moves already
+        calculated or queued keep their own tick. Speed limits are capped at one step per tick.
+        """
+        self.tickTimeUs = tickTimeUs
+        self.router.setTickTime(tickTimeUs)
+        # The graveyard slots' bounds come from the router's speed limits
+        self.chessPlanner.setGraveyard(self.chessPlanner.graveyard)
+        if self.stepMode == stepengine.PIO:
+            # The state machine's clock is derived from the tick
+            self.engine.close()
+            self.engine = stepengine.create(self.motors, stepengine.PIO, tickTimeUs)
+
+    def setPowerPolicy(self, policy, holdDuty=None, boostDuty=None):
+        """
+        Selects power.FULL or power.DYNAMIC for the following moves, optionally setting every
+        motor's hold and boost duties (0-65535) along with it.
+        """
+        self.powerPolicy = policy
+        for motor in self.motors:
+            if holdDuty is not None:
+                motor.setHoldPower(holdDuty)
+            if boostDuty is not None:
+                motor.setBoostPower(boostDuty)
 
-    
     def enable(self):
         for motor in self.motors:
             motor.enable()
@@ -31,12 +208,64 @@ class Board:
         for motor in self.motors:
             motor.disable()
             
-    def executeMove(self):
-        self.enable()
-        while not self.currentMove.complete:
-            self.currentMove.updateMotors()
-            utime.sleep_us(self.currentMove.tickTimeUs)
+    def beginMove(self, move):
+        """
+        Hands `move` the board's step engine and powers the motors up for playback. Under
+        power.DYNAMIC the move's ticks go through the power manager, which sets the duties.
+        """
+        metrics.sampleHeap()
+        move.engine = self.engine
+        self.engine.start()
+        if self.powerPolicy == power.DYNAMIC:
+            self.powerManager.begin(move, self.engine)
+            move.engine = self.powerManager
+        else:
+            self.enable()
+
+    def stopMotors(self, ticks):
+        """
+        Undoes beginMove once a move has played `ticks` ticks, or stopped early: stops the step
+        engine, powers the motors down and lets go of the move under power.DYNAMIC.
+        Returns the move's PowerReport.
+        """
+        self.engine.finish()
         self.disable()
-        self.x = self.currentMove.x2
-        self.y = self.currentMove.y2
-    
+        if self.powerPolicy == power.DYNAMIC:
+            return self.powerManager.finish()
+        return power.fullReport(self.motors, ticks)
+
+    def endMove(self, move):
+        """
+        Powers the motors down after `move` has played and moves the board to its end.
+        Adds the move's playback (self.lastPlayback) to the metrics, reports its power use
+        in self.lastPower and hands its step buffers back to the pool.
+        """
+        self.lastPower = self.stopMotors(self.lastPlayback.ticks)
+        move.release()
+        metrics.recordPlayback(self.lastPlayback, move.streamBytes)
+        self.x = move.x2
+        self.y = move.y2
+
+    def executeMove(self, mode=None):
+        # mode selects the playback engine for this move only (defaults to self.playbackMode)
+        move = self.currentMove
+        self.beginMove(move)
+        self.lastPlayback = playback.play(move, mode or self.playbackMode)
+        if self.carrying:
+            self.setOccupied(self.x, self.y, False)
+            self.setOccupied(move.x2, move.y2)
+            self.carrying = False
+        self.applyChessPlan()
+        self.endMove(move)
+        if _LOG:
+            print(self.lastPlayback, self.lastPower)
+
+    def executeNext(self, mode=None):
+        """Plays the oldest queued move. It stays in the queue while it plays (see planStart)."""
+        move = self.queued[0]
+        self.beginMove(move)
+        self.lastPlayback = playback.play(move, mode or self.playbackMode)
+        self.endMove(move)
+        self.queued.pop(0)
+        if _LOG:
+            print(self.lastPlayback, self.lastPower)
@@ -0,0 +1,92 @@
+"""
+Step Buffer Pool
+Every PrecalculatedMove and every MultiLineMove segment used to allocate a fresh bytearray, and
+append() could grow it further. Over a long game those large, short-lived blocks fragment the
+Pico's heap until a segment no longer fits anywhere. A BufferPool allocates a few blocks once, at
+boot, while the heap is still in one piece; moves borrow their step buffers from it and hand them
+back when they have been played (Board.endMove calls Move.release()).
+
+When no free block is big enough, the move allocates its own buffer as before and metrics counts
+a pool miss. A move that is dropped without being released just leaves its block to the garbage
+collector, so the pool gets smaller but never hands a block out twice.
+
+Segment sizes follow the memory that is really there instead of a fixed 10 KB: the largest free
+pool block, or without a pool a share of gc.mem_free() (see segmentBytes).
+"""
+import gc
+import metrics
+
+# Blocks for two moves (the one playing and the next one, see server.PLAN_AHEAD), which can
+# each hold two segment buffers when they're DualCoreMultiLineMoves
+POOL_BLOCKS = 4
+# Rings of streamed moves (kinematics.StreamingMove), the one playing and the next one, in a
+# pool of their own: a ring is a few hundred bytes and shouldn't tie up a whole segment block
+RING_BLOCKS = 2
+# Share of the free heap the pool takes at boot, in 1/8s
+POOL_SHARE = 4
+# Segment size without a pool: 1/SEGMENT_SHARE of the free heap, within these limits
+SEGMENT_SHARE = 8
+MIN_BLOCK = 2048
+MAX_BLOCK = 16384
+# Used when the free heap can't be measured (CPython without host/simulator.py)
+DEFAULT_SEGMENT = 10000
+
+_memFree = getattr(gc, 'mem_free', None)
+
+def freeHeap():
+    """gc.mem_free() after a collection, or -1 where it isn't available."""
+    if _memFree is None:
+        return -1
+    gc.collect()
+    return _memFree()
+
+def segmentBytes(pool=None):
+    """Bytes to give a MultiLineMove segment: the largest free pool block, or a share of the free heap."""
+    if pool is not None:
+        largest = pool.largest()
+        if largest:
+            return largest
+    free = freeHeap()
+    if free < 0:
+        return DEFAULT_SEGMENT
+    return max(MIN_BLOCK, min(MAX_BLOCK, free // SEGMENT_SHARE))
+
+class BufferPool:
+    """
+    `count` bytearrays of `size` bytes each. Without a size, the blocks share POOL_SHARE/8 of the
+    free heap, rounded down to 256 bytes and kept within MIN_BLOCK and MAX_BLOCK.
+    """
+    def __init__(self, count=POOL_BLOCKS, size=None):
+        if size is None:
+            free = freeHeap()
+            size = DEFAULT_SEGMENT if free < 0 else free * POOL_SHARE // (8 * count)
+            size = max(MIN_BLOCK, min(MAX_BLOCK, size & ~0xFF))
+        self.size = size
+        self.blocks = [bytearray(size) for _ in range(count)]
+        self.free = list(self.blocks)
+
+    def largest(self):
+        """Size of the largest free block, 0 if every block is lent out."""
+        return self.size if self.free else 0
+
+    def borrow(self, minimum=0):
+        """A free block of at least `minimum` bytes, or None (counted as a miss) if there isn't one."""
+        if self.free and minimum <= self.size:
+            return self.free.pop()
+        metrics.poolMisses += 1
+        return None
+
+    def release(self, buffer):
+        """Takes back a block borrow() handed out; anything else is left to the garbage collector."""
+        for block in self.blocks:
+            if block is buffer:
+                for free in self.free:
+                    if free is buffer:
+                        return
+                self.free.append(buffer)
+                return
+
+    def allocate(self, size):
+        """A pool block of at least `size` bytes if one is free, otherwise a fresh bytearray(size)."""
+        buffer = self.borrow(size)
+        return bytearray(size) if buffer is None else buffer
@@ -0,0 +1,214 @@
+"""
+Chess Moves
+A capture used to take the host several commands: route the captured piece off its square,
+move the magnet back, then route the capturing piece. Each of them paid its own planning, its
+ACK/DONE round trip and the host's pause between moves. ChessPlanner plans the whole chess move
+(a plain move, a capture, castling or en passant) as one list of waypoints instead, which
+Board.calculateChessMove plays as a single MultiLineMove.
+
+A chess move is a few piece moves (legs). For each one the magnet travels to the piece, then
+carries it, both along routes from router.py: the magnet stays on, so on its way to a piece it
+would drag any other one it passed under. The planner picks the order of the
+legs and the graveyard slot for a captured piece with the smallest total duration:
+    * a capture has to clear the destination first, so only the slot is chosen,
+    * en passant can move the pawn or remove the captured one first,
+    * castling can move the king or the rook first (the second one then routes around the first).
+Every line costs what router.Router.lineUs says, the duration of the velocity profile the move
+will really play (time-optimal, or constant cruise at the getTimeScalingFactor rate), and lines
+are added up because a MultiLineMove stops at every waypoint. With a blendTolerance the corners,
+including the ones where a piece is picked up, are rounded off and the plan is a little faster.
+
+Graveyard slots are board squares (the cables leave no room beside the board), so only the
+machine's owner knows which ones are out of play: there are none until setGraveyard (Board.
+setGraveyard, in main.py) is given them, and until then a capture has no plan. A captured piece
+goes on one of them when it's free, and the CHS replies name the slot, so the host knows where
+it is and can keep its moves clear of it. For every captured square the planner
+keeps the slots sorted by a lower bound of the time to get there (Router.lowerBoundUs), which
+doesn't depend on the occupancy and is only worked out once. Slots are routed in that order
+until the bound alone can't beat the best plan found, so most of them are never searched.
+"""
+import kinematics
+import router
+
+# Kinds of chess move
+MOVE = 'move'
+CAPTURE = 'capture'
+CASTLE = 'castle'
+EN_PASSANT = 'enpassant'
+
+# Letters for the kinds in the CHS command (see server.py); no letter is a plain move
+KIND_CODES = {'M': MOVE, 'X': CAPTURE, 'O': CASTLE, 'E': EN_PASSANT}
+
+# Every edge square, for a graveyard on a board whose play never reaches the edges
+EDGE_SQUARES = tuple((x, y) for y in range(1, 9) for x in range(1, 9) if x in (1, 8) or y in (1, 8))
+
+# Stands in for the graveyard slot in a leg until one is chosen
+GRAVEYARD = None
+
+class ChessPlan:
+    """
+    A planned chess move: the waypoints to hand to Board.calculateMultiMove (start not included),
+    the piece moves in the order they happen as (x1, y1, x2, y2), the slot the captured piece
+    goes to (None without one) and the planned duration in microseconds.
+    """
+    def __init__(self, waypoints, pieces, slot, durationUs):
+        self.waypoints = waypoints
+        self.pieces = pieces
+        self.slot = slot
+        self.durationUs = durationUs
+
+    def apply(self, occupancy):
+        """Moves the pieces in `occupancy` (64 bytes, see router.squareIndex) as the plan does."""
+        for x1, y1, x2, y2 in self.pieces:
+            occupancy[router.squareIndex(x1, y1)] = 0
+            occupancy[router.squareIndex(x2, y2)] = 1
+
+def legOrders(kind, x1, y1, x2, y2):
+    """Possible orders of the piece moves of a chess move, as lists of ((x1, y1), (x2, y2))."""
+    start = (x1, y1)
+    end = (x2, y2)
+    if kind == MOVE:
+        return [[(start, end)]]
+    if kind == CAPTURE:
+        return [[(end, GRAVEYARD), (start, end)]]
+    if kind == EN_PASSANT:
+        # The captured pawn stands beside the start square, on the destination's file
+        captured = (x2, y1)
+        return [[(captured, GRAVEYARD), (start, end)], [(start, end), (captured, GRAVEYARD)]]
+    if kind == CASTLE:
+        if y1 != y2 or abs(x2 - x1) != 2:
+            raise ValueError("castling moves the king two squares along its rank")
+        # The rook comes from the corner on the king's side and lands on the square it crossed
+        if x2 > x1:
+            rook = ((8, y1), (x2 - 1, y1))
+        else:
+            rook = ((1, y1), (x2 + 1, y1))
+        return [[(start, end), rook], [rook, (start, end)]]
+    raise ValueError(f"unknown kind of move: {kind}")
+
+class ChessPlanner:
+    """
+    Plans chess moves for one machine with its Router, whose line durations and routes it reuses.
+    """
+    def __init__(self, routePlanner, graveyard=()):
+        self.router = routePlanner
+        self.setGraveyard(graveyard)
+        self.searched = 0       # Routes the last plan asked the router for
+        self.routes = {}        # (x1, y1, x2, y2, occupancy) -> (waypoints, us), during a plan
+
+    def setGraveyard(self, squares):
+        """Squares captured pieces may be put on, whenever they're free."""
+        self.graveyard = tuple(squares)
+        self.slotBounds = {}    # Captured square -> [(lower bound us, slot), ...], fastest first
+
+    def slotsFrom(self, x, y):
+        """The graveyard slots sorted by the least time a piece on (x, y) could take to get there."""
+        square = router.squareIndex(x, y)
+        slots = self.slotBounds.get(square)
+        if slots is None:
+            slots = sorted((self.boundUs(x, y, sx, sy), (sx, sy)) for sx, sy in self.graveyard)
+            self.slotBounds[square] = slots
+        return slots
+
+    def boundUs(self, x1, y1, x2, y2):
+        """The least time any route between two squares can take (Router.lowerBoundUs)."""
+        length = 2 * ((x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1)) ** 0.5
+        return self.router.lowerBoundUs(kinematics.squareSteps(x1, y1), kinematics.squareSteps(x2, y2), length)
+
+    def lineUs(self, x1, y1, x2, y2):
+        """Microseconds of a line between two points in board coordinates (x.5 on the lanes)."""
+        if x1 == x2 and y1 == y2:
+            return 0
+        return self.router.lineUs(int(x1 * 2), int(y1 * 2), int(x2 * 2), int(y2 * 2))
+
+    def carry(self, x1, y1, x2, y2, occupancy, slot):
+        """
+        (waypoints, us) of the route for the piece (or the bare magnet) on (x1, y1) to (x2, y2),
+        or (None, 0).
+        A captured piece that was just put on `slot` only matters if the route would pass it, so
+        the route is planned without it, once for every slot, and only again around a slot that
+        is in the way (adding a piece can't make another route faster).
+        """
+        full = occupancy
+        if slot is not None:
+            occupancy = bytearray(occupancy)
+            occupancy[router.squareIndex(*slot)] = 0
+        key = (x1, y1, x2, y2, bytes(occupancy))
+        known = self.routes.get(key)
+        if known is None:
+            self.searched += 1
+            route = self.router.route(x1, y1, x2, y2, occupancy)
+            routeUs = 0
+            if route is not None:
+                cx, cy = x1, y1
+                for wx, wy in route:
+                    routeUs += self.lineUs(cx, cy, wx, wy)
+                    cx, cy = wx, wy
+            known = self.routes[key] = (route, routeUs)
+        route = known[0]
+        if slot is not None and route is not None:
+            # The slot on its own, as the only piece the route could run into
+            alone = bytearray(64)
+            alone[router.squareIndex(*slot)] = 1
+            cx, cy = x1, y1
+            for wx, wy in route:
+                if self.router.blocked(int(cx * 2), int(cy * 2), int(wx * 2), int(wy * 2), alone, -1):
+                    return self.carry(x1, y1, x2, y2, full, None)
+                cx, cy = wx, wy
+        return known
+
+    def plan(self, x, y, kind, x1, y1, x2, y2, occupancy):
+        """
+        The fastest ChessPlan for moving the piece on (x1, y1) to (x2, y2) with the magnet
+        starting on (x, y), or None if some piece can't get where it has to (or no slot is free).
+        `occupancy` holds 64 bytes, non-zero where a piece stands (see router.squareIndex).
+        """
+        self.searched = 0
+        self.best = None
+        self.routes = {}
+        self.router.updateSettings()
+        for legs in legOrders(kind, x1, y1, x2, y2):
+            self.search(legs, 0, x, y, bytearray(occupancy), 0, [], [], None)
+        return self.best
+
+    def search(self, legs, leg, x, y, occupancy, cost, waypoints, pieces, slot):
+        """Depth-first over the legs from `leg` on, with the magnet on (x, y) after `cost` us."""
+        if leg == len(legs):
+            best = self.best
+            if best is None or cost < best.durationUs:
+                self.best = ChessPlan(waypoints, pieces, slot, cost)
+            return
+        (px, py), target = legs[leg]
+        # Travel to the piece around the others, then carry it
+        if (px, py) != (x, y):
+            route, routeUs = self.carry(x, y, px, py, occupancy, slot)
+            if route is None:
+                return
+            cost += routeUs
+            if self.best is not None and cost >= self.best.durationUs:
+                return
+            waypoints = waypoints + route
+        if target is GRAVEYARD:
+            targets = self.slotsFrom(px, py)
+            if leg + 1 < len(legs):
+                # The magnet travels on from the slot to the next piece: add that to the bounds
+                nx, ny = legs[leg + 1][0]
+                targets = sorted((bound + self.boundUs(sx, sy, nx, ny), (sx, sy)) for bound, (sx, sy) in targets)
+        else:
+            targets = ((0, target),)
+        for bound, (tx, ty) in targets:
+            best = self.best
+            if best is not None and cost + bound >= best.durationUs:
+                break
+            if target is GRAVEYARD and occupancy[router.squareIndex(tx, ty)]:
+                continue
+            route, routeUs = self.carry(px, py, tx, ty, occupancy, None if target is GRAVEYARD else slot)
+            if route is None:
+                continue
+            if best is not None and cost + routeUs >= best.durationUs:
+                continue
+            after = bytearray(occupancy)
+            after[router.squareIndex(px, py)] = 0
+            after[router.squareIndex(tx, ty)] = 1
+            self.search(legs, leg + 1, tx, ty, after, cost + routeUs, waypoints + route,
+                        pieces + [(px, py, tx, ty)], (tx, ty) if target is GRAVEYARD else slot)
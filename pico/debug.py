@@ -21,3 +21,43 @@ def stepFromREPL(motor, timePerStepUs=3000):
             utime.sleep_us(timePerStepUs)
         utime.sleep_us(100)
         motor.disable()
+
+def comparePrecalculation(motors, x1=1, y1=1, x2=8, y2=8):
+    """
+    Times PrecalculatedMove for one line with the float path and with the fixed-point
+    generator (fixedstep.py), and counts the ticks where the two streams differ.
+    """
+    import gc
+    import kinematics
+    results = []
+    for fixedPoint in (False, True):
+        gc.collect()
+        started = utime.ticks_ms()
+        move = kinematics.PrecalculatedMove(x1, x2, y1, y2, motors, fixedPoint=fixedPoint)
+        results.append((utime.ticks_diff(utime.ticks_ms(), started), move.moves))
+    (floatMs, floatMoves), (fixedMs, fixedMoves) = results
+    differing = sum(1 for a, b in zip(floatMoves, fixedMoves) if a != b)
+    print(f'float: {floatMs} ms, fixed point: {fixedMs} ms, {len(floatMoves)} ticks, {differing} differ')
+
+def benchmarkStepEngines(motors, x1=1, y1=1, x2=8, y2=8):
+    """
+    Plays the ticks of one precalculated line through each step engine (stepengine.py)
+    back to back, without waiting between ticks, and prints the CPU time per tick. Keep the
+    motors disabled: the coils are driven but nothing moves, and the positions are restored
+    after every run.
+    """
+    import kinematics
+    import stepengine
+    moves = kinematics.PrecalculatedMove(x1, x2, y1, y2, motors).moves
+    positions = [motor.position for motor in motors]
+    for mode in (stepengine.PINS, stepengine.SIO):
+        engine = stepengine.create(motors, mode)
+        engine.start()
+        started = utime.ticks_us()
+        for tick in moves:
+            engine.apply(tick)
+        elapsed = utime.ticks_diff(utime.ticks_us(), started)
+        for motor, position in zip(motors, positions):
+            motor.position = position
+        print(f'{mode}: {len(moves)} ticks in {elapsed} us, {elapsed / len(moves):.1f} us per tick')
+    stepengine.SioEngine(motors).start()
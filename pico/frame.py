@@ -0,0 +1,236 @@
+"""
+Binary Command Frames
+An optional binary framing of the UART protocol, accepted alongside the text commands. A text
+command costs a decode, upper(), split() and int() per field; a long MOV(...) is 4 characters
+per square, which at 9600 baud takes tens of milliseconds just to arrive. A frame packs a
+square into one byte and can carry several commands:
+
+    SYNC  LEN  PAYLOAD (LEN bytes)  CRC16 (big-endian, CRC-16/CCITT-FALSE over LEN + PAYLOAD)
+
+SYNC (0xA5) never starts a text command, so the two can be mixed on the same line. The payload
+is a sequence of commands, each an id and a tag chosen by the host (echoed in the replies):
+
+    POS    0x01 tag
+    MOV    0x02 tag count square * count
+    RTE    0x03 tag square
+    OCC    0x04 tag mask (8 bytes, little-endian, bit squareIndex(x, y) set where a piece stands)
+    BAUD   0x05 tag baud (4 bytes, little-endian): switch to a faster rate once ACKed
+    STREAM 0x06 tag square positions (4 x int32, little-endian): play ticks planned on the host
+    DATA   0x07 tag count tick * count: the next packed ticks of stream `tag`
+    END    0x08 tag: stream `tag` has no more ticks
+
+A square is ((x - 1) << 3) | (y - 1). Replies are frames holding one reply each:
+
+    ACK 0x80 tag    DONE 0x81 tag    NAK 0x82 tag    POS 0x83 tag square
+    CREDIT 0x84 tag count (2 bytes, little-endian): stream `tag` may send `count` more ticks
+
+A frame that fails its CRC is answered with NAK and tag 0xFF.
+
+StreamParser splits the incoming bytes into text lines and checked frames without allocating:
+it reads the UART into a fixed chunk and copies bytes into fixed line and frame buffers, and
+commands are read straight out of the frame buffer.
+"""
+from array import array
+import micropython
+
+SYNC = 0xA5
+MAX_PAYLOAD = 255
+MAX_LINE = 256
+CHUNK = 64
+
+POS = 0x01
+MOV = 0x02
+RTE = 0x03
+OCC = 0x04
+BAUD = 0x05
+STREAM = 0x06
+DATA = 0x07
+END = 0x08
+
+ACK = 0x80
+DONE = 0x81
+NAK = 0x82
+POS_REPLY = 0x83
+CREDIT = 0x84
+
+# Tag of the NAK sent for a frame that failed its CRC
+BAD_FRAME = 0xFF
+
+# Rates BAUD may switch to
+BAUD_RATES = (9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600)
+
+# What StreamParser.poll() found
+NOTHING = 0
+LINE = 1
+FRAME = 2
+BAD = 3
+
+# Parser states
+_IDLE = 0
+_TEXT = 1
+_LENGTH = 2
+_PAYLOAD = 3
+_CRC_HIGH = 4
+_CRC_LOW = 5
+
+def _crcTable():
+    table = array('H', [0] * 256)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        table[i] = crc & 0xFFFF
+    return table
+
+_CRC_TABLE = _crcTable()
+
+@micropython.viper
+def _crc(buf: ptr8, start: int, end: int, crc: int, table: ptr16) -> int:
+    i = start
+    while i < end:
+        crc = ((crc << 8) ^ table[((crc >> 8) ^ buf[i]) & 0xFF]) & 0xFFFF
+        i += 1
+    return crc
+
+def crc16(buf, start=0, end=None, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE of buf[start:end], continuing from `crc`."""
+    return _crc(buf, start, len(buf) if end is None else end, crc, _CRC_TABLE)
+
+def packSquare(x, y):
+    return ((x - 1) << 3) | (y - 1)
+
+def unpackSquare(square):
+    """(x, y) of a packed square byte, or None if it isn't one."""
+    if square > 63:
+        return None
+    return (square >> 3) + 1, (square & 7) + 1
+
+def commandSize(payload, offset, length):
+    """Bytes taken by the command at payload[offset], or 0 if it is unknown or cut short."""
+    if offset + 2 > length:
+        return 0
+    command = payload[offset]
+    if command == POS:
+        size = 2
+    elif command == MOV:
+        size = 3 + payload[offset + 2] if offset + 3 <= length else 0
+    elif command == RTE:
+        size = 3
+    elif command == OCC:
+        size = 10
+    elif command == BAUD:
+        size = 6
+    elif command == STREAM:
+        size = 19
+    elif command == DATA:
+        size = 3 + payload[offset + 2] if offset + 3 <= length else 0
+    elif command == END:
+        size = 2
+    else:
+        size = 0
+    return size if offset + size <= length else 0
+
+def readInt(payload, offset, count, signed=False):
+    """Little-endian int of `count` bytes at payload[offset], unsigned unless `signed`."""
+    value = 0
+    for i in range(count - 1, -1, -1):
+        value = (value << 8) | payload[offset + i]
+    if signed and value >> (8 * count - 1):
+        value -= 1 << (8 * count)
+    return value
+
+def writeReply(buffer, kind, tag, square=-1, count=-1):
+    """
+    Writes a reply frame into `buffer` (6 bytes, 7 with a square, 8 with a 2-byte count) and
+    returns the buffer, so replies can be built in preallocated buffers.
+    """
+    buffer[0] = SYNC
+    buffer[2] = kind
+    buffer[3] = tag
+    end = 4
+    if square >= 0:
+        buffer[4] = square
+        end = 5
+    elif count >= 0:
+        buffer[4] = count & 0xFF
+        buffer[5] = count >> 8
+        end = 6
+    buffer[1] = end - 2
+    crc = crc16(buffer, 1, end)
+    buffer[end] = crc >> 8
+    buffer[end + 1] = crc & 0xFF
+    return buffer
+
+class StreamParser:
+    """
+    Splits the UART input into text lines (self.line[:self.lineLength], without the newline)
+    and frames whose CRC checks out (self.payload[:self.payloadLength]).
+    """
+    def __init__(self):
+        self.chunk = bytearray(CHUNK)
+        self.chunkLength = 0
+        self.chunkPosition = 0
+        self.line = bytearray(MAX_LINE)
+        self.lineLength = 0
+        self.payload = bytearray(MAX_PAYLOAD + 1) # The length byte goes first for the CRC
+        self.payloadLength = 0
+        self.received = 0
+        self.crc = 0
+        self.state = _IDLE
+        self.badFrames = 0
+
+    def poll(self, uart):
+        """
+        Consumes buffered input (reading more from `uart` once that runs out) until a line
+        or frame is complete. Returns LINE, FRAME, BAD (a frame failed its CRC) or NOTHING.
+        """
+        while True:
+            if self.chunkPosition >= self.chunkLength:
+                if not uart.any():
+                    return NOTHING
+                self.chunkLength = uart.readinto(self.chunk) or 0
+                self.chunkPosition = 0
+                if not self.chunkLength:
+                    return NOTHING
+            byte = self.chunk[self.chunkPosition]
+            self.chunkPosition += 1
+            found = self.step(byte)
+            if found:
+                return found
+
+    def step(self, byte):
+        state = self.state
+        if state == _IDLE:
+            if byte == SYNC:
+                self.state = _LENGTH
+            elif byte != 10 and byte != 13:
+                self.line[0] = byte
+                self.lineLength = 1
+                self.state = _TEXT
+        elif state == _TEXT:
+            if byte == 10:
+                self.state = _IDLE
+                return LINE
+            if self.lineLength < MAX_LINE:
+                self.line[self.lineLength] = byte
+                self.lineLength += 1
+        elif state == _LENGTH:
+            self.payload[0] = byte
+            self.payloadLength = byte
+            self.received = 0
+            self.state = _PAYLOAD if byte else _CRC_HIGH
+        elif state == _PAYLOAD:
+            self.received += 1
+            self.payload[self.received] = byte
+            if self.received == self.payloadLength:
+                self.state = _CRC_HIGH
+        elif state == _CRC_HIGH:
+            self.crc = byte << 8
+            self.state = _CRC_LOW
+        else:
+            self.state = _IDLE
+            if crc16(self.payload, 0, self.payloadLength + 1) == self.crc | byte:
+                return FRAME
+            self.badFrames += 1
+            return BAD
+        return NOTHING
@@ -0,0 +1,147 @@
+"""
+Host-Planned Streaming
+Lets the host do the planning: it runs the same planner (host/planner.py emits byte-identical
+packed ticks), and the Pico only checks the starting motor positions and plays the ticks as
+they arrive over the UART (STREAM, DATA and END frames, see frame.py and server.py).
+
+Flow control is credit based. The server hands out credit for the free space in a RingBuffer,
+the host never sends more ticks than it has credit for, and StreamedMove.updateMotors drains
+the buffer one tick per playback tick, so the buffer can't overflow whatever the baud rate.
+
+If the host falls behind, the move slows down along its path rather than stopping dead: below
+LOW_WATER buffered ticks, each tick is held for extra playback ticks, more of them the emptier
+the buffer gets (up to MAX_STRETCH). Only once the buffer is empty does the move pause, with the
+coils held where they are, and it resumes at the stretched speed once RESUME_TICKS have arrived.
+Holding a tick never skips one, so the motors still end exactly where the host planned.
+"""
+import kinematics
+import metrics
+import micropython
+
+# Ticks buffered on the Pico (a power of two); 2048 ticks is 4 s of motion at 2 ms a tick
+RING_SIZE = 2048
+
+# Credit is only sent back in steps of at least this many ticks, to keep the replies few
+CREDIT_STEP = 64
+
+# Below this many buffered ticks playback slows down...
+LOW_WATER = 128
+# ...to 1 / (1 + MAX_STRETCH) of the planned speed just before running dry
+MAX_STRETCH = 8
+# Ticks needed to resume after running dry (or before starting)
+RESUME_TICKS = 32
+
+class RingBuffer:
+    """
+    Fixed byte ring. head and tail count every byte ever written and read, so the indices
+    never need wrapping and head - tail is the fill level.
+    """
+    def __init__(self, size=RING_SIZE):
+        if size & (size - 1):
+            raise ValueError("Ring size must be a power of two")
+        self.buffer = bytearray(size)
+        self.mask = size - 1
+        self.head = 0
+        self.tail = 0
+
+    def reset(self):
+        self.head = 0
+        self.tail = 0
+
+    def available(self):
+        return self.head - self.tail
+
+    def free(self):
+        return len(self.buffer) - (self.head - self.tail)
+
+    def write(self, data, start, count):
+        """Copies data[start:start + count] in, or returns False (writing nothing) if it doesn't fit."""
+        if count > self.free():
+            return False
+        buffer = self.buffer
+        mask = self.mask
+        head = self.head
+        for i in range(count):
+            buffer[(head + i) & mask] = data[start + i]
+        self.head = head + count
+        return True
+
+    @micropython.native
+    def read(self):
+        """The oldest byte, or -1 if the ring is empty."""
+        tail = self.tail
+        if tail == self.head:
+            return -1
+        self.tail = tail + 1
+        return self.buffer[tail & self.mask]
+
+class StreamedMove(kinematics.Move):
+    """
+    Plays packed ticks from `ring` as the host sends them. The server writes the DATA into the
+    ring and sets `ended` at END; the move completes once that has happened and the ring is empty.
+    """
+    def __init__(self, x1, y1, x2, y2, motors, ring, tickTimeUs=2000):
+        kinematics.Move.__init__(self, motors, tickTimeUs)
+        self.motors = motors
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
+        self.ring = ring
+        self.ended = False
+        self.paused = True   # Waits for RESUME_TICKS before the first tick
+        self.waited = 0      # Playback ticks the next tick has been held for
+        self.heldTicks = 0
+        self.underruns = 0
+        self.streamBytes = 0 # Ticks received, for the credit and the metrics
+        self.peekAt = -1     # Ring position of the next tick for peekTick, from the first read
+        self.targets = kinematics.squareSteps(x2, y2)
+
+    def landed(self):
+        """True if every motor ended on the destination square's step target."""
+        for motor, target in zip(self.motors, self.targets):
+            if motor.position != target:
+                return False
+        return True
+
+    @micropython.native
+    def updateMotors(self):
+        ring = self.ring
+        available = ring.available()
+        if self.paused:
+            if available >= RESUME_TICKS or (self.ended and available):
+                self.paused = False
+            elif self.ended:
+                self.complete = True
+                return
+            else:
+                self.heldTicks += 1
+                return
+        if not available:
+            if self.ended:
+                self.complete = True
+                return
+            # Ran dry: hold the coils where they are until the host catches up
+            self.paused = True
+            self.underruns += 1
+            metrics.underruns += 1
+            self.heldTicks += 1
+            return
+        if available < LOW_WATER and not self.ended:
+            # Running low: hold this tick for longer, easing the motion down along its path
+            self.waited += 1
+            if self.waited * LOW_WATER < (LOW_WATER - available) * MAX_STRETCH:
+                self.heldTicks += 1
+                return
+        self.waited = 0
+        self.engine.apply(ring.read())
+
+    def peekTick(self):
+        """The buffered ticks ahead of playback; beyond them the host hasn't sent the rest yet."""
+        ring = self.ring
+        if self.peekAt < ring.tail:
+            self.peekAt = ring.tail
+        if self.peekAt < ring.head:
+            self.peekAt += 1
+            return ring.buffer[(self.peekAt - 1) & ring.mask]
+        return kinematics.PEEK_END if self.ended else kinematics.PEEK_UNKNOWN
@@ -0,0 +1,93 @@
+"""
+Kinematics Cache
+Working out a line's velocity profile samples the motors' rates all along it (rateLimits), and
+the same lines are asked for again and again: the router times every candidate line of a
+search, a MultiLineMove times every line once to size its segments and again to play it, and a
+game keeps coming back to the same squares. A LineCache remembers the timing of each line, its
+duration and the ticks it takes, so that only the first of them pays for the profile.
+
+A line is keyed by its end points in half squares, packed into one small int like the router's
+points, and its duration is kept in whole microseconds, so an entry is two small ints, a few
+bytes of RAM instead of a profile's float tables; the tick count follows from the duration. A
+line takes as long in either direction, so both directions share an entry. Timings also depend
+on the tick time, the speed limits and the profile settings, which every planner of a board
+shares: the cache holds timings for one set of them and starts over when another comes along
+(Board.setTickTime, say). The least recently used lines make room in two generations: lines go
+into the recent one, which becomes the older one once it holds half the entries, and a line
+found in the older one moves back to the recent one. Whatever wasn't used for a whole
+generation is dropped with the older one, and no lookup pays for any bookkeeping.
+
+Both cores use a board's cache: the server plans and fills segments on core 1 while core 0
+plays moves that work their ticks out as they go. A lock keeps each lookup and store whole.
+
+The square centres' step targets, the other thing every planner kept working out, are a table
+in kinematics.py (squareSteps).
+"""
+
+import _thread
+
+# Lines whose timings are kept, half of them in each generation
+LINE_CACHE_SIZE = 1024
+
+def lineKey(x1, y1, x2, y2):
+    """Key of the line between two points in board coordinates (whole squares, or x.5 on the lanes)."""
+    a = (int(x1 * 2) << 5) | int(y1 * 2)
+    b = (int(x2 * 2) << 5) | int(y2 * 2)
+    # Either direction of the line gets the same key
+    if b < a:
+        a, b = b, a
+    return (a << 10) | b
+
+class LineCache:
+    """
+    Durations (whole microseconds) of recently used lines, by key (see lineKey), for the settings
+    given with the last put. Either core may use it.
+    """
+    def __init__(self, size=LINE_CACHE_SIZE):
+        self.size = size
+        self.settings = None
+        self.recent = {}        # Key -> microseconds, used since the generation started
+        self.older = {}         # ...and in the generation before, until they're used again
+        self.hits = 0
+        self.misses = 0
+        self.lock = _thread.allocate_lock()
+
+    def get(self, settings, key):
+        """Microseconds of a line timed with `settings`, or None."""
+        with self.lock:
+            if settings == self.settings:
+                us = self.recent.get(key)
+                if us is not None:
+                    self.hits += 1
+                    return us
+                us = self.older.get(key)
+                if us is not None:
+                    self.hits += 1
+                    self.store(settings, key, us)
+                    return us
+            self.misses += 1
+            return None
+
+    def put(self, settings, key, us):
+        with self.lock:
+            self.store(settings, key, us)
+
+    def store(self, settings, key, us):
+        """put, with the lock already held."""
+        if settings != self.settings:
+            self.recent = {}
+            self.older = {}
+            self.settings = settings
+        self.recent[key] = us
+        if len(self.recent) >= self.size // 2:
+            # A new generation: what wasn't used during the last two goes
+            self.older = self.recent
+            self.recent = {}
+
+    def __len__(self):
+        return len(self.recent) + len(self.older)
+
+    def clear(self):
+        with self.lock:
+            self.recent = {}
+            self.older = {}
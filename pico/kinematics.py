@@ -4,9 +4,23 @@ This file handles the complex mathematics required to move the electromagnet in
 across an 8x8 chessboard using 4 stepper motors located at the corners.
 """
 import math
+from array import array
 import utime
 import micropython
+from micropython import const
 import gc
+import _thread
+import motionprofile
+import stepstream
+import fixedstep
+import stepengine
+import blend
+import metrics
+import bufpool
+import kincache
+
+# Progress prints (1: on). A const, so MicroPython compiles them out when 0, see metrics.py
+_LOG = const(0)
 
 # --- Spool Winding Constants ---
 # As string wraps around a spool, the effective radius increases.
@@ -18,6 +32,340 @@ _A = 0.0113142
 _B = 16.9572
 _C = -663.986
 
+# --- Spool Lookup Table ---
+# Every tick converts four squared cable lengths (d^2) to steps. While the end effector is on
+# the board, d^2 only ranges from 2 * 27^2 (the corner square next to a motor) to 2 * 228^2
+# (the opposite corner square), so the polynomial is tabulated over that range once at import
+# and linearly interpolated, which saves the square root. The table is single precision, like
+# every float on the Pico: (SPOOL_TABLE_SIZE + 1) * 4 bytes = 8 KB of RAM.
+# Worst-case error is 0.012 steps, at the corner squares (host/spool_report.py checks it).
+SPOOL_TABLE_SIZE = 2048
+SPOOL_MIN_SQ = 2 * 27 * 27
+SPOOL_MAX_SQ = 2 * 228 * 228
+_SPOOL_STEP = (SPOOL_MAX_SQ - SPOOL_MIN_SQ) / (SPOOL_TABLE_SIZE - 1)
+_SPOOL_SCALE = 1 / _SPOOL_STEP
+
+def buildSpoolTable(A, B, C):
+    """
+    Steps at SPOOL_TABLE_SIZE evenly spaced values of d^2, plus one spare entry so that
+    interpolating right at SPOOL_MAX_SQ can still read the entry after it.
+    """
+    table = array('f', [0] * (SPOOL_TABLE_SIZE + 1))
+    for i in range(SPOOL_TABLE_SIZE + 1):
+        dSq = SPOOL_MIN_SQ + i * _SPOOL_STEP
+        d = math.sqrt(dSq)
+        # B*d is concave in d^2, so a straight line between two entries sags below the curve by
+        # up to step^2/8 * B/(4*d^3). Raising the entries by half of that centres the error on zero.
+        table[i] = A * dSq + B * d + C + _SPOOL_STEP * _SPOOL_STEP * B / (64 * dSq * d)
+    return table
+
+_SPOOL_TABLE = buildSpoolTable(_A, _B, _C)
+
+@micropython.native
+def spoolSteps(dSq):
+    """
+    Unrounded steps for a squared cable length (mm^2) from the spool table. Only valid while
+    the end effector is on the board (SPOOL_MIN_SQ <= dSq <= SPOOL_MAX_SQ).
+    The precalculate loops inline this.
+    """
+    k = (dSq - SPOOL_MIN_SQ) * _SPOOL_SCALE
+    i = int(k)
+    low = _SPOOL_TABLE[i]
+    return low + (_SPOOL_TABLE[i + 1] - low) * (k - i)
+
+# Spool polynomial in fixed point for the float-free step generator (fixedstep.py)
+_FIXED_SPOOL = fixedstep.spoolCoefficients(_A, _B, _C)
+
+# Bytes kept free at the end of a MultiLineMove segment buffer: the compact stream encoder
+# can need a few more bytes to flush, and a line's settle ticks are always written whole
+SEGMENT_MARGIN = 8
+
+def stepsAt(x, y):
+    """
+    Absolute step targets of all 4 motors with the end effector at (x, y) in physical units (mm).
+    Uses the exact polynomial rather than the spool table: these are the canonical positions
+    every line ends on (see settleTicks).
+    """
+    a1Sq = (x + 17) * (x + 17)
+    b1Sq = (y + 17) * (y + 17)
+    a2Sq = (238 - x) * (238 - x)
+    b3Sq = (238 - y) * (238 - y)
+    d1Sq = a1Sq + b1Sq
+    d2Sq = a2Sq + b1Sq
+    d3Sq = a1Sq + b3Sq
+    d4Sq = a2Sq + b3Sq
+    return (round(_A * d1Sq + _B * math.sqrt(d1Sq) + _C),
+            round(_A * d2Sq + _B * math.sqrt(d2Sq) + _C),
+            round(_A * d3Sq + _B * math.sqrt(d3Sq) + _C),
+            round(_A * d4Sq + _B * math.sqrt(d4Sq) + _C))
+
+def boardToMm(n):
+    """Physical position (mm) of board coordinate n (1-8, x.5 between squares)."""
+    return 10 + (float(n - 1) * 28.71428)
+
+# --- Square Centre Table ---
+# Every line starts and ends on a square centre (or a lane point between them, for routes),
+# and the planners keep asking for the step targets there: settling at the end of every line,
+# the router's bounds, the chess planner's slots, the start of a queued move. The 64 centres
+# are worked out once at import, in router.squareIndex order (64 tuples of 4 ints).
+SQUARE_STEPS = tuple(stepsAt(boardToMm(x), boardToMm(y)) for y in range(1, 9) for x in range(1, 9))
+
+def squareSteps(x, y):
+    """
+    Step targets of all 4 motors with the end effector on board coordinates (x, y): from the
+    table on a square centre, worked out with stepsAt anywhere else (the lanes, x.5).
+    """
+    if x == int(x) and y == int(y) and 1 <= x <= 8 and 1 <= y <= 8:
+        return SQUARE_STEPS[(int(y) - 1) * 8 + int(x) - 1]
+    return stepsAt(boardToMm(x), boardToMm(y))
+
+def lineSettings(motors, tickTimeUs, accel=motionprofile.DEFAULT_ACCEL, jerk=motionprofile.DEFAULT_JERK,
+                 timeOptimal=True):
+    """
+    What a line's step stream depends on besides its ends and the motors' start positions, as
+    ParametricLineMove.lineSettings: (tickTimeUs, speed limits, accel, jerk, timeOptimal), with
+    each motor's maxSpeed capped at one step per tick like Move.speedLimits.
+    """
+    return (tickTimeUs, tuple(min(motor.maxSpeed, 1000000 // tickTimeUs) for motor in motors), accel, jerk,
+            timeOptimal)
+
+# Corner positions (mm) of the 4 motors, in the same order as getAllSteps returns them
+MOTOR_CORNERS = ((-17, -17), (238, -17), (-17, 238), (238, 238))
+
+def stepRates(x, y, dx, dy):
+    """
+    Rate of change of each motor's step count, in steps per unit of progress, with the end
+    effector at (x, y) mm travelling along (dx, dy) mm per unit of progress.
+    Chain rule on Steps = A*d^2 + B*d + C: dSteps/dp = (2*A*d + B) * (r . v) / d,
+    where r is the vector from the motor to the end effector.
+    """
+    rates = []
+    for cx, cy in MOTOR_CORNERS:
+        rx = x - cx
+        ry = y - cy
+        d = math.sqrt(rx * rx + ry * ry)
+        rates.append((2 * _A * d + _B) * (rx * dx + ry * dy) / d)
+    return rates
+
+# StreamingMove: ring size in ticks (a power of two), ticks produced before playback starts,
+# most ticks produced at a time in the slack of a tick, and slack left unused before a deadline (us)
+STREAM_RING = 128
+STREAM_PRIME = 8
+STREAM_BATCH = 4
+STREAM_GUARD_US = 100
+
+# Move.peekTick() results besides a tick: the move has no ticks left, or the next ones aren't known yet
+PEEK_END = -1
+PEEK_UNKNOWN = -2
+
+# Progress rate reported where no motor moves at all (e.g. a motor's cable is perpendicular to the path)
+NO_LIMIT = 1e9
+
+def rateLimits(x1, x2, y1, y2, speedLimits, samples=16):
+    """
+    Fastest allowed progress rate (full line lengths per second) at samples + 1 evenly spaced
+    points along the straight line from (x1, y1) to (x2, y2) in board units: the rate at which
+    the most constrained motor reaches its own speed limit (speedLimits, steps per second).
+    Sampled along the whole line since which end is the fastest depends on the motor, and
+    checking only the endpoints misses moves out of the corners.
+    """
+    start_x = boardToMm(x1)
+    start_y = boardToMm(y1)
+    dx = (x2 - x1) * 28.71428
+    dy = (y2 - y1) * 28.71428
+    limits = []
+    for k in range(samples + 1):
+        progress = k / samples
+        limit = NO_LIMIT
+        i = 0
+        for rate in stepRates(start_x + dx * progress, start_y + dy * progress, dx, dy):
+            if rate != 0:
+                motorLimit = speedLimits[i] / abs(rate)
+                if motorLimit < limit:
+                    limit = motorLimit
+            i += 1
+        limits.append(limit)
+    return limits
+
+def writeTicks(buffer, index, ticks):
+    """Writes `ticks` into `buffer` from `index` on, growing it if need be, and returns the index after them."""
+    for tick in ticks:
+        if index < len(buffer):
+            buffer[index] = tick
+        else:
+            buffer.append(tick)
+        index += 1
+    return index
+
+def settleTicks(x, y, positions, targets=None):
+    """
+    The last tick of a line lands just before progress reaches 1, which usually leaves a motor
+    one step short of the destination. Returns the packed ticks (normally zero to two of them)
+    that walk the motors from `positions` onto the exact targets at (x, y), updating
+    `positions` in place. Ending every line exactly on target keeps the motors on the
+    canonical square positions that the precompiled move library is built from.
+    `targets` are stepsAt(x, y) when the caller already has them (see squareSteps).
+    """
+    if targets is None:
+        targets = stepsAt(x, y)
+    ticks = bytearray()
+    while True:
+        encoded_byte = 0
+        for i in range(4):
+            gap = targets[i] - positions[i]
+            if gap > 0:
+                encoded_byte |= 1 << (i * 2)
+                positions[i] += 1
+            elif gap < 0:
+                encoded_byte |= 2 << (i * 2)
+                positions[i] -= 1
+        if encoded_byte == 0:
+            return ticks
+        ticks.append(encoded_byte)
+
+# Ticks between garbage collections while a FloatLineGenerator works out a move ahead of playback
+COLLECT_TICKS = 100
+
+class FloatLineGenerator:
+    """
+    Produces the packed ticks of a line, or of a blended run along `path` (see blend.py), with
+    floats and the spool table: the tick loop of every move that works its ticks out, in chunks
+    of any size. Same interface as fixedstep.LineGenerator, so a move takes whichever applies.
+    `positions` are the motor positions at the start. With `collect` the garbage collector runs
+    every COLLECT_TICKS ticks for the temporary floats; a move producing ticks in the slack of
+    playback (StreamingMove) can't afford the pause.
+    """
+    def __init__(self, profile, start_x, start_y, end_x, end_y, positions, tickTimeUs, path=None, collect=True):
+        self.profile = profile
+        self.start_x = start_x
+        self.start_y = start_y
+        self.dx = end_x - start_x
+        self.dy = end_y - start_y
+        self.tickTimeUs = tickTimeUs
+        self.path = path
+        self.collect = collect
+        self.t = 0             # Time of the next tick, microseconds
+        self.position = list(positions)
+
+    @property
+    def done(self):
+        return self.t > self.profile.totalUs
+
+    def positions(self):
+        return list(self.position)
+
+    @micropython.native
+    def fill(self, out, start, count):
+        """
+        Writes up to `count` ticks into out[start:] (growing nothing: `out` must have room)
+        and returns how many were written, 0 once the line is finished.
+        """
+        # Localize everything the loop reads: attribute lookups are slow in MicroPython
+        table = _SPOOL_TABLE
+        spool_min = SPOOL_MIN_SQ
+        spool_scale = _SPOOL_SCALE
+        int_func = int
+        round_func = round
+        progress_func = self.profile.progress
+        path = self.path
+        start_x = self.start_x
+        start_y = self.start_y
+        dx = self.dx
+        dy = self.dy
+        total_time_us = self.profile.totalUs
+        tick_us = self.tickTimeUs
+        collect = self.collect
+
+        # Where the ticks so far leave the motors
+        position = self.position
+        simulated_pos_1 = position[0]
+        simulated_pos_2 = position[1]
+        simulated_pos_3 = position[2]
+        simulated_pos_4 = position[3]
+
+        t = self.t
+        tick = t // tick_us
+        index = start
+        end = start + count
+        while index < end and t <= total_time_us:
+            progress = progress_func(t)
+            if path is None:
+                target_x = start_x + dx * progress
+                target_y = start_y + dy * progress
+            else:
+                target_x, target_y = path.point(progress)
+
+            # Inline getAllSteps (avoids function calls and redundant mapFromBoard calculations)
+            a1 = target_x + 17
+            b1 = target_y + 17
+            a2 = 238 - target_x
+            b3 = 238 - target_y
+
+            a1Sq = a1 * a1
+            b1Sq = b1 * b1
+            a2Sq = a2 * a2
+            b3Sq = b3 * b3
+
+            d1Sq = a1Sq + b1Sq
+            d2Sq = a2Sq + b1Sq
+            d3Sq = a1Sq + b3Sq
+            d4Sq = a2Sq + b3Sq
+
+            # Inline spoolSteps: interpolate the spool table instead of taking square roots
+            k = (d1Sq - spool_min) * spool_scale
+            i = int_func(k)
+            low = table[i]
+            s1 = round_func(low + (table[i + 1] - low) * (k - i))
+            k = (d2Sq - spool_min) * spool_scale
+            i = int_func(k)
+            low = table[i]
+            s2 = round_func(low + (table[i + 1] - low) * (k - i))
+            k = (d3Sq - spool_min) * spool_scale
+            i = int_func(k)
+            low = table[i]
+            s3 = round_func(low + (table[i + 1] - low) * (k - i))
+            k = (d4Sq - spool_min) * spool_scale
+            i = int_func(k)
+            low = table[i]
+            s4 = round_func(low + (table[i + 1] - low) * (k - i))
+
+            # Inline motor logic without creating Lists/Arrays
+            gap1 = s1 - simulated_pos_1
+            gap2 = s2 - simulated_pos_2
+            gap3 = s3 - simulated_pos_3
+            gap4 = s4 - simulated_pos_4
+
+            c1 = c2 = c3 = c4 = 0
+
+            if gap1 > 0.5: c1 = 1; simulated_pos_1 += 1
+            elif gap1 < -0.5: c1 = 2; simulated_pos_1 -= 1
+
+            if gap2 > 0.5: c2 = 1; simulated_pos_2 += 1
+            elif gap2 < -0.5: c2 = 2; simulated_pos_2 -= 1
+
+            if gap3 > 0.5: c3 = 1; simulated_pos_3 += 1
+            elif gap3 < -0.5: c3 = 2; simulated_pos_3 -= 1
+
+            if gap4 > 0.5: c4 = 1; simulated_pos_4 += 1
+            elif gap4 < -0.5: c4 = 2; simulated_pos_4 -= 1
+
+            # Bitwise pack the 4 commands into one byte directly
+            out[index] = c1 | (c2 << 2) | (c3 << 4) | (c4 << 6)
+            index += 1
+            t += tick_us
+            tick += 1
+
+            # Periodically collect garbage from temporary float objects created in the loop
+            if collect and tick % COLLECT_TICKS == 0:
+                gc.collect()
+
+        self.t = t
+        position[0] = simulated_pos_1
+        position[1] = simulated_pos_2
+        position[2] = simulated_pos_3
+        position[3] = simulated_pos_4
+        return index - start
+
 class Move:
     """
     Base class for executing any type of movement.
@@ -29,7 +377,14 @@ class Move:
         self.tickTimeUs = tickTimeUs
         self.temporalPosition = 0  # Tracks elapsed time in microseconds during the move
         self.complete = False      # Flag indicating if the move has finished
-        print(self.temporalPosition)
+        # Per-motor speed limits (steps per second) the planners must respect. A motor takes at
+        # most one step per tick, so a longer tick (see ticktune.py) lowers them too.
+        self.speedLimits = [min(motor.maxSpeed, 1000000 // tickTimeUs) for motor in motors]
+        # Applies each packed tick to the coils; Board swaps in its own engine (see stepengine.py)
+        self.engine = stepengine.PinEngine(motors)
+        self.pool = None # bufpool.BufferPool the step buffers are borrowed from, if any
+        if _LOG:
+            print(self.temporalPosition)
 
         # To avoid slow dynamic memory allocation during real-time motor control,
         # we pre-allocate all variables used in the heavy math function (getAllSteps).
@@ -73,6 +428,26 @@ class Move:
                 motor.setDirection(int(math.copysign(1, gap)))
                 motor.step()
 
+    # Playback calls fillSlack(deadline) in the slack before every tick if a move defines it (StreamingMove)
+    fillSlack = None
+
+    def allocate(self, size):
+        """A step buffer of at least `size` bytes, from the pool when there is one."""
+        if self.pool is None:
+            return bytearray(size)
+        return self.pool.allocate(size)
+
+    def release(self):
+        """Hands the move's step buffers back to the pool once it has been played."""
+        pass
+
+    def peekTick(self):
+        """
+        The next packed tick not peeked at yet, ahead of playback, for power.PowerManager's
+        lookahead. Moves that work their steps out as they play can't look ahead.
+        """
+        return PEEK_UNKNOWN
+
     @micropython.native # Use MicroPython's native code emitter for faster execution
     def getAllSteps(self, xBoard, yBoard):
         """
@@ -86,7 +461,8 @@ class Move:
                 return
             # Example conversion: Each square seems to be ~28.71 units wide, with a 10 unit offset
             return 10 + (float(n - 1) * 28.71428)
-        print(mapFromBoard(1))
+        if _LOG:
+            print(mapFromBoard(1))
         self.x = mapFromBoard(xBoard)
         self.y = mapFromBoard(yBoard)
 
@@ -105,16 +481,16 @@ class Move:
         self.a2Sq = (238 - self.x) ** 2
         self.b3Sq = (238 - self.y) ** 2
 
-        # Calculate the physical string length to each corner (c = sqrt(a^2 + b^2))
-        # Then, apply the quadratic polynomial to convert string length into motor steps.
+        # The squared string length to each corner (c^2 = a^2 + b^2) is converted straight into
+        # motor steps by the spool table, which interpolates the quadratic polynomial.
         # Motor 1 (Bottom Left)
-        s1 = round(_A * (self.a1Sq + self.b1Sq) + (_B * math.sqrt(self.a1Sq + self.b1Sq)) + _C)
+        s1 = round(spoolSteps(self.a1Sq + self.b1Sq))
         # Motor 2 (Bottom Right)
-        s2 = round(_A * (self.a2Sq + self.b1Sq) + (_B * math.sqrt(self.a2Sq + self.b1Sq)) + _C)
+        s2 = round(spoolSteps(self.a2Sq + self.b1Sq))
         # Motor 3 (Top Left)
-        s3 = round(_A * (self.a1Sq + self.b3Sq) + (_B * math.sqrt(self.a1Sq + self.b3Sq)) + _C)
+        s3 = round(spoolSteps(self.a1Sq + self.b3Sq))
         # Motor 4 (Top Right)
-        s4 = round(_A * (self.a2Sq + self.b3Sq) + (_B * math.sqrt(self.a2Sq + self.b3Sq)) + _C)
+        s4 = round(spoolSteps(self.a2Sq + self.b3Sq))
 
         return s1, s2, s3, s4
 
@@ -125,7 +501,8 @@ class ParametricLineMove(Move):
     Moving in a straight line in a Cartesian plane requires complex, non-linear coordinate 
     movements from all 4 string lengths.
     """
-    def __init__(self, x1, x2, y1, y2, motors, tickTimeUs=2000):
+    def __init__(self, x1, x2, y1, y2, motors, tickTimeUs=2000,
+                 accel=motionprofile.DEFAULT_ACCEL, jerk=motionprofile.DEFAULT_JERK, timeOptimal=True, cache=None):
         super().__init__(motors, tickTimeUs=tickTimeUs)
         self.motors = motors
         # Start and end coordinates in board units (1-8)
@@ -133,11 +510,26 @@ class ParametricLineMove(Move):
         self.x2 = x2
         self.y1 = y1
         self.y2 = y2
+        # Acceleration (mm/s^2) and jerk (mm/s^3) limits of the velocity profile
+        self.accel = accel
+        self.jerk = jerk
+        # Follow the motors' speed limits along the whole line instead of cruising at one constant speed
+        self.timeOptimal = timeOptimal
+        # kincache.LineCache shared with the board's other planners, if any
+        self.cache = cache
+        self.lineSettings = (tickTimeUs, tuple(self.speedLimits), accel, jerk, timeOptimal)
         
-        # Calculate how long the move needs to take so that the fastest moving motor 
-        # does not exceed its maximum speed limitation.
-        self.scalingFactor = self.getTimeScalingFactor(x1, x2, y1, y2)
-        print(f'scalingFactor = {self.scalingFactor}')
+        # Plan how progress along the line evolves over time. No motor may exceed its maximum
+        # speed, and the ramps respect the acceleration limits.
+        self.profile = self.lineProfile(x1, x2, y1, y2)
+        if cache is not None:
+            self.recordTiming(x1, x2, y1, y2, self.profile)
+        self.scalingFactor = self.profile.duration # Total duration of the move in seconds
+        if _LOG:
+            print(f'scalingFactor = {self.scalingFactor}')
+        if _LOG:
+            if timeOptimal:
+                print(f'Time-optimal timing saves {self.profile.savedUs} us over constant cruise')
 
     def moveFunction(self, microSec):
         """
@@ -145,95 +537,75 @@ class ParametricLineMove(Move):
         Given an elapsed time, where should the end effector be?
         """
         # If we have passed the calculated end time for this move, mark it complete.
-        if self.temporalPosition > self.scalingFactor * 1000000:
-            print(f"Move Complete at time {self.temporalPosition}")
+        if self.temporalPosition > self.profile.totalUs:
+            if _LOG:
+                print(f"Move Complete at time {self.temporalPosition}")
             self.complete = True
             return
         # Otherwise, calculate the coordinates on the line based on the time
-        return self.parametricLine(microSec, self.x1, self.x2, self.y1, self.y2, self.scalingFactor)
+        return self.parametricLine(microSec, self.x1, self.x2, self.y1, self.y2)
         
-    def parametricLine(self, microSec, x1, x2, y1, y2, scalingFactor): 
+    def parametricLine(self, microSec, x1, x2, y1, y2): 
         """
         Interpolates the X and Y coordinates along a straight line based on the elapsed time.
         """
-        timeSec = microSec / 1000000
+        progress = self.profile.progress(microSec)
         # Linear interpolation (Lerp): start + (difference) * progress
-        targetX = x1 + (x2 - x1) * (timeSec / scalingFactor)
-        targetY = y1 + (y2 - y1) * (timeSec / scalingFactor)
+        targetX = x1 + (x2 - x1) * progress
+        targetY = y1 + (y2 - y1) * progress
         
         # Calculate where the 4 motors need to be to reach this specific X, Y point
         steps = self.getAllSteps(targetX, targetY)
         return steps
 
-    def getTimeScalingFactor(self, x1, x2, y1, y2): 
+    def lineProfile(self, x1, x2, y1, y2):
         """
-        Analyzes the planned movement to find the theoretical maximum speed any motor will experience.
-        Returns a time duration multiplier to guarantee no motor runs too fast.
+        Velocity profile for a line (see motionprofile.py). Time-optimal moves follow the rate
+        limit of the most constrained motor along the line; otherwise the move cruises as fast
+        as its worst point allows, with acceleration and jerk limited ramps at both ends.
         """
-        maxMotorSpeed = 500 # Maximum allowable steps per second for the steppers
+        length = math.sqrt((x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1)) * 28.71428
+        if self.timeOptimal and length > 0:
+            # Roughly one sample every 4 mm
+            limits = rateLimits(x1, x2, y1, y2, self.speedLimits, 8 + int(length / 4))
+            # Compare against the constant-cruise profile over the same limits
+            baseline = motionprofile.MotionProfile(length, min(limits), self.accel, self.jerk)
+            return motionprofile.TimeOptimalProfile(length, limits, self.accel, baseline.totalUs)
+        timeScalingFactor = self.getTimeScalingFactor(x1, x2, y1, y2)
+        maxRate = 1 / timeScalingFactor if timeScalingFactor > 0 else 0
+        return motionprofile.MotionProfile(length, maxRate, self.accel, self.jerk)
 
-        # To simplify calculus, we rotate the move vector into the reference frame of each 
-        # of the 4 motors. This allows us to use a single derivative function for all 4 corners.
-        rotatedCoordinates = [
-            [x1, x2, y1, y2],                 # Motor 1 Frame
-            [y1, y2, 8 - x1, 8 - x2],         # Motor 2 Frame
-            [8 - x1, 8 - x2, 8 - y1, 8 - y2], # Motor 4 Frame
-            [8 - y1, 8 - y2, x1, x2]          # Motor 3 Frame
-        ]
-        print(rotatedCoordinates)
-        
-        maxSpeeds = []
-        # Calculate the maximum instantaneous speed for each motor during the move
-        for rotation in rotatedCoordinates: 
-            # Check the speed at the very beginning of the move (t=0)
-            d0 = self.ds_dt(0, rotation[0], rotation[1], rotation[2], rotation[3])
-            # Check the speed at the very end of the move (t=-1 could represent completion, though the math here assumes a specific normalization)
-            d1 = self.ds_dt(-1, rotation[0], rotation[1], rotation[2], rotation[3])
-            print(d0, d1)
-            # For a linear move the maximum speed will occur at the start or the end of the move.
-            maxSpeeds.append(max(abs(d0), abs(d1)))
-            
-        print(maxSpeeds)
-        # Find the absolute fastest moving motor
-        unscaledMaxSpeed = max(maxSpeeds)
-        print(f'unscaledMaxSpeed={unscaledMaxSpeed}')
-        
-        # How much do we need to stretch time to keep unscaledMaxSpeed under maxMotorSpeed?
-        timeScalingFactor = unscaledMaxSpeed / maxMotorSpeed
-        return timeScalingFactor + 0.2 # Add a 0.2 second buffer to ensure smooth acceleration profiles
-    
-    def ds_dt(self, t, x1, x2, y1, y2): 
-        """
-        The analytical derivative of the string length equation with respect to time.
-        This provides the instantaneous velocity (steps per second) of a motor at any time 't'.
-        Instead of simulating the whole move, calculus tells us exactly how fast a motor is pulling.
-        """
-        print(x1, y1, x2, y2)
-        a = 0.0113142
-        b = 16.9572
-        dx = x2 - x1
-        dy = y2 - y1
-        const = 0.0597013054131951 # Mathematical constant derived during the derivative formulation
-
-        # Calculate intermediate terms representing position at time 't'
-        term_x = t * dx - x1 + const
-        term_y = t * dy - y1 + const
-
-        # Pythagorean distance calculation
-        sqrtTerm = math.sqrt(term_x**2 + term_y**2)
-
-        if sqrtTerm == 0:
-            print("derivative error. Division by zero")
-            return 0
-        
-        # The complex chain-rule derivative of the Steps polynomial function
-        numerator1 = 1649.0197518368 * a * (-dx * term_x - dy * term_y) * sqrtTerm
-        numerator2 = 14.35714 * b * (2 * -dx * term_x + 2 * -dy * term_y)
-        print(numerator1, numerator2)
-        numerator = numerator1 + numerator2
-        denominator = sqrtTerm
+    def lineTiming(self, x1, x2, y1, y2):
+        """
+        (ticks, microseconds, profile) of a line, in whole microseconds as the line cache keeps
+        them. They come from the cache when it has the line, and the profile is then None.
+        """
+        if self.cache is not None:
+            us = self.cache.get(self.lineSettings, kincache.lineKey(x1, y1, x2, y2))
+            if us is not None:
+                return us // self.tickTimeUs + 1, us, None
+        profile = self.lineProfile(x1, x2, y1, y2)
+        ticks, us = self.recordTiming(x1, x2, y1, y2, profile)
+        return ticks, us, profile
 
-        return numerator / denominator
+    def recordTiming(self, x1, x2, y1, y2, profile):
+        """
+        (ticks, microseconds) of a line's profile, which go into the line cache too. Rounding to
+        whole microseconds can only add a tick, so the count still bounds the ticks played.
+        """
+        us = round(profile.totalUs)
+        if self.cache is not None:
+            self.cache.put(self.lineSettings, kincache.lineKey(x1, y1, x2, y2), us)
+        return us // self.tickTimeUs + 1, us
+
+    def getTimeScalingFactor(self, x1, x2, y1, y2): 
+        """
+        Analyzes the planned movement to find the theoretical maximum speed any motor will experience.
+        Returns the duration (seconds) of a constant-speed move that keeps every motor under its
+        speed limit, i.e. the inverse of the fastest allowed cruise rate.
+        """
+        # The slowest point of the line sets the constant cruise rate
+        return 1 / min(rateLimits(x1, x2, y1, y2, self.speedLimits))
 
 '''
 Motor Layout on the Board:
@@ -249,116 +621,65 @@ class PrecalculatedMove(ParametricLineMove):
     this class pre-computes an entire movement and compresses it into a lightweight bytearray.
     This ensures the robot can move smoothly without processor stutters.
     """
-    def __init__(self, x1, x2, y1, y2, motors, tickTimeUs=2000):
-        super().__init__(x1, x2, y1, y2, motors, tickTimeUs)
+    def __init__(self, x1, x2, y1, y2, motors, tickTimeUs=2000,
+                 accel=motionprofile.DEFAULT_ACCEL, jerk=motionprofile.DEFAULT_JERK, timeOptimal=True,
+                 fixedPoint=False, pool=None, cache=None):
+        super().__init__(x1, x2, y1, y2, motors, tickTimeUs, accel, jerk, timeOptimal, cache)
+        self.fixedPoint = fixedPoint # Use the float-free generator (fixedstep.py) where the profile allows
+        self.pool = pool
         self.moves = bytearray() # Stores the pre-calculated step sequences
+        self.length = 0          # Bytes of self.moves in use: a pooled buffer is usually longer
         self.move_index = 0      # Tracks which byte we are currently executing
+        self.peek_index = 0      # Next byte for peekTick
+        started = utime.ticks_us()
         self.precalculate()
+        self.streamBytes = self.length # Size of the step stream, for metrics
+        metrics.recordPrecalc(utime.ticks_diff(utime.ticks_us(), started), self.length)
+
+    def usesFixedPoint(self, profile):
+        # The fixed-point generator needs the piecewise-quadratic progress of a TimeOptimalProfile
+        return self.fixedPoint and isinstance(profile, motionprofile.TimeOptimalProfile)
+
+    def lineGenerator(self, profile, start_x, start_y, end_x, end_y, positions, path=None):
+        """The generator of a line's ticks: float-free where the profile allows, see usesFixedPoint."""
+        if path is None and self.usesFixedPoint(profile):
+            return fixedstep.LineGenerator(profile, start_x, start_y, end_x, end_y, positions,
+                                           self.tickTimeUs, _FIXED_SPOOL)
+        return FloatLineGenerator(profile, start_x, start_y, end_x, end_y, positions, self.tickTimeUs, path)
 
-    @micropython.native
     def precalculate(self):
         """
         Runs the entire move in a fast-forward simulation.
         Instead of moving motors, it records the required steps into a memory buffer.
         """
-        print("Pre-calculating moves...")
-        
-        # --- OPTIMIZATIONS FOR MICROPYTHON SPEED ---
-        # 1. Pre-calculate the starting and ending board coordinates ONCE
-        start_x = 10 + (float(self.x1 - 1) * 28.71428)
-        start_y = 10 + (float(self.y1 - 1) * 28.71428)
-        end_x = 10 + (float(self.x2 - 1) * 28.71428)
-        end_y = 10 + (float(self.y2 - 1) * 28.71428)
-        
-        dx = end_x - start_x
-        dy = end_y - start_y
-        
-        total_time_us = self.scalingFactor * 1000000
-        tick_us = self.tickTimeUs
-        
-        # Pre-allocate the bytearray to prevent memory fragmentation!
-        num_ticks = int(total_time_us / tick_us) + 1
-        self.moves = bytearray(num_ticks)
-        
-        # 2. Localize variables for much faster lookup in the while loop
-        A, B, C = _A, _B, _C
-        sqrt = math.sqrt
-        round_func = round
-        
-        # Create a virtual snapshot of where the motors are currently located
-        simulated_pos_1 = self.motors[0].position
-        simulated_pos_2 = self.motors[1].position
-        simulated_pos_3 = self.motors[2].position
-        simulated_pos_4 = self.motors[3].position
-        
-        t = 0
-        idx = 0
-        while t <= total_time_us:
-            # Inline parametricLine mapping (avoids function calls)
-            progress = t / total_time_us
-            target_x = start_x + dx * progress
-            target_y = start_y + dy * progress
-            
-            # Inline getAllSteps (avoids function calls and redundant mapFromBoard calculations)
-            a1 = target_x + 17
-            b1 = target_y + 17
-            a2 = 238 - target_x
-            b3 = 238 - target_y
-            
-            a1Sq = a1 * a1
-            b1Sq = b1 * b1
-            a2Sq = a2 * a2
-            b3Sq = b3 * b3
-            
-            d1Sq = a1Sq + b1Sq
-            d2Sq = a2Sq + b1Sq
-            d3Sq = a1Sq + b3Sq
-            d4Sq = a2Sq + b3Sq
-            
-            # math.sqrt and round are fast when localized
-            s1 = round_func(A * d1Sq + B * sqrt(d1Sq) + C)
-            s2 = round_func(A * d2Sq + B * sqrt(d2Sq) + C)
-            s3 = round_func(A * d3Sq + B * sqrt(d3Sq) + C)
-            s4 = round_func(A * d4Sq + B * sqrt(d4Sq) + C)
-            
-            # Inline motor logic without creating Lists/Arrays
-            gap1 = s1 - simulated_pos_1
-            gap2 = s2 - simulated_pos_2
-            gap3 = s3 - simulated_pos_3
-            gap4 = s4 - simulated_pos_4
-            
-            c1 = c2 = c3 = c4 = 0
-            
-            if gap1 > 0.5: c1 = 1; simulated_pos_1 += 1
-            elif gap1 < -0.5: c1 = 2; simulated_pos_1 -= 1
-                
-            if gap2 > 0.5: c2 = 1; simulated_pos_2 += 1
-            elif gap2 < -0.5: c2 = 2; simulated_pos_2 -= 1
-                
-            if gap3 > 0.5: c3 = 1; simulated_pos_3 += 1
-            elif gap3 < -0.5: c3 = 2; simulated_pos_3 -= 1
-                
-            if gap4 > 0.5: c4 = 1; simulated_pos_4 += 1
-            elif gap4 < -0.5: c4 = 2; simulated_pos_4 -= 1
-            
-            # Bitwise pack the 4 commands into one byte directly
-            encoded_byte = c1 | (c2 << 2) | (c3 << 4) | (c4 << 6)
-            
-            if idx < num_ticks:
-                self.moves[idx] = encoded_byte
-            else:
-                self.moves.append(encoded_byte)
-            
-            t += tick_us
-            idx += 1
-            
-            # Periodically collect garbage from temporary float objects created in the loop
-            if idx % 100 == 0:
-                gc.collect()
-            
+        if _LOG:
+            print("Pre-calculating moves...")
+        start_x = boardToMm(self.x1)
+        start_y = boardToMm(self.y1)
+        end_x = boardToMm(self.x2)
+        end_y = boardToMm(self.y2)
+
+        # Pre-allocate the bytearray (or borrow it from the pool) to prevent memory fragmentation!
+        # The pool's blocks need room for the settle ticks too.
+        num_ticks = int(self.profile.totalUs / self.tickTimeUs) + 1
+        self.moves = bytearray(num_ticks) if self.pool is None else self.allocate(num_ticks + 4)
+
+        # Start from a virtual snapshot of where the motors are currently located
+        positions = [motor.position for motor in self.motors]
+        generator = self.lineGenerator(self.profile, start_x, start_y, end_x, end_y, positions)
+        length = generator.fill(self.moves, 0, len(self.moves))
+        while not generator.done:
+            # Only if the tick count rounded the other way: make room for the rest
+            self.moves.extend(bytearray(4))
+            length += generator.fill(self.moves, length, len(self.moves) - length)
+
+        # Finish exactly on the destination square
+        settle = settleTicks(end_x, end_y, generator.positions(), squareSteps(self.x2, self.y2))
+        self.length = writeTicks(self.moves, length, settle)
         self.temporalPosition = 0
         self.complete = False
-        print("Move pre-calculation complete.")
+        if _LOG:
+            print("Move pre-calculation complete.")
 
     @micropython.native
     def updateMotors(self):
@@ -366,60 +687,221 @@ class PrecalculatedMove(ParametricLineMove):
         The fast, real-time playback function.
         It simply reads bytes from the array and applies the step signals, skipping all heavy math.
         """
-        if self.move_index >= len(self.moves):
+        if self.move_index >= self.length:
             self.complete = True
             return
 
-        # Fetch the instruction byte for this specific tick
-        encoded_byte = self.moves[self.move_index]
-        
-        # Decode the 4 motor instructions
-        for i in range(4):
-            # Extract the 2 bits for motor i by shifting and applying a bitmask (0b11)
-            value = (encoded_byte >> (i * 2)) & 0b11
-            command = 0
-            if value == 1:
-                command = 1
-            elif value == 2:
-                command = -1
-            
-            # Execute the step physically
-            if command != 0:
-                self.motors[i].setDirection(command)
-                self.motors[i].step()
+        # Fetch the instruction byte for this specific tick and execute the steps physically
+        self.engine.apply(self.moves[self.move_index])
         
         # Advance the playback head
         self.move_index += 1
 
+    def peekTick(self):
+        if self.peek_index >= self.length:
+            return PEEK_END
+        self.peek_index += 1
+        return self.moves[self.peek_index - 1]
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self.moves)
+            self.moves = None
+
+
+class StreamingMove(ParametricLineMove):
+    """
+    A line move that works its ticks out while it plays instead of before, so motion starts as
+    soon as the first STREAM_PRIME ticks are known, however long the line. The ticks come from
+    a resumable producer (produce(), the PrecalculatedMove loop with its state kept between calls)
+    into a ring of STREAM_RING ticks. The playback engines call fillSlack() in the slack before
+    every tick's deadline, which produces as many ticks as its running estimate of their cost
+    says still fit before the deadline, keeping up to a ring's worth of lookahead.
+    Memory use is the ring and the producer state, whatever the length of the line. With a pool
+    the ring is borrowed from it: Board passes its pool of rings (bufpool.RING_BLOCKS rings of
+    STREAM_RING bytes, allocated at boot) rather than the segment pool.
+    If the ring ever runs dry, updateMotors produces the tick itself and counts a stall.
+    Plays exactly the stream a PrecalculatedMove of the same line would.
+    """
+    def __init__(self, x1, x2, y1, y2, motors, tickTimeUs=2000,
+                 accel=motionprofile.DEFAULT_ACCEL, jerk=motionprofile.DEFAULT_JERK, timeOptimal=True,
+                 fixedPoint=False, ringSize=STREAM_RING, pool=None, cache=None):
+        super().__init__(x1, x2, y1, y2, motors, tickTimeUs, accel, jerk, timeOptimal, cache)
+        if ringSize & (ringSize - 1):
+            raise ValueError("Ring size must be a power of two")
+        self.pool = pool
+        self.ring = self.allocate(ringSize)
+        self.ringSize = ringSize
+        self.mask = ringSize - 1
+        self.head = 0            # Ticks produced so far...
+        self.tail = 0            # ...and played; head - tail are waiting in the ring
+        self.peekAt = 0          # Next tick for peekTick
+        self.start_x = boardToMm(x1)
+        self.start_y = boardToMm(y1)
+        self.end_x = boardToMm(x2)
+        self.end_y = boardToMm(y2)
+        self.settle = None       # Settle ticks, once the line itself has been produced
+        self.settled = 0         # ...and how many of them are in the ring
+        self.done = False        # Every tick has been produced
+        positions = [motor.position for motor in motors]
+        if fixedPoint and isinstance(self.profile, motionprofile.TimeOptimalProfile):
+            self.generator = fixedstep.LineGenerator(self.profile, self.start_x, self.start_y, self.end_x,
+                                                     self.end_y, positions, tickTimeUs, _FIXED_SPOOL)
+        else:
+            # No collections: they would take longer than the slack of a tick
+            self.generator = FloatLineGenerator(self.profile, self.start_x, self.start_y, self.end_x,
+                                                self.end_y, positions, tickTimeUs, collect=False)
+        self.stalls = 0          # Ticks updateMotors had to produce itself
+        self.tickUs = 0          # Estimated cost of producing a tick, so fillSlack knows what still fits
+        self.produceUs = 0       # Time spent producing, for metrics
+        self.streamBytes = 0
+        self.timedProduce(STREAM_PRIME)
+
+    def produce(self, count):
+        """
+        Produces up to `count` more ticks into the ring, fewer if it fills up or the line ends,
+        and returns how many.
+        """
+        ring = self.ring
+        mask = self.mask
+        head = self.head
+        room = self.ringSize - (head - self.tail)
+        if count > room:
+            count = room
+        made = 0
+        generator = self.generator
+        while made < count and not generator.done:
+            # Up to the end of the ring at most, then on from its start
+            index = (head + made) & mask
+            made += generator.fill(ring, index, min(count - made, self.ringSize - index))
+        if generator.done and self.settle is None:
+            self.settle = settleTicks(self.end_x, self.end_y, generator.positions(), squareSteps(self.x2, self.y2))
+        settle = self.settle
+        if settle is not None:
+            while made < count and self.settled < len(settle):
+                ring[(head + made) & mask] = settle[self.settled]
+                self.settled += 1
+                made += 1
+            if self.settled == len(settle):
+                self.done = True
+        self.head = head + made
+        self.streamBytes += made
+        return made
+
+    def timedProduce(self, count):
+        """produce(count), keeping track of the time it takes per tick."""
+        started = utime.ticks_us()
+        made = self.produce(count)
+        elapsed = utime.ticks_diff(utime.ticks_us(), started)
+        self.produceUs += elapsed
+        if made:
+            # Follow a slower tick straight away, a faster one gradually (a GC pause shouldn't stick)
+            cost = elapsed // made
+            if cost > self.tickUs:
+                self.tickUs = cost
+            else:
+                self.tickUs -= (self.tickUs - cost) >> 3
+        return made
+
+    def fillSlack(self, deadline):
+        """
+        Produces ticks until the ring is full or the next ones might not be done by `deadline`
+        (a ticks_us value). Called by the playback engines before they wait for a tick.
+        """
+        while not self.done and self.head - self.tail < self.ringSize:
+            fits = (utime.ticks_diff(deadline, utime.ticks_us()) - STREAM_GUARD_US) // (self.tickUs + 1)
+            if fits < 1:
+                return
+            self.timedProduce(min(fits, STREAM_BATCH))
+
+    @micropython.native
+    def updateMotors(self):
+        tail = self.tail
+        if tail == self.head:
+            if self.done:
+                if not self.complete:
+                    self.complete = True
+                    metrics.recordPrecalc(self.produceUs, self.streamBytes)
+                return
+            # Ran dry: this tick has to be worked out now, late
+            self.timedProduce(1)
+            self.stalls += 1
+        self.engine.apply(self.ring[tail & self.mask])
+        self.tail = tail + 1
+
+    def peekTick(self):
+        if self.peekAt < self.tail:
+            self.peekAt = self.tail
+        if self.peekAt < self.head:
+            self.peekAt += 1
+            return self.ring[(self.peekAt - 1) & self.mask]
+        return PEEK_END if self.done else PEEK_UNKNOWN
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self.ring)
+            self.ring = None
+
 
 class MultiLineMove(PrecalculatedMove):
     """
     Executes movement along multiple sequential lines.
     To avoid memory exhaustion on the Raspberry Pi Pico, the moves are split
-    into segments if the precalculated bytearray exceeds the specified memory limit.
-    Segments are precalculated sequentially (the next segment is precalculated
-    on-the-fly when the current one finishes).
+    into segments of at most max_mem_bytes (by default sized from the free memory, see
+    bufpool.py). Segments are stored as compact step streams
+    (see stepstream.py), which take about half the space of raw ones, and a segment is filled
+    up completely (splitting a line if need be), so each one holds about twice as much motion.
+    Segments are precalculated sequentially (the next segment is precalculated on-the-fly
+    when the current one finishes).
+    With a blendTolerance (mm) the corners are rounded off instead of stopped at (see blend.py):
+    consecutive lines are joined into runs, flat waypoint tuples (x1, y1, x2, y2, x3, y3, ...),
+    and each run is timed as one path. self.lines then holds the runs; a plain line is a run
+    of two waypoints.
     """
-    def __init__(self, lines, motors, tickTimeUs=2000, max_mem_bytes=10000):
+    def __init__(self, lines, motors, tickTimeUs=2000, max_mem_bytes=None,
+                 accel=motionprofile.DEFAULT_ACCEL, jerk=motionprofile.DEFAULT_JERK, timeOptimal=True,
+                 fixedPoint=False, blendTolerance=0, pool=None, cache=None):
         # Initialize grandparent class Move directly to bypass single line initialization
         Move.__init__(self, motors, tickTimeUs=tickTimeUs)
+        self.pool = pool
+        self.cache = cache
+        self.lineSettings = (tickTimeUs, tuple(self.speedLimits), accel, jerk, timeOptimal)
+        self.line_profiles = {}         # Line index -> profile worked out by plan_segments, until played
         self.motors = motors
-        self.lines = lines
-        self.max_mem_bytes = max_mem_bytes
-        
         if not lines:
             raise ValueError("Lines array cannot be empty")
+        self.blendTolerance = blendTolerance
+        self.blended_runs = {}          # Run -> (BlendedPath, profile), worked out once per run
+        if blendTolerance > 0:
+            lines = blend.splitRuns(lines)
+        self.lines = lines
+        self.fixedPoint = fixedPoint
+        self.line_generator = None      # Generator of the line the last segment stopped in
+        self.scratch = bytearray(64)    # Ticks on their way to the encoder
+        # Without a size, segments are as big as the memory that's free allows (see bufpool.py).
+        # Every segment needs room for at least one tick besides the margin.
+        if max_mem_bytes is None:
+            max_mem_bytes = bufpool.segmentBytes(pool)
+        self.max_mem_bytes = max(max_mem_bytes, 2 * SEGMENT_MARGIN)
+        self.accel = accel
+        self.jerk = jerk
+        self.timeOptimal = timeOptimal
             
         # Start and end coordinates of the overall multi-line movement
         self.x1 = lines[0][0]
         self.y1 = lines[0][1]
-        self.x2 = lines[-1][2]
-        self.y2 = lines[-1][3]
+        self.x2 = lines[-1][-2]
+        self.y2 = lines[-1][-1]
         
-        self.segments = []
         self.moves = bytearray()
-        self.move_index = 0
+        self.length = 0                 # Bytes of self.moves used by the current segment
+        self.stream = stepstream.Decoder()
+        self.lookahead = stepstream.Decoder() # Reads the current segment ahead of self.stream, see peekTick
         self.current_segment_index = 0
+        self.next_line = 0              # Line the next segment starts in
+        self.next_tick_us = 0           # ...and the time along that line it starts at
+        self.segment_count = None       # Known once the last line has been precalculated
+        self.streamBytes = 0            # Encoded bytes of all segments so far, for metrics
         
         # Track simulated positions internally to avoid reading inverted physical positions
         self.simulated_positions = [
@@ -435,152 +917,166 @@ class MultiLineMove(PrecalculatedMove):
         self.plan_segments()
         
         # Precalculate the first segment
-        if self.segments:
-            self.precalculate_segment(0)
-        else:
-            self.complete = True
+        self.precalculate_segment(0)
 
     def get_line_size(self, line):
+        """
+        (ticks, seconds, profile) of a line or run. A line's ticks and seconds come from the line
+        cache when it has them, and its profile is then None (see lineTiming).
+        """
+        if len(line) > 4:
+            _, profile = self.blendedRun(line)
+            return int(profile.totalUs / self.tickTimeUs) + 1, profile.duration, profile
         x1, y1, x2, y2 = line
-        scaling_factor = self.getTimeScalingFactor(x1, x2, y1, y2)
-        total_time_us = scaling_factor * 1000000
-        num_ticks = int(total_time_us / self.tickTimeUs) + 1
-        return num_ticks, scaling_factor
+        num_ticks, total_us, profile = self.lineTiming(x1, x2, y1, y2)
+        return num_ticks, total_us / 1000000, profile
+
+    def blendedRun(self, run):
+        """
+        (BlendedPath, profile) of a run of three or more waypoints. The profile is time-optimal
+        like a line's, sampled every ~2 mm so that it sees the fillets. Each sample's limit has to
+        hold over the stretch either side of it, where the direction of travel may swing round
+        an arc, so every motor is held to its limit for the steepest direction found there. Through
+        an arc the speed is also held down to sqrt(accel * radius), keeping the sideways
+        (centripetal) acceleration within accel too.
+        """
+        if run in self.blended_runs:
+            return self.blended_runs[run]
+        points = [(boardToMm(run[k]), boardToMm(run[k + 1])) for k in range(0, len(run), 2)]
+        path = blend.BlendedPath(points, self.blendTolerance)
+        length = path.length
+        samples = 8 + int(length / 2)
+        window = 0.5 / samples
+        limits = []
+        for k in range(samples + 1):
+            progress = k / samples
+            x, y = path.point(progress)
+            limit = NO_LIMIT
+            radius = path.tightestBend((progress - window) * length, (progress + window) * length)
+            if radius > 0:
+                limit = math.sqrt(self.accel * radius) / length
+            directions = [path.direction(min(1.0, max(0.0, progress + window * j / 2))) for j in range(-2, 3)]
+            # Steps per unit of progress travelling along x and along y
+            alongX = stepRates(x, y, length, 0)
+            alongY = stepRates(x, y, 0, length)
+            for i in range(4):
+                rate = 0
+                for dx, dy in directions:
+                    rate = max(rate, abs(alongX[i] * dx + alongY[i] * dy))
+                if rate != 0:
+                    motorLimit = self.speedLimits[i] / rate
+                    if motorLimit < limit:
+                        limit = motorLimit
+            limits.append(limit)
+        result = (path, motionprofile.TimeOptimalProfile(length, limits, self.accel))
+        self.blended_runs[run] = result
+        return result
 
     def plan_segments(self):
-        current_segment = []
-        current_segment_size = 0
-        
+        """
+        Works out the raw size of every line, which bounds its encoded size. Where the segments
+        split depends on how well the lines compress, so that is decided in calculate_segment.
+        """
+        self.line_sizes = []
+        planned = 0
         for line in self.lines:
-            line_size, scaling_factor = self.get_line_size(line)
+            line_size, scaling_factor, profile = self.get_line_size(line)
             self.scalingFactor += scaling_factor
-            
-            # If adding this line exceeds the memory limit, and the current segment has lines,
-            # we finalize the current segment and start a new one.
-            if current_segment_size + line_size > self.max_mem_bytes and current_segment:
-                self.segments.append(current_segment)
-                current_segment = [line]
-                current_segment_size = line_size
-            else:
-                current_segment.append(line)
-                current_segment_size += line_size
-                
-        if current_segment:
-            self.segments.append(current_segment)
+            # Keep the profiles the first segment will need rather than work them out again
+            # (encoded, a segment holds about twice its size in ticks)
+            if profile is not None and len(line) == 4 and planned < 2 * self.max_mem_bytes:
+                self.line_profiles[len(self.line_sizes)] = profile
+            # Allow for the settle ticks at the end of the line
+            self.line_sizes.append(line_size + 2)
+            planned += line_size + 2
 
-    @micropython.native
     def precalculate_segment(self, segment_index):
         """
-        Precalculates all lines in the specified segment into self.moves bytearray.
+        Precalculates the next segment into self.moves and starts decoding it.
         """
-        print(f"Pre-calculating segment {segment_index + 1}/{len(self.segments)}...")
-        lines = self.segments[segment_index]
-        
-        # Compute total ticks and details for all lines in this segment
-        line_info = []
-        total_ticks = 0
-        for line in lines:
-            x1, y1, x2, y2 = line
-            scaling_factor = self.getTimeScalingFactor(x1, x2, y1, y2)
-            total_time_us = scaling_factor * 1000000
-            num_ticks = int(total_time_us / self.tickTimeUs) + 1
-            line_info.append((line, scaling_factor, total_time_us, num_ticks))
-            total_ticks += num_ticks
-            
-        # Pre-allocate bytearray
-        self.moves = bytearray(total_ticks)
-        
-        # Localize optimizations for speed
-        A, B, C = _A, _B, _C
-        sqrt = math.sqrt
-        round_func = round
-        tick_us = self.tickTimeUs
-        
-        # Start simulation from the stored virtual/simulated positions
-        simulated_pos_1 = self.simulated_positions[0]
-        simulated_pos_2 = self.simulated_positions[1]
-        simulated_pos_3 = self.simulated_positions[2]
-        simulated_pos_4 = self.simulated_positions[3]
-        
-        idx = 0
-        for line, scaling_factor, total_time_us, num_ticks in line_info:
-            x1, y1, x2, y2 = line
-            start_x = 10 + (float(x1 - 1) * 28.71428)
-            start_y = 10 + (float(y1 - 1) * 28.71428)
-            end_x = 10 + (float(x2 - 1) * 28.71428)
-            end_y = 10 + (float(y2 - 1) * 28.71428)
-            
-            dx = end_x - start_x
-            dy = end_y - start_y
-            
-            t = 0
-            while t <= total_time_us:
-                progress = t / total_time_us
-                target_x = start_x + dx * progress
-                target_y = start_y + dy * progress
-                
-                a1 = target_x + 17
-                b1 = target_y + 17
-                a2 = 238 - target_x
-                b3 = 238 - target_y
-                
-                a1Sq = a1 * a1
-                b1Sq = b1 * b1
-                a2Sq = a2 * a2
-                b3Sq = b3 * b3
-                
-                d1Sq = a1Sq + b1Sq
-                d2Sq = a2Sq + b1Sq
-                d3Sq = a1Sq + b3Sq
-                d4Sq = a2Sq + b3Sq
-                
-                s1 = round_func(A * d1Sq + B * sqrt(d1Sq) + C)
-                s2 = round_func(A * d2Sq + B * sqrt(d2Sq) + C)
-                s3 = round_func(A * d3Sq + B * sqrt(d3Sq) + C)
-                s4 = round_func(A * d4Sq + B * sqrt(d4Sq) + C)
-                
-                gap1 = s1 - simulated_pos_1
-                gap2 = s2 - simulated_pos_2
-                gap3 = s3 - simulated_pos_3
-                gap4 = s4 - simulated_pos_4
-                
-                c1 = c2 = c3 = c4 = 0
-                
-                if gap1 > 0.5: c1 = 1; simulated_pos_1 += 1
-                elif gap1 < -0.5: c1 = 2; simulated_pos_1 -= 1
-                    
-                if gap2 > 0.5: c2 = 1; simulated_pos_2 += 1
-                elif gap2 < -0.5: c2 = 2; simulated_pos_2 -= 1
-                    
-                if gap3 > 0.5: c3 = 1; simulated_pos_3 += 1
-                elif gap3 < -0.5: c3 = 2; simulated_pos_3 -= 1
-                    
-                if gap4 > 0.5: c4 = 1; simulated_pos_4 += 1
-                elif gap4 < -0.5: c4 = 2; simulated_pos_4 -= 1
-                
-                encoded_byte = c1 | (c2 << 2) | (c3 << 4) | (c4 << 6)
-                
-                if idx < total_ticks:
-                    self.moves[idx] = encoded_byte
-                else:
-                    self.moves.append(encoded_byte)
-                
-                t += tick_us
-                idx += 1
-                
-                if idx % 100 == 0:
-                    gc.collect()
-                    
-        self.simulated_positions = [
-            simulated_pos_1,
-            simulated_pos_2,
-            simulated_pos_3,
-            simulated_pos_4
-        ]
-        self.move_index = 0
+        self.moves, self.length = self.calculate_segment(segment_index, self.moves)
+        self.stream.reset(self.moves, self.length)
+        self.lookahead.reset(self.moves, self.length)
         self.temporalPosition = 0
         self.complete = False
-        print(f"Segment {segment_index + 1} pre-calculation complete.")
+
+    def calculate_segment(self, segment_index, buffer=None):
+        """
+        Precalculates the next segment, resuming at self.next_tick_us into line self.next_line
+        from self.simulated_positions, until the buffer is full or the path is done.
+        Writes into `buffer` when one is given, otherwise into a new buffer of up to max_mem_bytes
+        (a pool block when there's a pool). Returns (buffer, number of bytes written).
+        """
+        if _LOG:
+            print(f"Pre-calculating segment {segment_index + 1}...")
+        started = utime.ticks_us()
+        if not buffer:
+            buffer = self.allocate(min(self.max_mem_bytes, sum(self.line_sizes[self.next_line:]) + SEGMENT_MARGIN))
+        encoder = stepstream.Encoder(buffer)
+        push = encoder.push
+        scratch = self.scratch
+        # Stop while there's still room for the encoder to flush and for a line's settle ticks
+        limit = min(len(buffer), self.max_mem_bytes) - SEGMENT_MARGIN
+
+        # Start simulation from the stored virtual/simulated positions
+        positions = self.simulated_positions
+        line_index = self.next_line
+        t = self.next_tick_us
+        full = False
+        while line_index < len(self.lines):
+            line = self.lines[line_index]
+            if t == 0:
+                path = None
+                if len(line) > 4:
+                    # Blended run: the targets come from the path instead of a straight line
+                    path, profile = self.blendedRun(line)
+                    start_x, start_y = path.start
+                    end_x, end_y = path.end
+                else:
+                    x1, y1, x2, y2 = line
+                    profile = self.line_profiles.get(line_index)
+                    if profile is None:
+                        profile = self.lineProfile(x1, x2, y1, y2)
+                    start_x = boardToMm(x1)
+                    start_y = boardToMm(y1)
+                    end_x = boardToMm(x2)
+                    end_y = boardToMm(y2)
+                self.line_generator = self.lineGenerator(profile, start_x, start_y, end_x, end_y, positions, path)
+            # Otherwise the line was split by the previous segment: its generator carries on
+            generator = self.line_generator
+            while not generator.done:
+                room = limit - encoder.length - encoder.runLength
+                if room <= 0:
+                    full = True
+                    break
+                for i in range(generator.fill(scratch, 0, min(len(scratch), room))):
+                    push(scratch[i])
+            t = generator.t
+            positions = generator.positions()
+            if full:
+                break
+
+            # Finish each line (or run) exactly on its waypoint
+            x2, y2 = line[-2], line[-1]
+            for encoded_byte in settleTicks(boardToMm(x2), boardToMm(y2), positions, squareSteps(x2, y2)):
+                push(encoded_byte)
+            self.line_generator = None
+            if line_index in self.line_profiles:
+                del self.line_profiles[line_index]
+            line_index += 1
+            t = 0
+
+        length = encoder.finish()
+        self.next_line = line_index
+        self.next_tick_us = t
+        self.simulated_positions = positions
+        if line_index >= len(self.lines):
+            self.segment_count = segment_index + 1
+        self.streamBytes += length
+        metrics.recordPrecalc(utime.ticks_diff(utime.ticks_us(), started), encoder.ticks, True)
+        if _LOG:
+            print(f"Segment {segment_index + 1} pre-calculation complete: {encoder.ticks} ticks in {length} bytes.")
+        return encoder.buffer, length
 
     @micropython.native
     def updateMotors(self):
@@ -588,28 +1084,160 @@ class MultiLineMove(PrecalculatedMove):
         Executes playback. If the current segment buffer finishes, precalculates
         the next segment on the fly.
         """
-        if self.move_index >= len(self.moves):
-            if self.current_segment_index + 1 < len(self.segments):
+        encoded_byte = self.stream.next()
+        if encoded_byte < 0:
+            if self.next_line < len(self.lines):
+                started = utime.ticks_us()
                 self.current_segment_index += 1
                 self.precalculate_segment(self.current_segment_index)
-                if self.move_index >= len(self.moves):
-                    self.complete = True
-                    return
-            else:
+                metrics.wait.add(utime.ticks_diff(utime.ticks_us(), started))
+                encoded_byte = self.stream.next()
+            if encoded_byte < 0:
                 self.complete = True
                 return
 
-        encoded_byte = self.moves[self.move_index]
-        for i in range(4):
-            value = (encoded_byte >> (i * 2)) & 0b11
-            command = 0
-            if value == 1:
-                command = 1
-            elif value == 2:
-                command = -1
-            if command != 0:
-                self.motors[i].setDirection(command)
-                self.motors[i].step()
-        self.move_index += 1
+        self.engine.apply(encoded_byte)
+
+    def peekTick(self):
+        # The next segment is only precalculated once playback reaches it
+        tick = self.lookahead.next()
+        if tick < 0 and self.next_line < len(self.lines):
+            return PEEK_UNKNOWN
+        return tick
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self.moves)
+            self.moves = None
+
+
+class DualCoreMultiLineMove(MultiLineMove):
+    """
+    MultiLineMove that precalculates the next segment on the RP2040's second core.
+    Two buffers swap roles: while core 0 plays segment N out of one buffer, core 1 fills
+    segment N+1 into the other. Playback only waits when the producer falls behind, and
+    those waits are counted in self.stalls and self.stall_us.
+
+    Core 1 runs one thread at a time. Without a `producer` the move starts its own thread there
+    to fill the segments; with one (the server's core-1 worker, see server.py) that thread calls
+    produceNext instead, and the move wakes it whenever it hands a buffer back.
+    """
+    def __init__(self, lines, motors, tickTimeUs=2000, max_mem_bytes=None,
+                 accel=motionprofile.DEFAULT_ACCEL, jerk=motionprofile.DEFAULT_JERK, timeOptimal=True,
+                 fixedPoint=False, blendTolerance=0, pool=None, cache=None, producer=None):
+        # Segment 0 is precalculated synchronously by MultiLineMove.__init__ into self.moves
+        super().__init__(lines, motors, tickTimeUs, max_mem_bytes, accel, jerk, timeOptimal, fixedPoint,
+                         blendTolerance, pool, cache)
+        self.stalls = 0    # Number of times playback had to wait for a segment
+        self.stall_us = 0  # Total time spent waiting
+        self.slot = 0      # Buffer currently being played
+        self.buffers = [self.moves, None]
+        self.lengths = [self.length, 0]
+        self.ready = [True, False] # A ready buffer belongs to the player, otherwise to the producer
+        self.cancelled = False
+        self.threaded = False
+        self.producer = producer # Object whose wake() gets its thread to call produceNext
+        self.next_segment = 1    # Next segment to fill
+        self.look_slot = 0    # Buffer self.lookahead is reading...
+        self.look_segment = 0 # ...and the segment in it
+        if self.next_line < len(self.lines):
+            # Give the second buffer the full segment size so core 1 never has to grow it
+            self.buffers[1] = self.allocate(self.max_mem_bytes)
+            if producer is not None:
+                self.threaded = True
+                return
+            try:
+                _thread.start_new_thread(self.produce, ())
+                self.threaded = True
+            except OSError as e:
+                # Core 1 is still busy; fall back to precalculating each segment when it's needed
+                print(f"Second core unavailable, precalculating segments inline ({e})")
+
+    def fill(self, segment_index):
+        slot = segment_index % 2
+        self.buffers[slot], self.lengths[slot] = self.calculate_segment(segment_index, self.buffers[slot])
+        self.ready[slot] = True
+
+    def produceNext(self):
+        """Fills the next segment if the player has handed its buffer back; True if it did."""
+        if self.cancelled or self.next_line >= len(self.lines) or self.ready[self.next_segment % 2]:
+            return False
+        self.fill(self.next_segment)
+        self.next_segment += 1
+        return True
+
+    def produce(self):
+        """
+        Runs on core 1. Fills segments 1..N in order, each into whichever buffer
+        the player has most recently handed back.
+        """
+        while self.next_line < len(self.lines) and not self.cancelled:
+            if not self.produceNext():
+                utime.sleep_us(100)
+
+    def cancel(self):
+        """Stops the producer after the segment it is working on."""
+        self.cancelled = True
+
+    def release(self):
+        if self.pool is not None:
+            for buffer in self.buffers:
+                self.pool.release(buffer)
+            self.buffers = [None, None]
+            self.moves = None
+
+    @micropython.native
+    def updateMotors(self):
+        """
+        Executes playback out of the current buffer, swapping to the other buffer when it runs out.
+        """
+        encoded_byte = self.stream.next()
+        if encoded_byte < 0:
+            # segment_count is set before the last segment is marked ready, so it's known by now
+            if self.segment_count is not None and self.current_segment_index + 1 >= self.segment_count:
+                self.complete = True
+                if _LOG:
+                    print(f"Segment waits: {self.stalls} ({self.stall_us} us)")
+                return
+            # Hand the finished buffer back to the producer and switch to the other one
+            self.ready[self.slot] = False
+            if self.producer is not None:
+                self.producer.wake()
+            self.slot ^= 1
+            self.current_segment_index += 1
+            if not self.ready[self.slot]:
+                started = utime.ticks_us()
+                if not self.threaded:
+                    self.fill(self.current_segment_index)
+                while not self.ready[self.slot]:
+                    utime.sleep_us(50)
+                waited = utime.ticks_diff(utime.ticks_us(), started)
+                self.stalls += 1
+                self.stall_us += waited
+                metrics.wait.add(waited)
+            self.moves = self.buffers[self.slot]
+            self.stream.reset(self.moves, self.lengths[self.slot])
+            if self.look_segment != self.current_segment_index:
+                # The lookahead found the segment wasn't ready yet; catch it up
+                self.look_slot = self.slot
+                self.look_segment = self.current_segment_index
+                self.lookahead.reset(self.moves, self.lengths[self.slot])
+            encoded_byte = self.stream.next()
 
+        self.engine.apply(encoded_byte)
 
+    def peekTick(self):
+        """Runs on into the other buffer once core 1 has it ready, so the lookahead spans segments."""
+        tick = self.lookahead.next()
+        if tick >= 0:
+            return tick
+        if self.segment_count is not None and self.look_segment + 1 >= self.segment_count:
+            return PEEK_END
+        other = self.look_slot ^ 1
+        # Only one segment ahead of playback: the player hands the buffer back once it's done with it
+        if self.look_slot != self.slot or not self.ready[other]:
+            return PEEK_UNKNOWN
+        self.look_slot = other
+        self.look_segment += 1
+        self.lookahead.reset(self.buffers[other], self.lengths[other])
+        return self.lookahead.next()
@@ -0,0 +1,126 @@
+"""
+Performance Metrics
+Fixed-size counters and histograms of where the time goes on the device, cheap enough to stay
+on in production and read back over the UART with STAT (STATRESET clears them):
+
+    jitter    How late each playback tick started (us), on-time ticks in the first bucket
+    precalc   Precalculation time per tick of every precalculated line move or segment (us)
+    wait      Time playback spent waiting for a segment (us)
+    bytes     Step stream bytes per move
+    heap      Lowest gc.mem_free() seen (sampled around moves and segments, not per tick)
+
+A histogram has BUCKETS power-of-two buckets: bucket 0 holds 0, bucket b values from 2^(b-1)
+to 2^b - 1, and the last bucket everything above. Nothing here allocates once imported, apart
+from snapshot().
+
+The firmware's progress prints cost a string format on every move and segment. They are behind
+a `_LOG = const(0)` in each module, which MicroPython compiles away entirely; set it to 1 in a
+module to get its prints back while debugging.
+"""
+from array import array
+import gc
+import utime
+
+BUCKETS = 16
+
+class Histogram:
+    def __init__(self, name):
+        self.name = name
+        self.buckets = array('I', [0] * BUCKETS)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value, count=1):
+        """Records `value` (a non-negative int) `count` times."""
+        bucket = 0
+        v = value
+        while v and bucket < BUCKETS - 1:
+            v >>= 1
+            bucket += 1
+        self.buckets[bucket] += count
+        self.count += count
+        self.total += value * count
+        if value > self.max:
+            self.max = value
+
+    def reset(self):
+        for i in range(BUCKETS):
+            self.buckets[i] = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def snapshot(self):
+        """name=count/total/max/buckets, with the buckets dot-separated up to the last non-empty one."""
+        last = BUCKETS - 1
+        while last > 0 and not self.buckets[last]:
+            last -= 1
+        buckets = '.'.join(str(self.buckets[i]) for i in range(last + 1))
+        return f'{self.name}={self.count}/{self.total}/{self.max}/{buckets}'
+
+jitter = Histogram('jit')
+precalc = Histogram('pre')
+wait = Histogram('wait')
+moveBytes = Histogram('bytes')
+HISTOGRAMS = (jitter, precalc, wait, moveBytes)
+
+# Counters
+moves = 0
+ticks = 0
+overruns = 0
+resyncs = 0
+segments = 0
+underruns = 0    # Host-planned streams that ran dry and paused (see hoststream.py)
+poolMisses = 0   # Step buffers allocated because no pool block was free (see bufpool.py)
+heapLow = -1     # Lowest free heap seen, -1 until sampled (CPython has no gc.mem_free)
+startedMs = utime.ticks_ms()
+
+_memFree = getattr(gc, 'mem_free', None)
+
+def sampleHeap():
+    global heapLow
+    if _memFree is not None:
+        free = _memFree()
+        if heapLow < 0 or free < heapLow:
+            heapLow = free
+
+def recordPrecalc(elapsedUs, tickCount, segment=False):
+    """A line move or segment of `tickCount` ticks took `elapsedUs` to precalculate."""
+    global segments
+    if segment:
+        segments += 1
+    if tickCount > 0:
+        precalc.add(elapsedUs // tickCount)
+    sampleHeap()
+
+def recordPlayback(report, streamBytes=0):
+    """Adds a played move's PlaybackReport; the late ticks are already in `jitter`."""
+    global moves, ticks, overruns, resyncs
+    moves += 1
+    ticks += report.ticks
+    overruns += report.overruns
+    resyncs += report.resyncs
+    if report.ticks > report.overruns:
+        jitter.add(0, report.ticks - report.overruns)
+    if streamBytes:
+        moveBytes.add(streamBytes)
+    sampleHeap()
+
+def reset():
+    global moves, ticks, overruns, resyncs, segments, underruns, poolMisses, heapLow, startedMs
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+    moves = ticks = overruns = resyncs = segments = underruns = poolMisses = 0
+    heapLow = -1
+    startedMs = utime.ticks_ms()
+    sampleHeap()
+
+def snapshot():
+    """One compact line with every counter and histogram."""
+    up = utime.ticks_diff(utime.ticks_ms(), startedMs) // 1000
+    parts = [f'up={up}', f'moves={moves}', f'ticks={ticks}', f'over={overruns}', f'resync={resyncs}',
+             f'seg={segments}', f'under={underruns}', f'miss={poolMisses}', f'heapmin={heapLow}']
+    for histogram in HISTOGRAMS:
+        parts.append(histogram.snapshot())
+    return ','.join(parts)
@@ -0,0 +1,127 @@
+"""
+Motion Profiles
+Reparameterizes progress along a path (0 at the start, 1 at the end) over time so the end effector
+accelerates and decelerates smoothly instead of starting and stopping at full speed.
+MotionProfile cruises at one constant rate set by the worst point of the path (see
+ParametricLineMove.getTimeScalingFactor), with ramps from physical acceleration/jerk limits.
+TimeOptimalProfile instead follows each motor's speed limit along the whole path.
+"""
+import math
+
+# --- Default Limits ---
+# Along-the-path limits for the end effector, in mm/s^2 and mm/s^3.
+# DEFAULT_JERK = None gives a plain trapezoidal profile (constant acceleration ramps).
+DEFAULT_ACCEL = 500.0
+DEFAULT_JERK = 10000.0
+
+class MotionProfile:
+    """
+    Trapezoidal or S-curve velocity profile over a path of `length` mm.
+    `maxRate` is the fastest the path may be traversed in progress per second
+    (1 / the constant-speed duration that keeps every motor under its speed limit).
+    With a jerk limit the velocity follows a smoothstep curve during the ramps, which keeps
+    both acceleration (peak 1.5 v / Ta) and jerk (peak 6 v / Ta^2) bounded.
+    Short moves that can't reach maxRate get a lower peak rate and no cruise phase.
+    """
+    def __init__(self, length, maxRate, accel=DEFAULT_ACCEL, jerk=DEFAULT_JERK):
+        self.smooth = jerk is not None
+        self.savedUs = 0 # Only time-optimal profiles save time over constant cruise
+        if length <= 0 or maxRate <= 0:
+            # Nothing to move: a single tick at progress 1
+            self.rate = 0.0
+            self.rampUs = 0.0
+            self.totalUs = 0.0
+            self.rampDistance = 0.0
+            self.rateUs = 0.0
+            self.duration = 0.0
+            return
+
+        # Work in progress units (the whole path is 1), so scale the physical limits by length
+        a = accel / length
+        rate = maxRate
+        if self.smooth:
+            j = jerk / length
+            # Largest peak rate whose ramp up and ramp down together still fit in the path
+            rate = min(rate, math.sqrt(a / 1.5), (j / 6.0) ** (1.0 / 3.0))
+            rampTime = max(1.5 * rate / a, math.sqrt(6.0 * rate / j))
+        else:
+            rate = min(rate, math.sqrt(a))
+            rampTime = rate / a
+        self.rate = rate                                  # Peak rate, progress per second
+        self.rampUs = rampTime * 1000000                  # Length of each ramp in microseconds
+        self.rampDistance = rate * rampTime / 2           # Progress covered by each ramp
+        cruiseTime = max(0.0, (1.0 - 2 * self.rampDistance) / rate)
+        self.rateUs = rate / 1000000                      # Cruise rate, progress per microsecond
+        self.duration = 2 * rampTime + cruiseTime         # Seconds
+        self.totalUs = self.duration * 1000000
+
+    def ramp(self, tau):
+        # Progress covered tau (0-1) of the way through a ramp, starting from rest
+        if self.smooth:
+            return self.rampDistance * tau * tau * tau * (2.0 - tau)
+        return self.rampDistance * tau * tau
+
+    def progress(self, microSec):
+        """Progress (0-1) along the path `microSec` after the start of the move."""
+        if microSec >= self.totalUs:
+            return 1.0
+        if microSec < self.rampUs:
+            return self.ramp(microSec / self.rampUs)
+        if microSec <= self.totalUs - self.rampUs:
+            return self.rampDistance + self.rateUs * (microSec - self.rampUs)
+        return 1.0 - self.ramp((self.totalUs - microSec) / self.rampUs)
+
+class TimeOptimalProfile:
+    """
+    Variable-speed timing law that runs the path as fast as the motors allow at every point.
+    `rateLimits` holds the fastest allowed progress rate (per second) at evenly spaced points
+    from progress 0 to 1, i.e. the rate at which the most constrained motor reaches its own
+    speed limit there. A forward pass accelerates as hard as `accel` allows and a backward pass
+    makes sure the profile can still brake in time, so outside the acceleration phases at least
+    one motor is always running at its limit. Between points the acceleration is constant.
+    Jerk is not limited in this mode. `baselineUs` is the duration of the equivalent
+    constant-cruise MotionProfile, kept to report the time saved in savedUs.
+    """
+    def __init__(self, length, rateLimits, accel=DEFAULT_ACCEL, baselineUs=0):
+        n = len(rateLimits) - 1
+        ds = 1.0 / n
+        a = accel / length
+        # Conservative: a point's limit must also hold over the half-intervals either side of it
+        limits = [min(rateLimits[max(k - 1, 0):k + 2]) for k in range(n + 1)]
+
+        rates = [0.0] * (n + 1)
+        for k in range(1, n + 1):
+            rates[k] = min(limits[k], math.sqrt(rates[k - 1] * rates[k - 1] + 2 * a * ds))
+        rates[n] = 0.0
+        for k in range(n - 1, 0, -1):
+            rates[k] = min(rates[k], math.sqrt(rates[k + 1] * rates[k + 1] + 2 * a * ds))
+
+        # Tabulate the timing law in microseconds: start time, progress, rate and acceleration of each interval
+        self.nodeUs = [0.0]
+        self.nodeS = []
+        self.nodeV = []
+        self.nodeA = []
+        t = 0.0
+        for k in range(n):
+            t += 2 * ds / (rates[k] + rates[k + 1]) * 1000000
+            self.nodeUs.append(t)
+            self.nodeS.append(k * ds)
+            self.nodeV.append(rates[k] / 1000000)
+            self.nodeA.append((rates[k + 1] * rates[k + 1] - rates[k] * rates[k]) / (2 * ds) / 1000000000000)
+        self.totalUs = t
+        self.duration = t / 1000000
+        self.savedUs = int(baselineUs - t)
+        self.cursor = 0 # Interval of the previous lookup; progress() is almost always called with increasing time
+
+    def progress(self, microSec):
+        """Progress (0-1) along the path `microSec` after the start of the move."""
+        if microSec >= self.totalUs:
+            return 1.0
+        k = self.cursor
+        if microSec < self.nodeUs[k]:
+            k = 0
+        while microSec >= self.nodeUs[k + 1]:
+            k += 1
+        self.cursor = k
+        tau = microSec - self.nodeUs[k]
+        return self.nodeS[k] + tau * (self.nodeV[k] + 0.5 * self.nodeA[k] * tau)
@@ -2,7 +2,8 @@ from machine import Pin, PWM
 import micropython
 
 class Motor:
-    def __init__(self, pins, invertDirection=False, currentPosition=0, pwmDuty=65535, pwmFreq=1000):
+    def __init__(self, pins, invertDirection=False, currentPosition=0, pwmDuty=65535, pwmFreq=1000, maxSpeed=500,
+                 holdDuty=22000, boostDuty=65535):
         self.pins = []
         self.powerPattern = [
             [1, 0, 1, 0],
@@ -12,6 +13,7 @@ class Motor:
         ]
         for i in range(4):
             self.pins.append(Pin(pins[i], Pin.OUT))
+        self.pinNumbers = list(pins[:4]) # GPIO numbers of the coil pins, for the register-level step engines
             
         self.enable_pin = PWM(Pin(pins[4]))
         self.enable_pin.freq(pwmFreq)
@@ -19,14 +21,20 @@ class Motor:
         self.pins.append(self.enable_pin)
         
         self.pwm_duty = pwmDuty
-        self.position = currentPosition
+        # Duties while idle and while starting up during a move, under Board(powerPolicy=power.DYNAMIC)
+        self.holdDuty = holdDuty
+        self.boostDuty = boostDuty
+        self.position = currentPosition # Cable position in steps, regardless of invertDirection
         self.direction = 1
         self.invertDirection = invertDirection
+        self.maxSpeed = maxSpeed # Fastest this motor may be driven, in steps per second
+        # Inverted motors walk the coil pattern backwards so position keeps counting cable steps
+        self.polarity = -1 if invertDirection else 1
 
     @micropython.native
     def step(self): # step the motor
         self.position += self.direction
-        patternPosition = int((-1 * self.position + 5) % len(self.powerPattern))
+        patternPosition = int((-1 * self.polarity * self.position + 5) % len(self.powerPattern))
         pattern = self.powerPattern[patternPosition]
         for i in range(len(pattern)):
             if pattern[i] == 0:
@@ -50,11 +58,29 @@ class Motor:
     def setPowerPercent(self, percent):
         """Set the PWM duty cycle as a percentage (0-100)."""
         self.pwm_duty = int((percent / 100.0) * 65535)
+
+    def setHoldPower(self, duty_u16):
+        """Duty (0-65535) that holds the motor in place while it is idle during a dynamically powered move."""
+        self.holdDuty = duty_u16
+
+    def setBoostPower(self, duty_u16):
+        """Duty (0-65535) for the first ticks of motion after holding, see power.py."""
+        self.boostDuty = duty_u16
+
+    def levelDuty(self, level):
+        """Duty of a power.py level: 0 (HOLD), 1 (RUN) or 2 (BOOST)."""
+        if level == 0:
+            return self.holdDuty
+        if level == 2:
+            return self.boostDuty
+        return self.pwm_duty
+
+    def setDuty(self, duty_u16):
+        """Drives the h-bridge enable at `duty_u16` straight away, leaving the configured duties alone."""
+        self.enable_pin.duty_u16(duty_u16)
        
     def setDirection(self, direction): # set the direction of motion for subsequent steps
         self.direction = direction
-        if self.invertDirection:
-            self.direction = -1 * direction
 
     def __del__(self): # Destructor to disable the motor when the object is destroyed or program exits
         self.disable()
@@ -0,0 +1,139 @@
+"""
+Precompiled Move Library
+Reads single-line square-to-square moves that were compiled on the host (host/build_library.py)
+and stored in one binary file on the Pico's flash. Playing a move from the library only costs a
+flash read instead of a full PrecalculatedMove.precalculate.
+
+File layout (all little-endian):
+    Header          12 bytes   magic b'CMML', version, reserved, moveCount
+    Settings        32 bytes   what the streams were planned with (kinematics.lineSettings):
+                               tickTimeUs, 4 x the motors' speed limits (maxSpeed capped at one
+                               step per tick), accel and jerk (float32, 0 for no jerk limit),
+                               the time-optimal flag and 3 padding bytes
+    Positions     1024 bytes   64 squares x 4 motors, int32 step targets at each square centre
+    Offset table 32768 bytes   64 x 64 entries of (uint32 offset, uint32 length), indexed
+                               by fromSquare * 64 + toSquare. A length of 0 means the move
+                               isn't in the library.
+    Data                       packed step streams, 2 bits per motor per tick (same as PrecalculatedMove)
+Squares are numbered (y - 1) * 8 + (x - 1). A stream only plays the move it was built for with
+the same settings, so lookup() skips the library for any other board.
+"""
+import struct
+import utime
+import kinematics
+import metrics
+
+MAGIC = b'CMML'
+VERSION = 2
+HEADER_FORMAT = '<4sHHI'
+HEADER_SIZE = 12
+SETTINGS_FORMAT = '<I4IffB3x'
+SETTINGS_SIZE = 32
+POSITIONS_OFFSET = HEADER_SIZE + SETTINGS_SIZE
+POSITIONS_SIZE = 64 * 4 * 4
+TABLE_OFFSET = POSITIONS_OFFSET + POSITIONS_SIZE
+TABLE_ENTRY_SIZE = 8
+TABLE_SIZE = 64 * 64 * TABLE_ENTRY_SIZE
+DATA_OFFSET = TABLE_OFFSET + TABLE_SIZE
+
+def squareIndex(x, y):
+    return (y - 1) * 8 + (x - 1)
+
+def packSettings(settings):
+    """The settings block of a library for a kinematics.lineSettings tuple."""
+    tickTimeUs, speedLimits, accel, jerk, timeOptimal = settings
+    return struct.pack(SETTINGS_FORMAT, tickTimeUs, *speedLimits, accel, jerk or 0, 1 if timeOptimal else 0)
+
+class MoveLibrary:
+    """
+    Lookup front-end for a library file. Only the header, the settings and the 1 KB position
+    table are kept in RAM; offset table entries are read from flash on demand.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        magic, version, _, self.moveCount = struct.unpack(HEADER_FORMAT, self.file.read(HEADER_SIZE))
+        if magic != MAGIC or version != VERSION:
+            self.file.close()
+            raise ValueError(f'{path} is not a version {VERSION} move library')
+        self.settings = self.file.read(SETTINGS_SIZE)
+        self.tickTimeUs = struct.unpack_from('<I', self.settings)[0]
+        self.matched = None # Last settings tuple that matched, so the block isn't packed for every move
+        positions = self.file.read(POSITIONS_SIZE)
+        self.positions = struct.unpack('<256i', positions)
+        self.entry = bytearray(TABLE_ENTRY_SIZE) # Reused for every table lookup
+
+    def squarePositions(self, x, y):
+        """The 4 motor step targets the library assumes at square (x, y)."""
+        i = squareIndex(x, y) * 4
+        return self.positions[i:i + 4]
+
+    def accepts(self, settings):
+        """True if the library was built with `settings` (a kinematics.lineSettings tuple)."""
+        if settings == self.matched:
+            return True
+        if packSettings(settings) != self.settings:
+            return False
+        self.matched = settings
+        return True
+
+    def lookup(self, x1, y1, x2, y2, motors, settings):
+        """
+        Returns (offset, length) of the stream for the move (x1, y1) -> (x2, y2), or None if the
+        move has to be precalculated live: it isn't in the library, the library was built with
+        other `settings` (a kinematics.lineSettings tuple: the tick, the speed limits, accel,
+        jerk or the time-optimal flag differ), or the motors aren't sitting on the canonical
+        positions of the start square.
+        """
+        if not self.accepts(settings):
+            return None
+        start = squareIndex(x1, y1) * 4
+        for i in range(4):
+            if motors[i].position != self.positions[start + i]:
+                return None
+        self.file.seek(TABLE_OFFSET + (squareIndex(x1, y1) * 64 + squareIndex(x2, y2)) * TABLE_ENTRY_SIZE)
+        self.file.readinto(self.entry)
+        offset, length = struct.unpack('<II', self.entry)
+        if length == 0:
+            return None
+        return offset, length
+
+    def readInto(self, offset, buffer):
+        self.file.seek(offset)
+        self.file.readinto(buffer)
+
+    def close(self):
+        self.file.close()
+
+class LibraryMove(kinematics.PrecalculatedMove):
+    """
+    A PrecalculatedMove whose step stream is streamed from the move library
+    instead of being computed. The velocity profile went into the stream when the library was
+    built, so none is worked out here.
+    """
+    def __init__(self, library, entry, x1, x2, y1, y2, motors, tickTimeUs=2000, pool=None):
+        # Initialize the base class Move directly to bypass the line's profile
+        kinematics.Move.__init__(self, motors, tickTimeUs=tickTimeUs)
+        self.motors = motors
+        self.x1 = x1
+        self.x2 = x2
+        self.y1 = y1
+        self.y2 = y2
+        self.library = library
+        self.offset, self.entryLength = entry
+        self.pool = pool
+        self.moves = bytearray()
+        self.length = 0
+        self.move_index = 0
+        self.peek_index = 0
+        started = utime.ticks_us()
+        self.precalculate()
+        self.streamBytes = self.length
+        metrics.recordPrecalc(utime.ticks_diff(utime.ticks_us(), started), self.length)
+
+    def precalculate(self):
+        # A pool block is longer than the stream, so only the stream's bytes are read into it
+        self.length = self.entryLength
+        self.moves = self.allocate(self.length)
+        self.library.readInto(self.offset, memoryview(self.moves)[:self.length])
+        self.temporalPosition = 0
+        self.complete = False
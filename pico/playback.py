@@ -0,0 +1,194 @@
+"""
+Step Playback Engines
+Drive a move's updateMotors() once per tick. The original loop (SLEEP) sleeps a full tick after
+every update, so each tick lasts tickTimeUs plus however long the decode, the GPIO writes and any
+GC took, and moves run slower than planned. DEADLINE and TIMER fire on an absolute schedule
+instead, so that time is absorbed rather than accumulated. playAsync is the DEADLINE schedule
+as a uasyncio coroutine, for when other tasks have to keep running during a move.
+DEADLINE and playAsync also hand the slack before each deadline to moves that work their ticks
+out while they play (Move.fillSlack, see kinematics.StreamingMove).
+"""
+import utime
+from machine import Timer
+import metrics
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+SLEEP = 'sleep'        # updateMotors() then sleep_us(tickTimeUs), as before
+DEADLINE = 'deadline'  # Busy-free ticks_us deadline scheduler
+TIMER = 'timer'        # machine.Timer periodic callback
+ASYNC = 'async'        # DEADLINE, yielding to other uasyncio tasks in the slack of each tick
+
+# playAsync yields to the other tasks when at least 1/YIELD_SHARE of the tick is left, whatever
+# the tick (ticktune.calibrate reserves that share of it), and the tasks have to hand back control
+# in time for the next tick. Should the slack stay below that, it still yields every YIELD_TICKS
+# ticks, so a POS is answered and the next move planned during any move.
+YIELD_SHARE = 4
+YIELD_TICKS = 32
+
+class PlaybackReport:
+    """
+    Timing of one played move. A tick counts as an overrun when it started after its
+    deadline. Being more than a whole tick behind (e.g. waiting for a segment) resyncs
+    the schedule instead of bursting steps out back to back to catch up.
+    """
+    def __init__(self, mode, tickTimeUs):
+        self.mode = mode
+        self.tickTimeUs = tickTimeUs
+        self.ticks = 0
+        self.overruns = 0
+        self.resyncs = 0
+        self.maxLateUs = 0
+        self.startUs = 0
+        self.endUs = 0
+
+    def late(self, lateUs):
+        metrics.jitter.add(lateUs)
+        self.overruns += 1
+        if lateUs > self.maxLateUs:
+            self.maxLateUs = lateUs
+
+    @property
+    def plannedUs(self):
+        return self.ticks * self.tickTimeUs
+
+    @property
+    def actualUs(self):
+        return utime.ticks_diff(self.endUs, self.startUs)
+
+    def __repr__(self):
+        return (f'Playback({self.mode}: {self.ticks} ticks, planned {self.plannedUs} us, '
+                f'actual {self.actualUs} us, {self.overruns} overruns, max late {self.maxLateUs} us, '
+                f'{self.resyncs} resyncs)')
+
+def play(move, mode=DEADLINE):
+    """Plays `move` to completion with the selected engine and returns its PlaybackReport."""
+    report = PlaybackReport(mode, move.tickTimeUs)
+    report.startUs = utime.ticks_us()
+    if mode == SLEEP:
+        playSleep(move, report)
+    elif mode == DEADLINE:
+        playDeadline(move, report)
+    elif mode == TIMER:
+        playTimer(move, report)
+    else:
+        raise ValueError(f'Unknown playback mode {mode}')
+    report.endUs = utime.ticks_us()
+    return report
+
+def playSleep(move, report):
+    while not move.complete:
+        move.updateMotors()
+        if not move.complete:
+            report.ticks += 1
+        utime.sleep_us(move.tickTimeUs)
+
+def playDeadline(move, report):
+    tickUs = move.tickTimeUs
+    fill = move.fillSlack
+    deadline = report.startUs
+    while True:
+        move.updateMotors()
+        if move.complete:
+            return
+        report.ticks += 1
+        # The next tick is due one tick after the previous deadline, not after now
+        deadline = utime.ticks_add(deadline, tickUs)
+        if fill is not None:
+            fill(deadline)
+        remaining = utime.ticks_diff(deadline, utime.ticks_us())
+        if remaining > 0:
+            utime.sleep_us(remaining)
+        elif -remaining > tickUs:
+            report.late(-remaining)
+            report.resyncs += 1
+            deadline = utime.ticks_us()
+        elif remaining < 0:
+            # Slightly late: run the next tick straight away and we're back on schedule
+            report.late(-remaining)
+
+async def playAsync(move):
+    """
+    Plays `move` like DEADLINE and returns its PlaybackReport, but passes control to the other
+    uasyncio tasks once per tick while there's time to spare before the next deadline.
+    The tasks must be quick (a UART poll or a flag check) and never block for long.
+    """
+    report = PlaybackReport(ASYNC, move.tickTimeUs)
+    report.startUs = utime.ticks_us()
+    tickUs = move.tickTimeUs
+    yieldUs = tickUs // YIELD_SHARE
+    fill = move.fillSlack
+    deadline = report.startUs
+    unyielded = 0 # Ticks since the last yield
+    while True:
+        move.updateMotors()
+        if move.complete:
+            break
+        report.ticks += 1
+        deadline = utime.ticks_add(deadline, tickUs)
+        unyielded += 1
+        if unyielded >= YIELD_TICKS or utime.ticks_diff(deadline, utime.ticks_us()) > yieldUs:
+            unyielded = 0
+            await asyncio.sleep(0)
+        if fill is not None:
+            fill(deadline)
+        remaining = utime.ticks_diff(deadline, utime.ticks_us())
+        if remaining > 0:
+            utime.sleep_us(remaining)
+        elif -remaining > tickUs:
+            report.late(-remaining)
+            report.resyncs += 1
+            deadline = utime.ticks_us()
+        elif remaining < 0:
+            report.late(-remaining)
+    report.endUs = utime.ticks_us()
+    return report
+
+class TimerPlayer:
+    """
+    Runs updateMotors() from a periodic machine.Timer callback. The RP2040 reschedules periodic
+    timers from their previous alarm, so the schedule doesn't drift. A late callback plays
+    one extra tick to catch up.
+    """
+    def __init__(self, move, report):
+        self.move = move
+        self.report = report
+        self.timer = Timer()
+
+    def start(self):
+        self.move.updateMotors()
+        if self.move.complete:
+            return
+        self.report.ticks = 1
+        self.timer.init(mode=Timer.PERIODIC, freq=1000000 / self.move.tickTimeUs, callback=self.tick)
+
+    def tick(self, timer):
+        report = self.report
+        tickUs = report.tickTimeUs
+        # Ticks that should have been played by now, counting tick 0 at startUs
+        due = utime.ticks_diff(utime.ticks_us(), report.startUs) // tickUs + 1
+        behind = due - report.ticks
+        if behind > 2:
+            report.late((behind - 1) * tickUs)
+            report.resyncs += 1
+            behind = 1
+            report.startUs = utime.ticks_add(report.startUs, (due - 1 - report.ticks) * tickUs)
+        elif behind == 2:
+            report.late(tickUs)
+        for _ in range(behind):
+            self.move.updateMotors()
+            if self.move.complete:
+                self.timer.deinit()
+                return
+            report.ticks += 1
+
+def playTimer(move, report):
+    startUs = report.startUs
+    player = TimerPlayer(move, report)
+    player.start()
+    while not move.complete:
+        utime.sleep_ms(1)
+    # Resyncs shift startUs to keep the catch-up maths simple; report the real start
+    report.startUs = startUs
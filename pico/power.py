@@ -0,0 +1,177 @@
+"""
+Motor Power Management
+Board used to drive every motor at its full pwm_duty for the whole move, and only cut the
+power once the move was over, so a motor that takes no steps for seconds still heats up as if
+it were running. With Board(powerPolicy=power.DYNAMIC) a PowerManager sits between the move and
+the step engine and gives each motor one of three duties (set per motor, see Motor):
+
+    HOLD    Motor.holdDuty, while the motor is idle: enough current to hold its position
+    RUN     Motor.pwm_duty, from LEAD_TICKS before a step until TRAIL_TICKS after one
+    BOOST   Motor.boostDuty, for the first BOOST_TICKS of motion after holding, where the
+            velocity profile accelerates from rest
+
+The manager looks LEAD_TICKS ahead in the packed step stream through the move's peekTick(), so
+the duty is already up when a motor starts. Where the next ticks aren't known yet (a segment that
+is still being precalculated, or ticks the host hasn't sent) every motor is treated as about to
+move. The duty only changes on a level change, so an active tick costs a few integer compares.
+
+Every move gets a PowerReport: the average duty of each motor and the thermal headroom, i.e.
+how many times more winding heat (duty squared) the hottest motor could take compared with being
+fully on for the whole move.
+"""
+import micropython
+import kinematics
+import stepstream
+
+FULL = 'full'          # Every motor at pwm_duty for the whole move, as before
+DYNAMIC = 'dynamic'    # Hold, run and boost duties from the step stream lookahead
+
+HOLD = 0
+RUN = 1
+BOOST = 2
+
+# Raise a motor's duty this many ticks before its next step...
+LEAD_TICKS = 8
+# ...keep it up this long after its last step...
+TRAIL_TICKS = 16
+# ...and boost it for this long when it starts from holding
+BOOST_TICKS = 50
+
+FULL_DUTY = 65535
+
+class PowerReport:
+    """
+    Duties of the motors over one move. dutyTicks and heatTicks sum each motor's duty, and its
+    duty squared (in 1/255 steps, to keep the sums small ints), over the ticks of the move.
+    """
+    def __init__(self, count=4):
+        self.ticks = 0
+        self.changes = 0 # Duty writes during the move
+        self.dutyTicks = [0] * count
+        self.heatTicks = [0] * count
+
+    def add(self, motor, duty, ticks):
+        self.dutyTicks[motor] += duty * ticks
+        high = duty >> 8
+        self.heatTicks[motor] += high * high * ticks
+
+    @property
+    def averageDuty(self):
+        """Average duty_u16 of every motor over the move."""
+        return [total // self.ticks if self.ticks else 0 for total in self.dutyTicks]
+
+    @property
+    def heat(self):
+        """Winding heat of every motor as a fraction of being fully on for the whole move."""
+        return [total / (self.ticks * 255 * 255) if self.ticks else 0 for total in self.heatTicks]
+
+    @property
+    def headroom(self):
+        hottest = max(self.heat)
+        return 1 / hottest if hottest > 0 else kinematics.NO_LIMIT
+
+    def __repr__(self):
+        duty = '/'.join(f'{100 * d / FULL_DUTY:.0f}' for d in self.averageDuty)
+        return f'Power({self.ticks} ticks, duty {duty} %, {self.changes} changes, headroom {self.headroom:.2f}x)'
+
+def fullReport(motors, ticks):
+    """PowerReport of a move played with every motor at its pwm_duty (the FULL policy)."""
+    report = PowerReport(len(motors))
+    report.ticks = ticks
+    for i, motor in enumerate(motors):
+        report.add(i, motor.pwm_duty, ticks)
+    return report
+
+class PowerManager:
+    """
+    Wraps the board's step engine for one move at a time (begin/finish) and sets the motors'
+    duties as the ticks go by. `tick` counts the ticks applied so far, `ahead` the ticks peeked,
+    and last[i] is the index of motor i's latest step seen, played or still ahead.
+    """
+    def __init__(self, motors):
+        self.motors = motors
+        self.engine = None
+        self.move = None
+        self.tick = 0
+        self.ahead = 0
+        self.last = [0] * 4
+        self.level = [HOLD] * 4
+        self.duty = [0] * 4
+        self.since = [0] * 4     # Tick at which each motor's current duty was set
+        self.boostUntil = [0] * 4
+        self.report = PowerReport()
+
+    def begin(self, move, engine):
+        """Takes over `move`'s ticks from `engine` and powers the motors up for its first ticks."""
+        self.engine = engine
+        self.move = move
+        self.tick = 0
+        self.ahead = 0
+        self.report = PowerReport(len(self.motors))
+        for i in range(4):
+            self.last[i] = -TRAIL_TICKS - 1
+            self.level[i] = HOLD
+            self.since[i] = 0
+            self.duty[i] = self.motors[i].holdDuty
+            self.motors[i].setDuty(self.duty[i])
+        self.update()
+
+    @micropython.native
+    def apply(self, tick):
+        """Stands in for the step engine's apply() during the move (see Board.beginMove)."""
+        self.engine.apply(tick)
+        self.tick += 1
+        self.update()
+
+    @micropython.native
+    def update(self):
+        """Peeks up to LEAD_TICKS ahead and moves every motor to the level the window calls for."""
+        move = self.move
+        last = self.last
+        moving = stepstream.MOVING
+        cur = self.tick
+        horizon = cur + LEAD_TICKS
+        unknown = False
+        while self.ahead <= horizon:
+            tick = move.peekTick()
+            if tick < 0:
+                unknown = tick == kinematics.PEEK_UNKNOWN
+                break
+            mask = moving[tick]
+            if mask:
+                for i in range(4):
+                    if (mask >> i) & 1:
+                        last[i] = self.ahead
+            self.ahead += 1
+        idle = cur - TRAIL_TICKS
+        for i in range(4):
+            level = self.level[i]
+            if unknown or last[i] >= idle:
+                if level == HOLD:
+                    self.boostUntil[i] = horizon + BOOST_TICKS
+                    self.setLevel(i, BOOST)
+                elif level == BOOST and cur >= self.boostUntil[i]:
+                    self.setLevel(i, RUN)
+            elif level != HOLD:
+                self.setLevel(i, HOLD)
+
+    def setLevel(self, i, level):
+        motor = self.motors[i]
+        duty = motor.levelDuty(level)
+        self.level[i] = level
+        if duty != self.duty[i]:
+            self.report.add(i, self.duty[i], self.tick - self.since[i])
+            self.since[i] = self.tick
+            self.duty[i] = duty
+            self.report.changes += 1
+            motor.setDuty(duty)
+
+    def finish(self):
+        """Releases the move and returns its PowerReport. The board switches the motors off."""
+        report = self.report
+        report.ticks = self.tick
+        for i in range(4):
+            report.add(i, self.duty[i], self.tick - self.since[i])
+            self.since[i] = self.tick
+        self.move = None
+        return report
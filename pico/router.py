@@ -0,0 +1,221 @@
+"""
+Piece Router
+Finds the fastest path for a piece from one square to another without running into the
+other pieces. A piece may travel over free squares, and along the lanes between squares:
+the square edges and corners, which are half a square away from every neighbouring piece.
+
+Points are kept in half-square units (2-16 on each axis, square centres on even values) so that
+edge and corner points are integers too. The search graph links every point to every point it
+can reach in a straight run along a row, column or diagonal without coming closer than
+CLEARANCE to an occupied square centre, plus the direct line from start to destination (a
+knight move, say) when that is clear. Every line of a route is a separate line of a
+MultiLineMove, with its own stop and start, so each one costs the full duration of the
+velocity profile the move will really use (ParametricLineMove.lineProfile: time-optimal, or
+constant cruise at the getTimeScalingFactor rate). Fewer, longer lines therefore win over
+zig-zagging, just like on the real machine. A* finds the route with the minimum total duration.
+"""
+import math
+import heapq
+import kinematics
+import kincache
+import motionprofile
+
+# Closest a moving piece may pass to the centre of an occupied square, in squares. Half a
+# square lets pieces slide along the square edges between two rows or columns of pieces.
+CLEARANCE = 0.5
+
+# Directions of the straight runs, in half squares
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+# Cost of a point that hasn't been reached (microseconds, still a small int)
+NO_ROUTE = 1 << 29
+
+def squareIndex(x, y):
+    return (y - 1) * 8 + (x - 1)
+
+def boardCoordinate(h):
+    """Board coordinate of a half-square value: an int on square centres, else x.5."""
+    return h // 2 if h % 2 == 0 else h / 2
+
+class Router:
+    """
+    Shortest-time routes for one machine. Line durations depend only on the tick time, the
+    motors' speed limits and the profile settings, so they are kept across searches in a
+    kincache.LineCache, which the board shares with the moves that play the routes. Routes are
+    cached per occupancy, and the route cache starts over whenever the occupancy changes.
+    """
+    # Same velocity profiles and line timings as the moves that will play the route
+    lineProfile = kinematics.ParametricLineMove.lineProfile
+    getTimeScalingFactor = kinematics.ParametricLineMove.getTimeScalingFactor
+    lineTiming = kinematics.ParametricLineMove.lineTiming
+    recordTiming = kinematics.ParametricLineMove.recordTiming
+
+    def __init__(self, motors, accel=motionprofile.DEFAULT_ACCEL, jerk=motionprofile.DEFAULT_JERK, timeOptimal=True,
+                 tickTimeUs=2000, cache=None):
+        self.motors = motors
+        self.accel = accel
+        self.jerk = jerk
+        self.timeOptimal = timeOptimal
+        self.cache = cache if cache is not None else kincache.LineCache()
+        self.pointSteps = {}    # Point (see search) -> step targets; geometry only, so never cleared
+        self.evaluated = 0      # Line profiles the last search needed
+        self.lineSettings = None
+        self.setTickTime(tickTimeUs)
+
+    def setTickTime(self, tickTimeUs):
+        self.tickTimeUs = tickTimeUs
+        self.updateSettings()
+
+    def updateSettings(self):
+        """
+        Reads the motors' speed limits, capped at one step per tick like the moves do, so that
+        lines are timed with the same settings as the moves, which read them when they're made.
+        Forgets every route if the settings changed. Every search starts with it.
+        """
+        tickTimeUs = self.tickTimeUs
+        self.speedLimits = [min(motor.maxSpeed, 1000000 // tickTimeUs) for motor in self.motors]
+        settings = (tickTimeUs, tuple(self.speedLimits), self.accel, self.jerk, self.timeOptimal)
+        if settings != self.lineSettings:
+            # Timings for other settings are no use any more: the cache starts over with the next line
+            self.lineSettings = settings
+            self.routes = {}        # (x1, y1, x2, y2) -> waypoints, for self.occupancy
+            self.occupancy = None
+
+    def lineUs(self, hx1, hy1, hx2, hy2):
+        """
+        Microseconds a line between two points (half squares) takes, from rest to rest.
+        Times are whole microseconds throughout the search: small ints don't allocate on the Pico.
+        """
+        _, us, profile = self.lineTiming(boardCoordinate(hx1), boardCoordinate(hx2),
+                                         boardCoordinate(hy1), boardCoordinate(hy2))
+        if profile is not None:
+            self.evaluated += 1
+        return us
+
+    def lowerBoundUs(self, steps1, steps2, length):
+        """
+        Microseconds any path between two points must take: every motor has to cover its change
+        in steps without exceeding its speed limit, and a move from rest to rest can't beat
+        accelerating flat out for the first half and braking for the second.
+        `length` is the straight-line distance in half squares.
+        """
+        bound = 2 * math.sqrt(length * 14.35714 / self.accel)
+        for i in range(4):
+            motorTime = abs(steps2[i] - steps1[i]) / self.speedLimits[i]
+            if motorTime > bound:
+                bound = motorTime
+        return int(bound * 1000000)
+
+    def blocked(self, hx1, hy1, hx2, hy2, occupancy, ignore):
+        """
+        True if the segment between two points (half squares) passes closer than CLEARANCE to
+        an occupied square centre, apart from square `ignore` (the moving piece's own square).
+        """
+        x1, y1, x2, y2 = hx1 / 2, hy1 / 2, hx2 / 2, hy2 / 2
+        dx = x2 - x1
+        dy = y2 - y1
+        lengthSq = dx * dx + dy * dy
+        limit = CLEARANCE * CLEARANCE - 1e-9
+        # Only squares within CLEARANCE of the segment's bounding box can be too close
+        for cy in range(max(1, math.ceil(min(y1, y2) - CLEARANCE)), min(8, math.floor(max(y1, y2) + CLEARANCE)) + 1):
+            for cx in range(max(1, math.ceil(min(x1, x2) - CLEARANCE)), min(8, math.floor(max(x1, x2) + CLEARANCE)) + 1):
+                square = squareIndex(cx, cy)
+                if not occupancy[square] or square == ignore:
+                    continue
+                # Distance from the centre to the closest point of the segment
+                t = 0.0
+                if lengthSq > 0:
+                    t = min(1.0, max(0.0, ((cx - x1) * dx + (cy - y1) * dy) / lengthSq))
+                px = x1 + dx * t - cx
+                py = y1 + dy * t - cy
+                if px * px + py * py < limit:
+                    return True
+        return False
+
+    def route(self, x1, y1, x2, y2, occupancy):
+        """
+        Waypoints (board coordinates, destination last, start not included) of the fastest
+        route for the piece on square (x1, y1) to square (x2, y2), or None if there is none.
+        `occupancy` holds 64 bytes, non-zero where a piece stands, indexed by squareIndex.
+        The destination is treated as free.
+        """
+        self.updateSettings()
+        if occupancy != self.occupancy:
+            self.routes = {}
+            self.occupancy = bytes(occupancy)
+        key = (x1, y1, x2, y2)
+        if key not in self.routes:
+            self.evaluated = 0
+            self.routes[key] = self.search(x1 * 2, y1 * 2, x2 * 2, y2 * 2, occupancy)
+        return self.routes[key]
+
+    def search(self, hx1, hy1, hx2, hy2, occupancy):
+        """
+        A* over the points, with lowerBoundUs as the estimate. A line's profile is only worked
+        out once the line is the most promising thing left to look at: until then it waits in the
+        queue with its lower bound as its cost, which skips most of the profiles. To keep the
+        queue small in RAM a point is (hx << 5) | hy, and queue entries are the small ints
+        (estimated total, cost so far, point, (point it was reached from << 1) | cost is exact).
+        """
+        # The destination is free by definition, and the start square is the moving piece's own
+        ignore = squareIndex(hx1 // 2, hy1 // 2)
+        occupancy = bytearray(occupancy)
+        occupancy[squareIndex(hx2 // 2, hy2 // 2)] = 0
+
+        steps = self.pointSteps
+        def stepsOf(point):
+            if point not in steps:
+                steps[point] = kinematics.squareSteps(boardCoordinate(point >> 5), boardCoordinate(point & 31))
+            return steps[point]
+        def bound(a, b):
+            dx = (b >> 5) - (a >> 5)
+            dy = (b & 31) - (a & 31)
+            return self.lowerBoundUs(stepsOf(a), stepsOf(b), math.sqrt(dx * dx + dy * dy))
+
+        start = (hx1 << 5) | hy1
+        goal = (hx2 << 5) | hy2
+        known = {start: 0}      # Cheapest exact cost found so far for each point
+        previous = {}
+        done = set()
+        queue = [(bound(start, goal), 0, start, 1)]
+        while queue:
+            _, cost, point, link = heapq.heappop(queue)
+            if point in done:
+                continue
+            parent = link >> 1
+            if not link & 1:
+                # Swap the line's lower bound for its real duration, and queue it again if that
+                # still beats every other way found to this point
+                cost += self.lineUs(parent >> 5, parent & 31, point >> 5, point & 31) - bound(parent, point)
+                if cost < known.get(point, NO_ROUTE):
+                    known[point] = cost
+                    heapq.heappush(queue, (cost + bound(point, goal), cost, point, link | 1))
+                continue
+            done.add(point)
+            if point != start:
+                previous[point] = parent
+            if point == goal:
+                waypoints = []
+                while point != start:
+                    waypoints.append((boardCoordinate(point >> 5), boardCoordinate(point & 31)))
+                    point = previous[point]
+                waypoints.reverse()
+                return waypoints
+            hx = point >> 5
+            hy = point & 31
+            reachable = []
+            if point == start and not self.blocked(hx1, hy1, hx2, hy2, occupancy, ignore):
+                reachable.append(goal)
+            for sx, sy in DIRECTIONS:
+                nx, ny = hx + sx, hy + sy
+                while 2 <= nx <= 16 and 2 <= ny <= 16 and not self.blocked(nx - sx, ny - sy, nx, ny, occupancy, ignore):
+                    reachable.append((nx << 5) | ny)
+                    nx += sx
+                    ny += sy
+            for nextPoint in reachable:
+                if nextPoint in done:
+                    continue
+                nextCost = cost + bound(point, nextPoint)
+                if nextCost < known.get(nextPoint, NO_ROUTE):
+                    heapq.heappush(queue, (nextCost + bound(nextPoint, goal), nextCost, nextPoint, point << 1))
+        return None
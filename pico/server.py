@@ -0,0 +1,457 @@
+"""
+Command Server
+Serves the UART protocol (see README) with three uasyncio tasks, so commands keep being read
+and answered while a move plays, and the next move is ready the moment the current one ends:
+
+    reader   Polls the UART, answers POS straight away and parses everything else into a
+             bounded queue (ACK for MOV and OCC as soon as they're queued)
+    planner  Takes commands off the queue in order and has the next move precalculated from
+             where the queued moves will leave the board, on the second core
+    player   Plays the precalculated moves back to back (playback.playAsync), then sends DONE
+
+Commands are planned and played in the order they arrive, so each command's ACK still comes
+before its DONE and the DONEs come in command order. An RTE or CHS is only ACKed (or NAKed) once
+its routes have been planned. While the queue is full the reader leaves further commands in the
+UART buffer, so a host streaming moves just sees the replies come more slowly.
+
+The second core runs one thread at a time, so the server keeps one there for as long as it
+serves (secondCore) and gives it all the core-1 work: it fills the next segment of each queued
+DualCoreMultiLineMove, the playing one first, and plans the commands the planner hands it in
+between. The moves wake it when they hand a buffer back. If it can't be started, commands are
+planned on the first core while nothing plays, and the moves fill their own segments.
+
+Binary frames (see frame.py) are accepted on the same UART. Their commands go through the same
+queue, and each one is answered with binary replies carrying its tag instead of text.
+
+A STREAM frame queues a move planned on the host (see hoststream.py). Once it is planned (its
+starting motor positions checked), its DATA and END frames skip the queue and go straight into
+the move's ring buffer, and the reader hands out credit as the player drains it. There is one
+ring, so a STREAM waits at the head of the queue until the streamed move before it has played.
+"""
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+import _thread
+import kinematics
+import playback
+import frame
+import hoststream
+import chessmove
+import metrics
+from micropython import const
+
+# Progress prints (1: on), compiled out when 0 (see metrics.py)
+_LOG = const(0)
+
+# Commands (queued and planned) the server holds before it stops reading the UART
+QUEUE_SIZE = 8
+
+# Moves precalculated ahead of the one playing; each one holds its step buffers in RAM
+PLAN_AHEAD = 1
+
+# How often the idle tasks look for work (seconds)
+POLL_S = 0.005
+
+def parseSquares(params):
+    """[(x, y), ...] from 'x,y,x,y,...' with every coordinate 1-8, or None if malformed."""
+    parts = [part.strip() for part in params.split(',')]
+    if len(parts) < 2 or len(parts) % 2:
+        return None
+    squares = []
+    for i in range(0, len(parts), 2):
+        if not (parts[i].isdigit() and parts[i + 1].isdigit()):
+            return None
+        x = int(parts[i])
+        y = int(parts[i + 1])
+        if not (1 <= x <= 8 and 1 <= y <= 8):
+            return None
+        squares.append((x, y))
+    return squares
+
+def parseCommand(message):
+    """
+    Splits a cleaned-up command line into (command, argument, reply text), or returns
+    (None, None, NAK reply) if it isn't valid:
+        ('POS', None, '')
+        ('STAT', None, '') and ('STATRESET', None, '')
+        ('OCC', mask, 'hex digits')
+        ('RTE', (x, y), 'x,y')
+        ('MOV', [(x, y), ...], 'x,y,...')
+        ('CHS', (x1, y1, x2, y2, kind), 'x1,y1,x2,y2[,K]') with K a letter of chessmove.KIND_CODES
+    """
+    if message == "POS" or message == "STAT" or message == "STATRESET":
+        return message, None, ''
+    for command in ('OCC', 'RTE', 'MOV', 'CHS'):
+        if message.startswith(command + '(') and message.endswith(')'):
+            params = message[4:-1]
+            break
+    else:
+        print(f"Ignored invalid command format: {message}")
+        return None, None, "NAK"
+    if command == 'OCC':
+        # Occupied squares as 16 hex digits, bit (y-1)*8 + (x-1) set where a piece stands
+        params = params.strip()
+        try:
+            mask = int(params, 16)
+        except ValueError:
+            mask = -1
+        if len(params) == 16 and mask >= 0:
+            return 'OCC', mask, params
+        return None, None, f"NAK({params})"
+    if command == 'CHS':
+        # Two squares, then optionally the letter of the kind of chess move
+        parts = params.split(',')
+        code = parts[-1].strip()
+        kind = chessmove.KIND_CODES.get(code)
+        squares = parseSquares(params if kind is None else ','.join(parts[:-1]))
+        if squares is None or len(squares) != 2:
+            return None, None, f"NAK({params})"
+        (x1, y1), (x2, y2) = squares
+        if kind is None:
+            return 'CHS', (x1, y1, x2, y2, chessmove.MOVE), f"{x1},{y1},{x2},{y2}"
+        return 'CHS', (x1, y1, x2, y2, kind), f"{x1},{y1},{x2},{y2},{code}"
+    squares = parseSquares(params)
+    if squares is None or (command == 'RTE' and len(squares) != 1):
+        return None, None, f"NAK({params})"
+    text = ",".join(f"{x},{y}" for x, y in squares)
+    if command == 'RTE':
+        return 'RTE', squares[0], text
+    return 'MOV', squares, text
+
+class CommandServer:
+    """
+    Commands carry a label that says how to answer them: the reply text of a text command,
+    or the tag (an int) of a binary one.
+    """
+    def __init__(self, board, uart):
+        self.board = board
+        self.uart = uart
+        self.parser = frame.StreamParser()
+        self.replyFrame = bytearray(6)   # Preallocated binary replies
+        self.positionFrame = bytearray(7)
+        self.creditFrame = bytearray(8)
+        self.commands = []   # Parsed commands waiting for the planner: (command, argument, label)
+        self.done = []       # Labels of board.queued, in the same order
+        self.playing = False
+        self.planning = False
+        self.planned = None  # Result of the last plan: True, False (no route) or the exception
+        self.job = None      # (command, argument) for the second core to plan
+        self.work = _thread.allocate_lock() # Held while the second core has nothing to do
+        self.work.acquire()
+        self.worker = False  # The second core's thread is running
+        self.stopping = False
+        self.ring = hoststream.RingBuffer()
+        self.stream = None   # StreamedMove using the ring, until it has played, and its tag
+        self.streamTag = -1
+        self.granted = 0     # Ticks of credit given for it so far
+
+    def reply(self, text):
+        self.uart.write(f"{text}\r\n")
+
+    def send(self, kind, label):
+        """Sends ACK, DONE or NAK for the command with `label`."""
+        if isinstance(label, str):
+            self.reply(f"{kind}({label})")
+        else:
+            code = frame.ACK if kind == "ACK" else frame.DONE if kind == "DONE" else frame.NAK
+            self.uart.write(frame.writeReply(self.replyFrame, code, label))
+
+    def sendPosition(self, label):
+        board = self.board
+        if isinstance(label, str):
+            self.reply(f"POS({board.x},{board.y})")
+        else:
+            square = frame.packSquare(int(board.x), int(board.y))
+            self.uart.write(frame.writeReply(self.positionFrame, frame.POS_REPLY, label, square))
+
+    def pending(self):
+        return len(self.commands) + len(self.board.queued)
+
+    def accept(self, command, argument, label):
+        """Answers POS and STAT, or queues any other command (ACKing MOV and OCC right away)."""
+        if command == 'POS':
+            # Where the magnet is now (or the end of the move playing), not where the queue leads
+            self.sendPosition(label)
+            return
+        if command == 'STAT':
+            self.reply(f"STAT({metrics.snapshot()})")
+            return
+        if command == 'STATRESET':
+            metrics.reset()
+            self.reply("ACK(STATRESET)")
+            return
+        self.commands.append((command, argument, label))
+        if command == 'OCC' or command == 'MOV':
+            self.send("ACK", label)
+
+    def handleInput(self):
+        """Handles the next complete line or frame waiting on the UART. False if there was none."""
+        parser = self.parser
+        found = parser.poll(self.uart)
+        if found == frame.LINE:
+            try:
+                # Decode, remove whitespace/newlines, and capitalize for consistency
+                clean_message = bytes(parser.line[:parser.lineLength]).decode('utf-8').strip().upper()
+                if _LOG:
+                    print(f"Received: {clean_message}")
+                command, argument, text = parseCommand(clean_message)
+                if command is None:
+                    self.reply(text)
+                else:
+                    self.accept(command, argument, text)
+            except Exception as e:
+                print(f"Unexpected error parsing UART data: {e}")
+                self.reply("NAK")
+        elif found == frame.FRAME:
+            self.handleFrame(parser.payload, parser.payloadLength + 1)
+        elif found == frame.BAD:
+            print("Dropped a frame with a bad CRC")
+            self.uart.write(frame.writeReply(self.replyFrame, frame.NAK, frame.BAD_FRAME))
+        return found != frame.NOTHING
+
+    def handleFrame(self, payload, end):
+        """Handles the commands in payload[1:end] in order, stopping at the first malformed one."""
+        offset = 1
+        while offset < end:
+            size = frame.commandSize(payload, offset, end)
+            if size == 0:
+                self.send("NAK", payload[offset + 1] if offset + 1 < end else frame.BAD_FRAME)
+                return
+            command = payload[offset]
+            tag = payload[offset + 1]
+            if command == frame.POS:
+                self.accept('POS', None, tag)
+            elif command == frame.MOV or command == frame.RTE:
+                count = payload[offset + 2] if command == frame.MOV else 1
+                start = offset + 3 if command == frame.MOV else offset + 2
+                squares = [frame.unpackSquare(payload[start + i]) for i in range(count)]
+                if not squares or None in squares:
+                    self.send("NAK", tag)
+                elif command == frame.MOV:
+                    self.accept('MOV', squares, tag)
+                else:
+                    self.accept('RTE', squares[0], tag)
+            elif command == frame.OCC:
+                self.accept('OCC', frame.readInt(payload, offset + 2, 8), tag)
+            elif command == frame.STREAM:
+                square = frame.unpackSquare(payload[offset + 2])
+                positions = [frame.readInt(payload, offset + 3 + 4 * i, 4, True) for i in range(4)]
+                if square is None:
+                    self.send("NAK", tag)
+                else:
+                    self.accept('STREAM', (square, positions), tag)
+            elif command == frame.DATA:
+                self.receive(tag, payload, offset + 3, payload[offset + 2])
+            elif command == frame.END:
+                self.endStream(tag)
+            else:
+                self.setBaud(frame.readInt(payload, offset + 2, 4), tag)
+            offset += size
+
+    def setBaud(self, rate, tag):
+        """ACKs at the current rate, then switches; the host switches once it has the ACK."""
+        if rate not in frame.BAUD_RATES:
+            self.send("NAK", tag)
+            return
+        self.send("ACK", tag)
+        while not self.uart.txdone():
+            pass
+        self.uart.init(baudrate=rate)
+        if _LOG:
+            print(f"Switched to {rate} baud")
+
+    def startStream(self, argument, tag):
+        """Queues a StreamedMove if the host planned it from where the queued moves end."""
+        board = self.board
+        (x, y), positions = argument
+        x1, y1, motors = board.planStart()
+        if self.stream is not None or [motor.position for motor in motors] != positions:
+            self.send("NAK", tag)
+            return
+        self.ring.reset()
+        board.currentMove = hoststream.StreamedMove(x1, y1, x, y, board.motors, self.ring)
+        board.carrying = False
+        board.queueMove()
+        self.done.append(tag)
+        self.stream = board.currentMove
+        self.streamTag = tag
+        self.granted = 0
+        self.send("ACK", tag)
+        self.grantCredit()
+
+    def receive(self, tag, payload, start, count):
+        stream = self.stream
+        if stream is None or stream.ended or tag != self.streamTag or not self.ring.write(payload, start, count):
+            # Not streaming, or the host sent more than its credit: these ticks are lost
+            self.send("NAK", tag)
+            return
+        stream.streamBytes += count
+
+    def endStream(self, tag):
+        # The move keeps the ring until it has played (see player)
+        if self.stream is None or self.stream.ended or tag != self.streamTag:
+            self.send("NAK", tag)
+            return
+        self.stream.ended = True
+
+    def receiving(self):
+        """True while a stream still has ticks to come."""
+        return self.stream is not None and not self.stream.ended
+
+    def grantCredit(self):
+        """Sends the stream credit for the ring space that isn't promised yet, in CREDIT_STEP steps."""
+        if not self.receiving():
+            return
+        stream = self.stream
+        room = self.ring.free() - (self.granted - stream.streamBytes)
+        if room >= hoststream.CREDIT_STEP:
+            self.granted += room
+            self.uart.write(frame.writeReply(self.creditFrame, frame.CREDIT, self.streamTag, count=room))
+
+    async def reader(self):
+        while True:
+            self.grantCredit()
+            # A stream keeps being read with the queue full, since the queue waits on it
+            if (self.pending() >= QUEUE_SIZE and not self.receiving()) or not self.handleInput():
+                await asyncio.sleep(POLL_S)
+
+    def plan(self, command, argument):
+        """Runs on the second core, or on the first when that is unavailable. Sets self.planned."""
+        board = self.board
+        try:
+            if command == 'RTE':
+                self.planned = board.calculateRoute(*argument)
+            elif command == 'CHS':
+                x1, y1, x2, y2, kind = argument
+                self.planned = board.calculateChessMove(x1, y1, x2, y2, kind)
+            else:
+                board.calculateMultiMove(argument)
+                self.planned = True
+        except Exception as e:
+            self.planned = e
+        self.planning = False
+
+    def wake(self):
+        """Gets the second core looking for work. Only core 0 calls it, so the check can't race."""
+        if self.work.locked():
+            self.work.release()
+
+    def secondCore(self):
+        """
+        Runs on the second core while the server serves: fills segments, then plans the job the
+        planner left, and sleeps on self.work when there's neither.
+        """
+        while True:
+            self.work.acquire()
+            if self.stopping:
+                return
+            while True:
+                if self.fillSegment():
+                    continue
+                job = self.job
+                if job is None:
+                    break
+                self.job = None
+                self.plan(*job)
+
+    def fillSegment(self):
+        """Fills one segment of the first queued move with a buffer to fill; True if there was one."""
+        for move in self.board.queued[:]: # A copy, so the player popping a move can't get in between
+            if isinstance(move, kinematics.DualCoreMultiLineMove) and move.producer is self and move.produceNext():
+                return True
+        return False
+
+    async def planner(self):
+        board = self.board
+        while True:
+            if not self.commands or len(board.queued) > PLAN_AHEAD:
+                await asyncio.sleep(POLL_S)
+                continue
+            if self.commands[0][0] == 'STREAM' and self.stream is not None:
+                # The streamed move before it still plays out of the ring
+                await asyncio.sleep(POLL_S)
+                continue
+            command, argument, label = self.commands.pop(0)
+            if command == 'OCC':
+                # Routes planned from here on see the new occupancy
+                board.setOccupancy(argument)
+                continue
+            if command == 'STREAM':
+                # Nothing to plan: the host did that
+                self.startStream(argument, label)
+                continue
+            if _LOG:
+                print(f"Planning {command} -> {argument}")
+            self.planning = True
+            if self.worker:
+                self.job = (command, argument)
+                self.wake()
+            else:
+                # Plan here once the player is idle, since planning would hold up its ticks
+                while self.playing:
+                    await asyncio.sleep(POLL_S)
+                self.plan(command, argument)
+            while self.planning:
+                await asyncio.sleep(POLL_S)
+            if self.planned is True:
+                plan = board.chessPlan
+                if command == 'CHS' and plan is not None and plan.slot is not None:
+                    # The host has to know where the captured piece went
+                    label = f"{label},{plan.slot[0]},{plan.slot[1]}"
+                board.queueMove()
+                # Its later segments are the second core's to fill
+                self.wake()
+                self.done.append(label)
+                if command == 'RTE' or command == 'CHS':
+                    self.send("ACK", label)
+            elif self.planned is False:
+                # Every way there is blocked
+                self.send("NAK", label)
+            else:
+                print(f"Planning failed: {self.planned}")
+                self.send("NAK", label)
+
+    async def player(self):
+        board = self.board
+        while True:
+            if not board.queued:
+                await asyncio.sleep(POLL_S)
+                continue
+            move = board.queued[0]
+            if _LOG:
+                print(f"Executing Move -> {move.x2},{move.y2}")
+            self.playing = True
+            board.beginMove(move)
+            board.lastPlayback = await playback.playAsync(move)
+            board.endMove(move)
+            board.queued.pop(0)
+            self.playing = False
+            if move is self.stream:
+                # The ring is free for the next stream
+                self.stream = None
+            if isinstance(move, hoststream.StreamedMove) and not move.landed():
+                # Ended early or lost ticks: the magnet isn't on the square
+                self.send("NAK", self.done.pop(0))
+            else:
+                self.send("DONE", self.done.pop(0))
+            if _LOG:
+                print(board.lastPlayback)
+
+    async def serve(self):
+        try:
+            _thread.start_new_thread(self.secondCore, ())
+            self.worker = True
+            self.board.producer = self
+        except OSError as e:
+            print(f"Second core unavailable, planning on the first ({e})")
+        try:
+            await asyncio.gather(self.reader(), self.planner(), self.player())
+        finally:
+            self.board.producer = None
+            self.stopping = True
+            self.wake()
+
+def run(board, uart):
+    """Serves commands from `uart` forever."""
+    asyncio.run(CommandServer(board, uart).serve())
@@ -0,0 +1,216 @@
+"""
+Step Engines
+Turn one packed tick (2 bits per motor, as in PrecalculatedMove.moves) into coil changes.
+Motor.step() recomputes the pattern position and drives its 4 coil pins through separate Pin
+calls, so a tick that moves all four motors makes 16 pin writes, and the last coil changes
+well after the first. The engines below keep Motor as the configuration (pins, polarity,
+position) and only replace how a tick reaches the pins:
+
+    PINS    Motor.setDirection() + Motor.step() for every motor that steps, as before
+    SIO     Precomputed toggle masks; the whole tick is a single write to the SIO GPIO_OUT_XOR
+            register, so all coils change on the same clock cycle
+    PIO     A PIO state machine outputs one coil word per tick on its own clock; the CPU only
+            builds the word and pushes it into the FIFO, which absorbs playback jitter
+
+Every engine keeps Motor.position and Motor.direction up to date, so the rest of the firmware
+sees no difference.
+"""
+from machine import Pin, mem32
+import micropython
+import utime
+
+PINS = 'pins'
+SIO = 'sio'
+PIO = 'pio'
+
+# RP2040 single-cycle IO block
+SIO_BASE = 0xd0000000
+GPIO_OUT = SIO_BASE + 0x010
+GPIO_OUT_SET = SIO_BASE + 0x014
+GPIO_OUT_CLR = SIO_BASE + 0x018
+GPIO_OUT_XOR = SIO_BASE + 0x01c
+
+def phaseIndex(motor, position):
+    """Row of motor.powerPattern that Motor.step() drives at `position`."""
+    return int((-1 * motor.polarity * position + 5) % len(motor.powerPattern))
+
+def coilMasks(motor):
+    """
+    (set, clear) GPIO bitmasks of every coil pattern row of a motor: the pins driven high and
+    the pins driven low in that phase.
+    """
+    masks = []
+    for pattern in motor.powerPattern:
+        high = low = 0
+        for i in range(4):
+            if pattern[i]:
+                high |= 1 << motor.pinNumbers[i]
+            else:
+                low |= 1 << motor.pinNumbers[i]
+        masks.append((high, low))
+    return masks
+
+class PinEngine:
+    """The original per-motor path through Motor.step()."""
+    def __init__(self, motors):
+        self.motors = motors
+
+    def start(self):
+        pass
+
+    @micropython.native
+    def apply(self, tick):
+        for i in range(4):
+            value = (tick >> (i * 2)) & 0b11
+            command = 0
+            if value == 1:
+                command = 1
+            elif value == 2:
+                command = -1
+            if command != 0:
+                self.motors[i].setDirection(command)
+                self.motors[i].step()
+
+    def finish(self):
+        pass
+
+    def close(self):
+        pass
+
+class SioEngine:
+    """
+    Writes a whole tick with one GPIO_OUT_XOR store. The coil pattern only depends on the
+    position modulo 4, so for every motor and every (position & 3, direction) the pins that
+    change are precomputed into toggles[motor * 8 + (position & 3) * 2 + backward].
+    Toggling assumes the pins already show the pattern of the current position, which
+    start() makes sure of.
+    """
+    def __init__(self, motors):
+        self.motors = motors
+        self.masks = [coilMasks(motor) for motor in motors]
+        toggles = []
+        for motor, masks in zip(motors, self.masks):
+            for residue in range(4):
+                for step in (1, -1):
+                    before = masks[phaseIndex(motor, residue)][0]
+                    after = masks[phaseIndex(motor, residue + step)][0]
+                    toggles.append(before ^ after)
+        self.toggles = toggles
+        # Every coil pin of every motor
+        self.coilPins = 0
+        for masks in self.masks:
+            high, low = masks[0]
+            self.coilPins |= high | low
+
+    def levels(self):
+        """GPIO levels (as a bitmask) of all coil pins for the motors' current positions."""
+        levels = 0
+        for motor, masks in zip(self.motors, self.masks):
+            levels |= masks[phaseIndex(motor, motor.position)][0]
+        return levels
+
+    def start(self):
+        """Drives every coil to the pattern of its motor's current position."""
+        levels = self.levels()
+        mem32[GPIO_OUT_SET] = levels
+        mem32[GPIO_OUT_CLR] = self.coilPins & ~levels
+
+    @micropython.native
+    def toggle(self, tick):
+        """Steps the motors' positions for `tick` and returns the coil pins that change."""
+        toggles = self.toggles
+        motors = self.motors
+        mask = 0
+        for i in range(4):
+            code = (tick >> (i << 1)) & 0b11
+            if code:
+                motor = motors[i]
+                position = motor.position
+                mask |= toggles[(i << 3) | ((position & 3) << 1) | (code - 1)]
+                # Code 1 steps forwards, code 2 backwards
+                direction = 3 - (code << 1)
+                motor.direction = direction
+                motor.position = position + direction
+        return mask
+
+    @micropython.native
+    def apply(self, tick):
+        mask = self.toggle(tick)
+        if mask:
+            mem32[GPIO_OUT_XOR] = mask
+
+    def finish(self):
+        pass
+
+    def close(self):
+        pass
+
+class PioEngine(SioEngine):
+    """
+    Hands the coils to a PIO state machine. The coil pins must fit in one block of up to
+    32 consecutive GPIOs (GPIO 2-21 with main.py's wiring); other pins in that block (the
+    enable pins) stay on their own function, so the PIO's writes to them have no effect.
+    Every tick the CPU pushes the new coil levels into the TX FIFO, and the state machine
+    writes them to the pins exactly one tick apart, waiting on an empty FIFO. Needs the rp2 module.
+    """
+    CYCLES_PER_TICK = 32
+
+    def __init__(self, motors, tickTimeUs=2000, stateMachine=0):
+        import rp2
+        super().__init__(motors)
+        self.tickTimeUs = tickTimeUs
+        pins = [n for motor in motors for n in motor.pinNumbers]
+        self.base = min(pins)
+        self.count = max(pins) - self.base + 1
+        if self.count > 32:
+            raise ValueError('Coil pins span more than 32 GPIOs')
+        count = self.count
+
+        @rp2.asm_pio(out_shiftdir=rp2.PIO.SHIFT_RIGHT, fifo_join=rp2.PIO.JOIN_TX)
+        def coils():
+            pull(block)            # noqa: F821  (PIO assembler names)
+            out(pins, count) [30]  # noqa: F821  (1 + 31 cycles = CYCLES_PER_TICK)
+
+        self.stateMachine = rp2.StateMachine(stateMachine, coils,
+                                             freq=self.CYCLES_PER_TICK * 1000000 // tickTimeUs,
+                                             out_base=Pin(self.base))
+        # Let the PIO drive its pins, then hand it only the coil pins
+        self.stateMachine.exec('mov(osr, invert(null))')
+        self.stateMachine.exec(f'out(pindirs, {count})')
+        for n in pins:
+            Pin(n, Pin.ALT, alt=Pin.ALT_PIO0 if stateMachine < 4 else Pin.ALT_PIO1)
+        self.current = 0
+        self.stateMachine.active(1)
+
+    def start(self):
+        self.current = self.levels()
+        self.stateMachine.put(self.current >> self.base)
+
+    @micropython.native
+    def apply(self, tick):
+        self.current ^= self.toggle(tick)
+        self.stateMachine.put(self.current >> self.base)
+
+    def finish(self):
+        """Waits for the ticks still queued in the FIFO, plus the one being played."""
+        while self.stateMachine.tx_fifo():
+            utime.sleep_us(self.tickTimeUs)
+        utime.sleep_us(self.tickTimeUs)
+
+    def close(self):
+        """Stops the state machine and gives the coil pins back to Motor.step()."""
+        self.stateMachine.active(0)
+        for motor in self.motors:
+            for n in motor.pinNumbers:
+                Pin(n, Pin.OUT)
+        SioEngine.start(self)
+
+def create(motors, mode=SIO, tickTimeUs=2000):
+    """The step engine for `mode` (PINS, SIO or PIO)."""
+    if mode == PINS:
+        return PinEngine(motors)
+    if mode == SIO:
+        return SioEngine(motors)
+    if mode == PIO:
+        return PioEngine(motors, tickTimeUs)
+    raise ValueError(f'Unknown step engine {mode}')
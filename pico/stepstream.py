@@ -0,0 +1,193 @@
+"""
+Compact Step Streams
+A raw step stream (PrecalculatedMove.moves) spends one byte on every 2 ms tick, 2 bits per motor.
+Within a line each motor almost always keeps stepping the same way, so a tick really only says
+which motors step. Motor 0 never uses the code 0b11, which leaves every byte ending in 0b11 free
+to act as an escape:
+
+    xxxxxx00/01/10    Literal tick, exactly as in a raw stream
+    kk dddd 11, N     Escape byte followed by a count byte N (1-255)
+        kk = PACKED   N ticks follow as 4-bit step masks, two ticks per byte (low nibble first).
+                      Bit i of dddd is set when motor i steps backwards during the block.
+        kk = REPEAT   The previous tick is played N more times (dddd unused).
+
+A raw stream is therefore also a valid compact stream. Typical chess moves encode in about half
+the space, and the encoder never produces more bytes than the raw stream would, so a buffer
+sized for the raw worst case is always big enough.
+"""
+import micropython
+
+ESCAPE = 0b11
+PACKED = 0
+REPEAT = 1
+MAX_COUNT = 255
+
+# Shorter blocks cost more than the same ticks as literals (2 header bytes + 1 per 2 ticks)
+MIN_PACKED = 4
+# A run inside a packed block only costs half a byte per tick, so it takes a long run to pay for
+# closing the block and opening a new one afterwards
+MIN_REPEAT = 8
+
+# SPREAD[mask] moves bit i of a 4-bit motor mask to bit 2i, i.e. the forward code of each motor
+SPREAD = bytes(sum(1 << (2 * i) for i in range(4) if mask >> i & 1) for mask in range(16))
+# Motors that step (MOVING) and step backwards (BACKWARD) in a raw tick byte
+MOVING = bytes(sum(1 << i for i in range(4) if tick >> (2 * i) & 0b11) for tick in range(256))
+BACKWARD = bytes(sum(1 << i for i in range(4) if tick >> (2 * i) & 0b11 == 2) for tick in range(256))
+
+class Encoder:
+    """
+    Compresses raw ticks into `buffer` as they are produced, so a segment never has to exist
+    in raw form. Writes past the end of the buffer grow it, like the precalculation loops.
+    Call finish() after the last tick; `length` is then the number of bytes used.
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.length = 0
+        self.ticks = 0
+        self.block = -1      # Header position of the open packed block, -1 if none
+        self.blockCount = 0
+        self.blockSeen = 0   # Motors that have stepped in the open block
+        self.blockDirs = 0   # Their directions (bit set = backwards)
+        self.runTick = -1    # Tick being repeated, held back until the run ends
+        self.runLength = 0
+
+    def write(self, value):
+        if self.length < len(self.buffer):
+            self.buffer[self.length] = value
+        else:
+            self.buffer.append(value)
+        self.length += 1
+
+    @micropython.native
+    def push(self, tick):
+        self.ticks += 1
+        if tick == self.runTick and self.runLength <= MAX_COUNT:
+            self.runLength += 1
+            return
+        self.flushRun()
+        self.runTick = tick
+        self.runLength = 1
+
+    def finish(self):
+        self.flushRun()
+        self.closeBlock()
+        self.runTick = -1
+        return self.length
+
+    def flushRun(self):
+        if self.runLength >= MIN_REPEAT:
+            self.emit(self.runTick)
+            self.closeBlock()
+            self.write(ESCAPE | (REPEAT << 6))
+            self.write(self.runLength - 1)
+        else:
+            for _ in range(self.runLength):
+                self.emit(self.runTick)
+        self.runLength = 0
+
+    @micropython.native
+    def emit(self, tick):
+        moving = MOVING[tick]
+        backward = BACKWARD[tick]
+        seen = self.blockSeen
+        dirs = self.blockDirs
+        if self.block < 0 or self.blockCount == MAX_COUNT or (backward ^ dirs) & moving & seen:
+            self.closeBlock()
+            self.block = self.length
+            self.write(0)
+            self.write(0)
+            seen = dirs = 0
+        self.blockSeen = seen | moving
+        self.blockDirs = (dirs & ~moving) | backward
+        if self.blockCount & 1:
+            self.buffer[self.length - 1] |= moving << 4
+        else:
+            self.write(moving)
+        self.blockCount += 1
+
+    def closeBlock(self):
+        start = self.block
+        if start < 0:
+            return
+        count = self.blockCount
+        dirs = self.blockDirs
+        buffer = self.buffer
+        if count < MIN_PACKED:
+            # Rewrite as literal ticks; they always take fewer bytes than the block did
+            masks = [(buffer[start + 2 + (k >> 1)] >> ((k & 1) << 2)) & 0xF for k in range(count)]
+            for k in range(count):
+                buffer[start + k] = SPREAD[masks[k] & ~dirs] | (SPREAD[masks[k] & dirs] << 1)
+            self.length = start + count
+        else:
+            buffer[start] = ESCAPE | (dirs << 2) | (PACKED << 6)
+            buffer[start + 1] = count
+        self.block = -1
+        self.blockCount = 0
+
+class Decoder:
+    """
+    Plays a compact stream back one raw tick at a time. next() returns -1 once
+    `length` bytes have been consumed.
+    """
+    def __init__(self, buffer=b'', length=0):
+        self.reset(buffer, length)
+
+    def reset(self, buffer, length):
+        self.buffer = buffer
+        self.length = length
+        self.index = 0
+        self.left = 0        # Ticks left in the current PACKED or REPEAT block
+        self.packed = False
+        self.nibble = 0      # Position of the next step mask, counted in nibbles from the buffer start
+        self.forward = 0     # SPREAD form of the block's directions
+        self.backward = 0
+        self.tick = 0        # Last tick played, for REPEAT
+
+    @micropython.native
+    def next(self):
+        if self.left:
+            self.left -= 1
+            if self.packed:
+                nibble = self.nibble
+                mask = (self.buffer[nibble >> 1] >> ((nibble & 1) << 2)) & 0xF
+                self.nibble = nibble + 1
+                self.tick = SPREAD[mask] & self.forward | (SPREAD[mask] & self.backward) << 1
+            return self.tick
+        if self.index >= self.length:
+            return -1
+        byte = self.buffer[self.index]
+        if byte & 0b11 != ESCAPE:
+            self.index += 1
+            self.tick = byte
+            return byte
+        count = self.buffer[self.index + 1]
+        self.index += 2
+        if byte >> 6 == REPEAT:
+            self.packed = False
+            self.left = count - 1
+            return self.tick
+        dirs = (byte >> 2) & 0xF
+        self.forward = SPREAD[0xF & ~dirs]
+        self.backward = SPREAD[dirs]
+        self.packed = True
+        self.nibble = self.index * 2
+        self.index += (count + 1) >> 1
+        self.left = count
+        return self.next()
+
+def encode(raw):
+    """Compact form of a whole raw stream."""
+    encoder = Encoder(bytearray(len(raw)))
+    for tick in raw:
+        encoder.push(tick)
+    return encoder.buffer[:encoder.finish()]
+
+def decode(stream, length=None):
+    """Raw form of a compact stream (the first `length` bytes of it)."""
+    decoder = Decoder(stream, len(stream) if length is None else length)
+    raw = bytearray()
+    tick = decoder.next()
+    while tick >= 0:
+        raw.append(tick)
+        tick = decoder.next()
+    return raw
@@ -0,0 +1,161 @@
+"""
+Tick Time Calibration
+Every move used to tick every 2000 us, and since a motor takes at most one step per tick, that
+also held every motor to 500 steps/s whatever it could do. The tick only has to be long enough
+for the CPU to play it: updateMotors, the step engine's coil writes and the playback scheduler.
+calibrate() measures that on the board itself and picks the shortest tick that is safe:
+
+    1. A LoadMove steps all four motors on every tick (forwards and backwards in turn, so they
+       end where they started) through the board's step engine and power policy, the way a
+       MultiLineMove segment plays. Every updateMotors is timed; the worst one is the budget.
+    2. The first candidate is the worst tick plus MARGIN_PERCENT and the scheduler's SCHEDULE_US,
+       with 1/playback.YIELD_SHARE of the tick on top for the uasyncio tasks that playAsync
+       yields to (the command server's reader and planner), rounded up to STEP_US and no
+       shorter than MIN_TICK_US.
+    3. The candidate is played on the DEADLINE schedule for VERIFY_TICKS ticks, and lengthened
+       by STEP_US until no tick starts late.
+
+The result is printed, written to TICK_FILE on flash, and handed to Board.setTickTime; main.py
+loads it at boot with load(). Rerun it from the REPL after changing the firmware:
+
+    import ticktune
+    ticktune.calibrate(board_obj)
+
+Motor.maxSpeed still limits each motor: a shorter tick only lifts the cap of one step per tick.
+StreamingMove (Board(streaming=True)) works its ticks out in the slack of each tick, which a
+short tick leaves little of; it falls back to producing ticks late rather than stalling.
+The move library is built for one tick time (host/build_library.py --tick-us) and is skipped
+while the board's tick differs. With the PIO step engine the state machine paces every tick,
+so calibrate with SIO or PINS, then switch.
+"""
+import utime
+import micropython
+import kinematics
+import playback
+import stepengine
+import stepstream
+
+# Where the calibrated tick is kept on flash
+TICK_FILE = 'tick.txt'
+DEFAULT_TICK_US = 2000
+
+# Shortest tick ever picked, and the granularity of the candidates (us)
+MIN_TICK_US = 400
+MAX_TICK_US = 10000
+STEP_US = 50
+# Head room on top of the worst tick measured, in percent, and the deadline loop's own cost (us)
+MARGIN_PERCENT = 25
+SCHEDULE_US = 60
+
+# Ticks timed one by one, and played at the candidate tick to check it
+MEASURE_TICKS = 2000
+VERIFY_TICKS = 5000
+
+def load(path=TICK_FILE):
+    """The calibrated tick from flash, or DEFAULT_TICK_US if there isn't a valid one."""
+    try:
+        with open(path) as f:
+            tickUs = int(f.read().strip())
+    except (OSError, ValueError):
+        return DEFAULT_TICK_US
+    if MIN_TICK_US <= tickUs <= MAX_TICK_US:
+        return tickUs
+    return DEFAULT_TICK_US
+
+def store(tickUs, path=TICK_FILE):
+    with open(path, 'w') as f:
+        f.write(f'{tickUs}\n')
+
+class LoadMove(kinematics.Move):
+    """
+    `ticks` ticks that step all four motors every time, played through a stepstream.Decoder like
+    a MultiLineMove segment. Four motors stepping can't be packed, so the ticks are raw ones.
+    """
+    def __init__(self, motors, ticks, tickTimeUs=DEFAULT_TICK_US):
+        super().__init__(motors, tickTimeUs)
+        self.motors = motors
+        self.moves = bytearray(ticks & ~1)
+        for i in range(0, len(self.moves), 2):
+            self.moves[i] = 0b01010101
+            self.moves[i + 1] = 0b10101010
+        self.length = len(self.moves)
+        self.streamBytes = self.length
+        self.stream = stepstream.Decoder(self.moves, self.length)
+
+    @micropython.native
+    def updateMotors(self):
+        tick = self.stream.next()
+        if tick < 0:
+            self.complete = True
+            return
+        self.engine.apply(tick)
+
+class TickBudget:
+    """What calibrate() measured (us) and the tick it picked."""
+    def __init__(self):
+        self.worstUs = 0
+        self.meanUs = 0
+        self.firstUs = 0    # First candidate, from the measurement alone
+        self.tickUs = 0
+        self.attempts = 0   # Candidates played before one had no late ticks
+
+    def __repr__(self):
+        return (f'tick budget: worst {self.worstUs} us, mean {self.meanUs} us per tick with 4 motors stepping; '
+                f'tick {self.tickUs} us ({1000000 // self.tickUs} steps/s cap, {self.tickUs - self.worstUs} us spare, '
+                f'{self.attempts} candidate(s) from {self.firstUs} us)')
+
+def play(board, move):
+    """Plays `move` with the board's engine and power policy, without moving the board."""
+    board.beginMove(move)
+    report = None
+    try:
+        report = playback.play(move, playback.DEADLINE)
+    finally:
+        board.stopMotors(0 if report is None else report.ticks)
+    return report
+
+def measure(board, ticks=MEASURE_TICKS):
+    """TickBudget with the worst and mean cost of a fully loaded tick, timed one at a time."""
+    budget = TickBudget()
+    move = LoadMove(board.motors, ticks)
+    board.beginMove(move)
+    total = played = 0
+    try:
+        for _ in range(move.length):
+            started = utime.ticks_us()
+            move.updateMotors()
+            cost = utime.ticks_diff(utime.ticks_us(), started)
+            total += cost
+            played += 1
+            if cost > budget.worstUs:
+                budget.worstUs = cost
+    finally:
+        board.stopMotors(played)
+    budget.meanUs = total // move.length
+    return budget
+
+def calibrate(board, path=TICK_FILE, save=True):
+    """
+    Measures the board, picks the shortest safe tick, stores it in `path` (unless save is
+    False) and switches the board to it. Returns the TickBudget, which is also printed.
+    """
+    if board.stepMode == stepengine.PIO:
+        raise ValueError('The PIO engine paces the ticks: calibrate with SIO or PINS')
+    budget = measure(board)
+    tickUs = budget.worstUs * (100 + MARGIN_PERCENT) // 100 + SCHEDULE_US
+    # Leave the share of every tick that playAsync hands to the other tasks
+    tickUs = tickUs * playback.YIELD_SHARE // (playback.YIELD_SHARE - 1)
+    tickUs = max(MIN_TICK_US, (tickUs + STEP_US - 1) // STEP_US * STEP_US)
+    budget.firstUs = tickUs
+    while True:
+        budget.attempts += 1
+        report = play(board, LoadMove(board.motors, VERIFY_TICKS, tickUs))
+        if report.overruns == 0 or tickUs >= MAX_TICK_US:
+            break
+        tickUs += STEP_US
+    budget.tickUs = tickUs
+    print(budget)
+    if save:
+        store(tickUs, path)
+    board.setTickTime(tickUs)
+    return budget
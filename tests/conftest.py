@@ -0,0 +1,31 @@
+"""
+Shared setup for the test suite. The firmware in pico/ runs unmodified on the stand-in hardware
+of host/simulator.py; every test starts on a rewound simulated clock with empty metrics and no
+GPIO trace (a test that needs one turns machine.record back on).
+
+    python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from host import simulator  # noqa: E402
+
+simulator.install()
+
+import machine  # noqa: E402
+import metrics  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def simulated():
+    simulator.reset()
+    metrics.reset()
+    machine.record = False
+    yield
+    machine.record = True
@@ -0,0 +1,24 @@
+"""Golden step-stream regression (host/benchmark.py): every corpus move plays its golden ticks."""
+import pytest
+
+from host import benchmark, simulator
+
+CORPUS = benchmark.corpus()
+
+
+@pytest.mark.parametrize('group, moves', CORPUS, ids=[group for group, _ in CORPUS])
+def test_streams_match_goldens(group, moves):
+    golden = benchmark.load_golden()[group]
+    drifted = []
+    with simulator.quiet():
+        for lines in moves:
+            key = benchmark.move_key(lines)
+            if golden.get(key) != benchmark.stream_hash(benchmark.run_move(lines).stream):
+                drifted.append(key)
+    assert not drifted, f'{len(drifted)} moves play other ticks (after an intended change: --update)'
+
+
+def test_golden_file_covers_the_corpus():
+    golden = benchmark.load_golden()
+    for group, moves in CORPUS:
+        assert set(golden[group]) == {benchmark.move_key(lines) for lines in moves}
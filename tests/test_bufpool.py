@@ -0,0 +1,56 @@
+"""The step buffer pool (pico/bufpool.py) over a short soak on the simulated board."""
+import random
+
+import pytest
+
+from host import simulator, soak_report
+
+import bufpool  # noqa: E402  (on sys.path via host.simulator)
+import kinematics  # noqa: E402
+import metrics  # noqa: E402
+
+
+def pooled_board():
+    board_obj = simulator.make_board()
+    board_obj.pool = bufpool.BufferPool()
+    board_obj.engine = soak_report.PositionEngine(board_obj.motors)
+    return board_obj
+
+
+@pytest.mark.parametrize('dual_core', [False, True])
+def test_every_block_comes_back(dual_core):
+    board_obj = pooled_board()
+    board_obj.dualCore = dual_core
+    with simulator.quiet():
+        held = soak_report.soak(board_obj, random.Random(5), 60, 10, 10)
+    assert held
+    assert metrics.poolMisses == 0
+    assert len(board_obj.pool.free) == len(board_obj.pool.blocks)
+
+
+def test_streamed_moves_use_the_rings():
+    board_obj = pooled_board()
+    board_obj.streaming = True
+    with simulator.quiet():
+        for x, y in ((5, 5), (2, 7), (8, 1)):
+            board_obj.calculateMove(x, y)
+            move = board_obj.currentMove
+            assert isinstance(move, kinematics.StreamingMove)
+            assert any(move.ring is ring for ring in board_obj.rings.blocks)
+            assert len(board_obj.pool.free) == len(board_obj.pool.blocks)
+            board_obj.executeMove()
+    assert metrics.poolMisses == 0
+    assert len(board_obj.rings.free) == len(board_obj.rings.blocks)
+
+
+def test_pool_never_hands_a_block_out_twice():
+    pool = bufpool.BufferPool(2, bufpool.MIN_BLOCK)
+    first = pool.allocate(100)
+    pool.release(first)
+    pool.release(first)
+    second = pool.allocate(100)
+    third = pool.allocate(100)
+    assert second is not third
+    fresh = pool.allocate(100)
+    assert all(fresh is not block for block in pool.blocks)
+    assert metrics.poolMisses == 1
@@ -0,0 +1,79 @@
+"""Whole chess moves as one planned move (pico/chessmove.py)."""
+import random
+
+import pytest
+
+from host import chess_report, simulator
+
+import chessmove  # noqa: E402  (on sys.path via host.simulator)
+import router  # noqa: E402
+
+RNG = random.Random(9)
+CASES = (list(chess_report.captures(RNG, 6)) + list(chess_report.en_passants(RNG, 6))
+         + list(chess_report.castlings()))
+
+
+def case_id(case):
+    _, _, kind, x1, y1, x2, y2 = case
+    return f'{kind}-{x1}{y1}{x2}{y2}'
+
+
+def keeps_clear(board_obj, start, plan, occupancy):
+    """
+    True if the magnet never passes a piece it isn't moving: on its way to each piece, and
+    while it carries one.
+    """
+    occupancy = bytearray(occupancy)
+    points = iter(plan.waypoints)
+    x, y = start
+    for x1, y1, x2, y2 in plan.pieces:
+        travel = bytearray(occupancy)
+        travel[router.squareIndex(x1, y1)] = 0
+        for goal, pieces, own in (((x1, y1), travel, router.squareIndex(x, y)),
+                                  ((x2, y2), occupancy, router.squareIndex(x1, y1))):
+            while (x, y) != goal:
+                wx, wy = next(points)
+                if board_obj.router.blocked(int(x * 2), int(y * 2), int(wx * 2), int(wy * 2), pieces, own):
+                    return False
+                x, y = wx, wy
+        occupancy[router.squareIndex(x1, y1)] = 0
+        occupancy[router.squareIndex(x2, y2)] = 1
+    return True
+
+
+@pytest.mark.parametrize('case', CASES, ids=[case_id(case) for case in CASES])
+def test_planned_move_lands_every_piece(case):
+    (mx, my), squares, kind, x1, y1, x2, y2 = case
+    with simulator.quiet():
+        old = chess_report.board_at(mx, my, squares)
+        leg_by_leg = chess_report.separate(old, kind, x1, y1, x2, y2)
+        new = chess_report.board_at(mx, my, squares)
+        occupancy = bytes(new.occupancy)
+        planned = new.calculateChessMove(x1, y1, x2, y2, kind)
+        plan = new.chessPlan
+        played_us = chess_report.play(new) if planned else None
+    if not planned:
+        assert leg_by_leg is None
+        return
+    assert keeps_clear(new, (mx, my), plan, occupancy)
+    pieces = set((x, y) for x in range(1, 9) for y in range(1, 9) if new.isOccupied(x, y))
+    assert pieces == chess_report.expected_pieces(squares, kind, x1, y1, x2, y2, plan.slot)
+    assert chess_report.on_targets(new)
+    assert abs(plan.durationUs - played_us) <= 0.01 * played_us
+
+
+def test_no_graveyard_no_capture():
+    (mx, my), squares, kind, x1, y1, x2, y2 = next(chess_report.captures(random.Random(1), 1))
+    with simulator.quiet():
+        board_obj = chess_report.board_at(mx, my, squares)
+        board_obj.setGraveyard(())
+        assert not board_obj.calculateChessMove(x1, y1, x2, y2, kind)
+
+
+def test_captured_piece_goes_to_a_free_slot():
+    (mx, my), squares, kind, x1, y1, x2, y2 = next(chess_report.captures(random.Random(2), 1))
+    with simulator.quiet():
+        board_obj = chess_report.board_at(mx, my, squares)
+        assert board_obj.calculateChessMove(x1, y1, x2, y2, kind)
+    slot = board_obj.chessPlan.slot
+    assert slot in chessmove.EDGE_SQUARES and slot not in squares
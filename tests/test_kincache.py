@@ -0,0 +1,31 @@
+"""The line timing cache (pico/kincache.py) shared by the router and the moves."""
+from host import kincache_report
+
+import kincache  # noqa: E402  (on sys.path via host.simulator)
+import kinematics  # noqa: E402
+
+MOVES = 30
+SEED = 12
+
+
+def test_shared_cache_plays_the_same_game():
+    without = kincache_report.run(MOVES, SEED, 0)
+    shared = kincache_report.run(MOVES, SEED, kincache.LINE_CACHE_SIZE)
+    assert shared.digest == without.digest
+    assert shared.largest <= shared.board.lineCache.size
+
+
+def test_small_cache_stays_within_its_size():
+    shared = kincache_report.run(MOVES, SEED, 64)
+    assert shared.largest <= 64
+
+
+def test_changed_speed_limits_never_restart_the_cache():
+    changed = kincache_report.run(MOVES, SEED, kincache.LINE_CACHE_SIZE, 400)
+    assert changed.board.lineCache.restarts == 0
+
+
+def test_square_table_matches_steps_at():
+    for x in range(1, 9):
+        for y in range(1, 9):
+            assert kinematics.squareSteps(x, y) == kinematics.stepsAt(kinematics.boardToMm(x), kinematics.boardToMm(y))
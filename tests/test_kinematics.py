@@ -0,0 +1,57 @@
+"""The firmware's move types against each other: fixed point, streamed and dual-core segments."""
+import random
+
+import pytest
+
+from host import benchmark, fixedpoint_report, planner, simulator, streaming_report
+
+import kinematics  # noqa: E402  (on sys.path via host.planner)
+import stepengine  # noqa: E402
+
+
+def start_positions(x, y):
+    return list(kinematics.stepsAt(planner._board_to_mm(x), planner._board_to_mm(y)))
+
+
+def test_fixed_point_stays_within_a_step():
+    rng = random.Random(1)
+    for i in range(20):
+        lines = planner._random_lines(rng, 1 if i % 2 else rng.randint(2, 5))
+        positions = start_positions(lines[0][0], lines[0][1])
+        exact, _ = planner.plan_lines(lines, positions)
+        fixed = planner.firmware_stream(lines, positions, max_mem_bytes=1000, fixed_point=True)
+        _, _, lag, same_end = fixedpoint_report.compare(exact, fixed)
+        assert lag <= 1 and same_end, lines
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_streaming_move_plays_the_precalculated_stream(fixed_point):
+    move_class = streaming_report.timed_move(300)
+    for x1, y1, x2, y2 in streaming_report.lines(6, 3):
+        reference, move, engine, report, _ = streaming_report.stream_line(move_class, x1, y1, x2, y2, fixed_point)
+        assert engine.stream == reference.moves[:reference.length]
+        assert move.stalls == 0 and report.overruns == 0
+
+
+def play(move, motors):
+    engine = benchmark.RecordingEngine(stepengine.create(motors, stepengine.SIO))
+    move.engine = engine
+    engine.start()
+    while not move.complete:
+        move.updateMotors()
+    engine.finish()
+    return engine.stream
+
+
+def test_dual_core_segments_play_the_single_core_stream():
+    lines = [(1, 1, 8, 8), (8, 8, 1, 8), (1, 8, 8, 1)]
+    with simulator.quiet():
+        motors = simulator.make_motors(start_positions(1, 1))
+        single = play(kinematics.MultiLineMove(lines, motors, max_mem_bytes=512), motors)
+        with simulator.second_core() as core:
+            motors = simulator.make_motors(start_positions(1, 1))
+            move = kinematics.DualCoreMultiLineMove(lines, motors, max_mem_bytes=512)
+            dual = play(move, motors)
+    assert move.segment_count > 2 and core.started == 1
+    assert dual == single
+    assert [motor.position for motor in motors] == list(kinematics.squareSteps(8, 1))
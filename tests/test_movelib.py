@@ -0,0 +1,64 @@
+"""The precompiled move library (pico/movelib.py, host/build_library.py)."""
+import pytest
+
+from host import build_library, simulator
+
+import board  # noqa: E402  (on sys.path via host.planner)
+import kinematics  # noqa: E402
+import movelib  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def library_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('movelib') / 'movelib.bin')
+    build_library.build(path, max_distance=1, jobs=2)
+    return path
+
+
+@pytest.fixture
+def library(library_path):
+    library = movelib.MoveLibrary(library_path)
+    yield library
+    library.close()
+
+
+def board_with(library, tickTimeUs=2000, maxSpeed=None):
+    board_obj = board.Board(1, 1, simulator.make_motors(list(kinematics.squareSteps(1, 1))), library,
+                            tickTimeUs=tickTimeUs)
+    if maxSpeed is not None:
+        for motor in board_obj.motors:
+            motor.maxSpeed = maxSpeed
+    return board_obj
+
+
+def test_streams_match_the_firmware(library_path):
+    checked, mismatches = build_library.verify(library_path, 20)
+    assert checked == 20 and mismatches == 0
+
+
+def test_library_move_plays_the_precalculated_stream(library):
+    board_obj = board_with(library)
+    with simulator.quiet():
+        board_obj.calculateMove(2, 2)
+        move = board_obj.currentMove
+        reference = kinematics.PrecalculatedMove(1, 2, 1, 2, simulator.make_motors(list(kinematics.squareSteps(1, 1))))
+    assert isinstance(move, movelib.LibraryMove)
+    assert move.moves[:move.length] == reference.moves[:reference.length]
+    # The profile went into the stream when the library was built
+    assert not hasattr(move, 'profile')
+
+
+@pytest.mark.parametrize('tickTimeUs, maxSpeed', [(1000, None), (2000, 400), (4000, None)])
+def test_other_settings_skip_the_library(library, tickTimeUs, maxSpeed):
+    board_obj = board_with(library, tickTimeUs, maxSpeed)
+    with simulator.quiet():
+        board_obj.calculateMove(2, 2)
+    assert not isinstance(board_obj.currentMove, movelib.LibraryMove)
+
+
+def test_moves_off_the_square_targets_skip_the_library(library):
+    motors = simulator.make_motors([position + 1 for position in kinematics.squareSteps(1, 1)])
+    assert library.lookup(1, 1, 2, 2, motors, kinematics.lineSettings(motors, 2000)) is None
+    motors = simulator.make_motors(list(kinematics.squareSteps(1, 1)))
+    assert library.lookup(1, 1, 3, 3, motors, kinematics.lineSettings(motors, 2000)) is None
+    assert library.lookup(1, 1, 2, 2, motors, kinematics.lineSettings(motors, 2000)) is not None
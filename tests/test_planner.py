@@ -0,0 +1,52 @@
+"""The host's vectorized planner and the tables and profiles both sides share."""
+import random
+
+import numpy as np
+import pytest
+
+from host import planner, spool_report, stream_report, timing_report
+
+import kinematics  # noqa: E402  (on sys.path via host.planner)
+import stepstream  # noqa: E402
+
+
+def start_positions(x, y):
+    return list(kinematics.stepsAt(planner._board_to_mm(x), planner._board_to_mm(y)))
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_plan_lines_matches_the_firmware(seed):
+    rng = random.Random(seed)
+    for _ in range(10):
+        lines = planner._random_lines(rng, rng.choice((1, 1, 2, 3)))
+        positions = start_positions(lines[0][0], lines[0][1])
+        assert planner.plan_lines(lines, positions)[0] == planner.firmware_stream(lines, positions)
+
+
+def test_no_line_asks_for_more_than_one_step_per_tick():
+    for line in timing_report._lines():
+        assert timing_report.max_step_rate(line, time_optimal=True) <= 1
+
+
+def test_time_optimal_lines_are_faster_overall():
+    optimal = sum(planner.time_scaling(*line, time_optimal=True) for line in timing_report._lines())
+    cruise = sum(planner.time_scaling(*line, time_optimal=False) for line in timing_report._lines())
+    assert optimal < cruise
+
+
+def test_spool_table_error():
+    dense = np.linspace(kinematics.SPOOL_MIN_SQ, kinematics.SPOOL_MAX_SQ, 100000)
+    assert np.abs(planner.spool_steps(dense) - spool_report.exact_steps(dense)).max() <= 0.02
+    targets = spool_report.line_targets()
+    assert np.abs(planner.spool_steps(targets) - spool_report.exact_steps(targets)).max() <= 0.02
+
+
+@pytest.mark.parametrize('paths', [stream_report.knight_moves, stream_report.tours])
+def test_compact_streams_round_trip(paths):
+    count, raw_bytes, compact_bytes = stream_report.measure(paths())
+    assert count and compact_bytes < raw_bytes
+
+
+def test_compact_stream_of_idle_ticks():
+    raw = bytearray(300) + bytearray((0b01,)) + bytearray(5)
+    assert stepstream.decode(stepstream.encode(raw)) == raw
@@ -0,0 +1,78 @@
+"""Playback engines and step engines on the simulated clock (pico/playback.py, pico/stepengine.py)."""
+import random
+
+import pytest
+
+from host import benchmark, simulator, ticktune_report
+
+import board  # noqa: E402  (on sys.path via host.simulator)
+import kinematics  # noqa: E402
+import machine  # noqa: E402
+import playback  # noqa: E402
+import stepengine  # noqa: E402
+import ticktune  # noqa: E402
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+
+@pytest.mark.parametrize('mode', [playback.DEADLINE, playback.TIMER])
+def test_scheduled_engines_absorb_the_tick_cost(mode):
+    machine.record = True
+    board_obj = simulator.make_board()
+    report = simulator.run_move(board_obj, [(4, 4)], mode=mode, tick_cost_us=300)
+    assert board_obj.lastPlayback.overruns == 0
+    # Only the cost of the last tick comes on top of the planned time
+    assert report.played_us - report.planned_us <= 2 * 300
+    assert [motor.position for motor in board_obj.motors] == list(kinematics.squareSteps(4, 4))
+    assert sum(report.steps) > 0
+
+
+def test_sleep_engine_accumulates_the_tick_cost():
+    board_obj = simulator.make_board()
+    report = simulator.run_move(board_obj, [(4, 4)], mode=playback.SLEEP, tick_cost_us=300)
+    assert report.played_us >= report.planned_us + report.ticks * 300
+
+
+def test_step_engines_play_the_same_ticks():
+    streams = []
+    for mode in (stepengine.PINS, stepengine.SIO):
+        simulator.reset()
+        board_obj = board.Board(1, 1, simulator.make_motors(), stepMode=mode)
+        board_obj.engine = recorder = benchmark.RecordingEngine(board_obj.engine)
+        with simulator.quiet():
+            board_obj.calculateMultiMove([(4, 4), (6, 2)])
+            board_obj.executeMove()
+        assert [motor.position for motor in board_obj.motors] == list(kinematics.squareSteps(6, 2))
+        streams.append(recorder.stream)
+    assert streams[0] == streams[1]
+
+
+def test_play_async_yields_at_short_ticks():
+    # 350 us of every 400 us tick go to the step engine: the slack never reaches the yield share
+    board_obj = simulator.make_board()
+    board_obj.engine = ticktune_report.ChargedEngine(board_obj.motors, 350, 0, random.Random(0))
+    move = ticktune.LoadMove(board_obj.motors, 640, 400)
+    board_obj.beginMove(move)
+    polls = [0]
+
+    async def other():
+        while True:
+            polls[0] += 1
+            await asyncio.sleep(0)
+
+    async def main():
+        task = asyncio.create_task(other())
+        await asyncio.sleep(0)
+        try:
+            return await playback.playAsync(move)
+        finally:
+            task.cancel()
+    try:
+        report = asyncio.run(main())
+    finally:
+        board_obj.stopMotors(0)
+    assert report.ticks == 640
+    assert polls[0] >= report.ticks // playback.YIELD_TICKS
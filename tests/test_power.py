@@ -0,0 +1,22 @@
+"""Dynamic motor power (pico/power.py) on the benchmark corpus."""
+import types
+
+import pytest
+
+from host import benchmark, power_report
+
+import power  # noqa: E402  (on sys.path via host.simulator)
+
+SETTINGS = types.SimpleNamespace(hold=22000, run=65535, boost=65535, dual_core=False)
+# A few moves of every group: the knight moves and single squares repeat each other
+MOVES = [lines for _, moves in benchmark.corpus() for lines in moves[::12]]
+
+
+@pytest.mark.parametrize('lines', MOVES, ids=[benchmark.move_key(lines) for lines in MOVES])
+def test_dynamic_power_keeps_the_motion(lines):
+    full, _ = power_report.play(lines, power.FULL, SETTINGS)
+    dynamic, report = power_report.play(lines, power.DYNAMIC, SETTINGS)
+    assert dynamic.stream == full.stream
+    assert dynamic.weak == 0
+    assert report.ticks == len(dynamic.stream)
+    assert report.headroom >= 1
@@ -0,0 +1,63 @@
+"""Piece routes (pico/router.py) and the blended corners they're played with (pico/blend.py)."""
+import random
+
+import pytest
+
+from host import blend_report, simulator
+
+import router  # noqa: E402  (on sys.path via host.simulator)
+
+TOLERANCE = 3.0
+
+
+def keeps_clear(route_planner, x, y, waypoints, occupancy):
+    """True if no line of the route from (x, y) passes a piece other than the one on (x, y)."""
+    own = router.squareIndex(x, y)
+    for wx, wy in waypoints:
+        if route_planner.blocked(int(x * 2), int(y * 2), int(wx * 2), int(wy * 2), occupancy, own):
+            return False
+        x, y = wx, wy
+    return True
+
+
+def test_routes_keep_clear_of_the_other_pieces():
+    route_planner = router.Router(simulator.make_motors())
+    rng = random.Random(2)
+    found = 0
+    for _ in range(30):
+        squares = rng.sample([(x, y) for x in range(1, 9) for y in range(1, 9)], 17)
+        (x2, y2), (x1, y1) = squares.pop(), squares[0]
+        occupancy = blend_report.occupancy_of(squares)
+        waypoints = route_planner.route(x1, y1, x2, y2, occupancy)
+        if waypoints is None:
+            continue
+        found += 1
+        assert waypoints[-1] == (x2, y2)
+        assert keeps_clear(route_planner, x1, y1, waypoints, occupancy)
+    assert found > 20
+
+
+def test_knight_hops_go_round_the_start_position():
+    route_planner = router.Router(simulator.make_motors())
+    occupancy = blend_report.occupancy_of(blend_report.START_POSITION)
+    for x1, y1, x2, y2 in blend_report.KNIGHT_HOPS:
+        waypoints = route_planner.route(x1, y1, x2, y2, occupancy)
+        assert len(waypoints) > 1
+        assert keeps_clear(route_planner, x1, y1, waypoints, occupancy)
+
+
+def routes():
+    route_planner = router.Router(simulator.make_motors())
+    rng = random.Random(1)
+    return (list(blend_report.knight_routes(route_planner))
+            + list(blend_report.removal_routes(route_planner, rng, 4))
+            + list(blend_report.random_routes(route_planner, rng, 4)))
+
+
+@pytest.mark.parametrize('lines', [lines for lines in routes() if len(lines) > 1])
+def test_blended_corners_stay_within_the_tolerance(lines):
+    chained_ms, blended_ms, deviation, lag, same_end = blend_report.compare(lines, TOLERANCE, 2000)
+    assert deviation <= TOLERANCE + 1e-6
+    assert lag <= 1
+    assert same_end
+    assert blended_ms <= chained_ms
@@ -0,0 +1,117 @@
+"""The command server (pico/server.py) over the stand-in UART: text and binary commands, queued moves."""
+import pytest
+
+from host import frames, protocol_report, simulator, streamer
+
+import chessmove  # noqa: E402  (on sys.path via host.simulator)
+import frame  # noqa: E402
+import machine  # noqa: E402
+import router  # noqa: E402
+import server  # noqa: E402
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+SCENARIOS = protocol_report.scenarios()
+
+
+def handle(command_server, uart, data):
+    """Replies to `data`, handled without the server's tasks (moves are only queued)."""
+    reply, _ = protocol_report.loopback(command_server, uart, data, repeats=1)
+    return reply
+
+
+def serve(board_obj, data, moves):
+    """Reply lines once the server's tasks have answered `moves` move commands with DONE or NAK."""
+    uart = machine.UART(0, baudrate=115200)
+    command_server = server.CommandServer(board_obj, uart)
+
+    async def run():
+        serving = asyncio.create_task(command_server.serve())
+        received = b''
+        try:
+            while received.count(b'DONE') + received.count(b'NAK') < moves:
+                received += uart.take()
+                await asyncio.sleep(0)
+        finally:
+            serving.cancel()
+        return received
+    uart.feed(data)
+    with simulator.second_core(), simulator.quiet():
+        return asyncio.run(run()).split(b'\r\n')[:-1]
+
+
+@pytest.mark.parametrize('name, text, binary, count', SCENARIOS, ids=[scenario[0] for scenario in SCENARIOS])
+def test_text_and_binary_commands_get_the_same_replies(name, text, binary, count):
+    board_obj = simulator.make_board()
+    uart = machine.UART(0, baudrate=9600)
+    command_server = server.CommandServer(board_obj, uart)
+    with simulator.quiet():
+        lines = handle(command_server, uart, text).split(b'\r\n')[:-1]
+        replies = frames.decode(handle(command_server, uart, binary))
+    assert len(lines) == count and len(replies) == count
+    for line, (kind, _, _) in zip(lines, replies):
+        assert line.startswith(kind.encode())
+
+
+def test_baud_is_acked_at_the_old_rate():
+    uart = machine.UART(0, baudrate=9600)
+    command_server = server.CommandServer(simulator.make_board(), uart)
+    with simulator.quiet():
+        replies = frames.decode(handle(command_server, uart, frames.encode([frames.baud(9, protocol_report.FAST_BAUD)])))
+    assert replies[0][:2] == ('ACK', 9)
+    assert uart.baudrate == protocol_report.FAST_BAUD
+
+
+def test_frame_with_a_bad_crc_is_nacked():
+    uart = machine.UART(0, baudrate=9600)
+    command_server = server.CommandServer(simulator.make_board(), uart)
+    data = bytearray(frames.encode([frames.pos(1)]))
+    data[-1] ^= 0xFF
+    with simulator.quiet():
+        replies = frames.decode(handle(command_server, uart, bytes(data)))
+    assert [reply[:2] for reply in replies] == [('NAK', frame.BAD_FRAME)]
+
+
+def test_stat_is_answered_straight_away():
+    uart = machine.UART(0, baudrate=9600)
+    command_server = server.CommandServer(simulator.make_board(), uart)
+    with simulator.quiet():
+        reply = handle(command_server, uart, b'STAT\n')
+    assert reply.startswith(b'STAT(up=') and reply.endswith(b')\r\n')
+
+
+def test_routed_moves_are_planned_on_the_second_core():
+    with simulator.quiet():
+        assert protocol_report.second_core(9600)
+
+
+def occupancy(*squares):
+    mask = 0
+    for x, y in squares:
+        mask |= 1 << router.squareIndex(x, y)
+    return f'OCC({mask:016X})\n'.encode()
+
+
+def test_capture_replies_name_the_graveyard_slot():
+    board_obj = simulator.make_board()
+    board_obj.setGraveyard(chessmove.EDGE_SQUARES)
+    replies = serve(board_obj, occupancy((1, 1), (3, 2)) + b'CHS(1,1,3,2,X)\n', 1)
+    done = [reply for reply in replies if reply.startswith(b'DONE')]
+    assert len(done) == 1
+    sx, sy = (int(part) for part in done[0][len(b'DONE(1,1,3,2,X,'):-1].split(b','))
+    assert (sx, sy) in chessmove.EDGE_SQUARES and board_obj.isOccupied(sx, sy)
+    assert b'ACK(1,1,3,2,X,%d,%d)' % (sx, sy) in replies
+
+
+def test_capture_without_a_graveyard_is_nacked():
+    replies = serve(simulator.make_board(), occupancy((1, 1), (3, 2)) + b'CHS(1,1,3,2,X)\n', 1)
+    assert b'NAK(1,1,3,2,X)' in replies
+
+
+def test_host_planned_streams_play_exactly(monkeypatch):
+    monkeypatch.setattr(server, 'POLL_S', 0)
+    with simulator.quiet():
+        assert streamer.run_simulated([115200, 4800], [(8, 8), (1, 8)]) == 0
@@ -0,0 +1,55 @@
+"""Tick time calibration (pico/ticktune.py) against simulated per-tick costs."""
+import random
+
+import pytest
+
+from host import simulator, ticktune_report
+
+import playback  # noqa: E402  (on sys.path via host.simulator)
+import power  # noqa: E402
+import ticktune  # noqa: E402
+
+JITTER_US = 40
+MAX_SPEED = 800
+
+
+def charged_board(cost_us, rng):
+    board_obj = simulator.make_board()
+    board_obj.engine = ticktune_report.ChargedEngine(board_obj.motors, cost_us, JITTER_US, rng)
+    return board_obj
+
+
+@pytest.mark.parametrize('cost_us', [150, 400, 900])
+def test_calibrated_tick_plays_without_late_ticks(cost_us):
+    rng = random.Random(4)
+    with simulator.quiet():
+        board_obj = charged_board(cost_us, rng)
+        budget = ticktune.calibrate(board_obj, save=False)
+        tuned = ticktune_report.diagonal(board_obj, MAX_SPEED)
+        baseline = ticktune_report.diagonal(charged_board(cost_us, rng), MAX_SPEED)
+    assert budget.tickUs >= cost_us + JITTER_US
+    # playAsync hands the other tasks a share of every tick
+    assert budget.tickUs - budget.worstUs >= budget.tickUs // playback.YIELD_SHARE
+    assert board_obj.tickTimeUs == budget.tickUs
+    assert tuned.overruns == 0
+    assert tuned.plannedUs <= baseline.plannedUs
+
+
+def test_load_and_store(tmp_path):
+    path = str(tmp_path / ticktune.TICK_FILE)
+    assert ticktune.load(path) == ticktune.DEFAULT_TICK_US
+    ticktune.store(850, path)
+    assert ticktune.load(path) == 850
+    ticktune.store(ticktune.MIN_TICK_US - 1, path)
+    assert ticktune.load(path) == ticktune.DEFAULT_TICK_US
+
+
+def test_measuring_under_dynamic_power_lets_go_of_the_move():
+    board_obj = simulator.make_board()
+    board_obj.setPowerPolicy(power.DYNAMIC)
+    with simulator.quiet():
+        ticktune.measure(board_obj, 200)
+        assert board_obj.powerManager.move is None
+        report = ticktune.play(board_obj, ticktune.LoadMove(board_obj.motors, 200))
+    assert report.ticks == 200
+    assert board_obj.powerManager.move is None
@@ -0,0 +1,16 @@
+"""Forward kinematics of packed step streams (host/trajectory.py)."""
+from host import benchmark, trajectory
+
+BUDGET = 0.5
+MOVES = [lines for _, group in benchmark.corpus() for lines in group][::12]
+
+
+def test_forward_kinematics_round_trip():
+    assert trajectory.round_trip_error() < 1e-6
+
+
+def test_default_settings_stay_within_the_budget():
+    result = trajectory.sweep(MOVES, 2000, 500)
+    assert result.moves == len(MOVES)
+    assert result.worst[1].max_deviation <= BUDGET
+    assert result.max_error <= BUDGET